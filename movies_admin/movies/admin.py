@@ -1,19 +1,125 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import FloatField, OuterRef, Subquery, Value
+from django.forms.models import BaseInlineFormSet
+from django.utils.translation import gettext_lazy as _
+
+from .changelists import KeysetChangeList
 from .models import Genre, Filmwork, GenreFilmwork, PersonFilmwork, Person
+from .paginators import EstimatedCountPaginator
+
+SEARCH_CONFIGS = ("russian", "english")
+# The expression of the idx_film_work_search index, which PostgreSQL only uses for
+# queries on the exact same expression.
+FILMWORK_SEARCH_VECTOR = (
+    SearchVector("title", config="russian", weight="A")
+    + SearchVector("title", config="english", weight="A")
+    + SearchVector("description", config="russian", weight="B")
+    + SearchVector("description", config="english", weight="B")
+)
+
+
+class LoadedAutocompleteSelect(AutocompleteSelect):
+    """
+    Autocomplete select labelling its selected option with an already loaded object.
+
+    An autocomplete select only renders the selected option, but it queries the related
+    object to label it, once per inline row. When the option is `loaded_choice`, set by
+    `LoadedRelationsFormSet`, it's rendered without a query.
+    """
+
+    loaded_choice = None
+
+    def optgroups(self, name, value, attr=None):
+        if self.loaded_choice is None or [str(v) for v in value] != [
+            self.loaded_choice[0]
+        ]:
+            return super().optgroups(name, value, attr)
+        options = (
+            [] if self.is_required else [self.create_option(name, "", "", False, 0)]
+        )
+        options.append(
+            self.create_option(name, *self.loaded_choice, True, len(options))
+        )
+        return [(None, options, 0)]
+
+
+class LoadedRelationsFormSet(BaseInlineFormSet):
+    """
+    Inline formset handing the related objects of its rows to their autocomplete selects.
+
+    The objects must be loaded along with the rows, with `select_related`.
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if i < self.initial_form_count():
+            for name, field in form.fields.items():
+                widget = getattr(field.widget, "widget", field.widget)
+                if isinstance(widget, LoadedAutocompleteSelect):
+                    related = getattr(form.instance, name)
+                    widget.loaded_choice = (
+                        str(related.pk),
+                        field.label_from_instance(related),
+                    )
+        return form
+
+
+class AutocompleteInline(admin.TabularInline):
+    """
+    Inline picking its related objects with autocomplete selects.
+
+    A plain select lists every object of the related table on every row, which doesn't
+    scale to a table of persons. Autocomplete selects only render the selected object,
+    and search the others through the related model admin's `search_fields`.
+    """
+
+    formset = LoadedRelationsFormSet
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs["widget"] = LoadedAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get("using")
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class GenreFilmworkInline(admin.TabularInline):
+class GenreFilmworkInline(AutocompleteInline):
     model = GenreFilmwork
+    autocomplete_fields = ("genre",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("genre")
 
-class PersonFilmworkInline(admin.TabularInline):
+
+class PersonFilmworkInline(AutocompleteInline):
     model = PersonFilmwork
+    autocomplete_fields = ("person",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("person")
 
 
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
     list_display = ("name", "created_at", "updated_at")
     search_fields = ("name", "description")
+    ordering = ("name",)
+
+
+class FilmworkChangeList(KeysetChangeList):
+    """
+    Changelist listing full-text search results by rank, unless another order is picked.
+    """
+
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+        if "search_rank" in queryset.query.annotations and ORDER_VAR not in self.params:
+            ordering = ["-search_rank", *ordering]
+        return ordering
 
 
 @admin.register(Filmwork)
@@ -22,6 +128,7 @@ class FilmworkAdmin(admin.ModelAdmin):
     list_display = (
         "title",
         "type",
+        "genre_names",
         "creation_date",
         "rating",
         "created_at",
@@ -29,9 +136,79 @@ class FilmworkAdmin(admin.ModelAdmin):
     )
     list_filter = ("type", "creation_date", "rating")
     search_fields = ("title", "type", "description")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    keyset_fields = ("title", "rating", "creation_date")
+
+    def get_queryset(self, request):
+        # A correlated subquery rather than a grouped aggregate, so that the page's
+        # count query doesn't aggregate the genres of every film work.
+        genre_names = (
+            GenreFilmwork.objects.filter(film_work=OuterRef("pk"))
+            .values("film_work")
+            .annotate(names=ArrayAgg("genre__name", ordering="genre__name"))
+            .values("names")
+        )
+        return super().get_queryset(request).annotate(genre_names=Subquery(genre_names))
+
+    def get_changelist(self, request, **kwargs):
+        return FilmworkChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search film works by the words of their title and description, ranked.
+
+        Words are matched in their Russian and English forms through the
+        idx_film_work_search index, titles weighing more than descriptions. If nothing
+        matches, e.g. because the term is a part of a word, the film works are searched
+        for the term as a substring of their `search_fields` instead.
+
+        Parameters:
+        - request (HttpRequest): Request of the page.
+        - queryset (QuerySet): Film works to search.
+        - search_term (str): Term typed in the search box.
+
+        Returns:
+        - Tuple[QuerySet, bool]: The matching film works, annotated with their
+          `search_rank`, and whether they may hold duplicates.
+        """
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+
+        query = SearchQuery(
+            search_term, config=SEARCH_CONFIGS[0], search_type="websearch"
+        )
+        for config in SEARCH_CONFIGS[1:]:
+            query |= SearchQuery(search_term, config=config, search_type="websearch")
+        matches = queryset.annotate(
+            search_vector=FILMWORK_SEARCH_VECTOR,
+            search_rank=SearchRank(FILMWORK_SEARCH_VECTOR, query),
+        ).filter(search_vector=query)
+        if matches.exists():
+            return matches, False
+
+        queryset, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        return (
+            queryset.annotate(search_rank=Value(0.0, output_field=FloatField())),
+            may_have_duplicates,
+        )
+
+    @admin.display(description=_("genres"))
+    def genre_names(self, obj):
+        return ", ".join(obj.genre_names or ())
 
 
 @admin.register(Person)
 class PersonAdmin(admin.ModelAdmin):
     list_display = ("full_name", "created_at", "updated_at")
+    # Backed by a trigram index on UPPER(full_name), the expression icontains filters.
     search_fields = ("full_name",)
+    ordering = ("full_name",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    keyset_fields = ("full_name",)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
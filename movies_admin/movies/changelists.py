@@ -0,0 +1,194 @@
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paginating with keyset cursors when sorted on an indexed column.
+
+    OFFSET pagination makes PostgreSQL read and skip every row before the requested
+    page, so deep pages get slower the deeper they are. When the list is sorted by one
+    of the model admin's `keyset_fields`, or by nothing but its primary key, pages are
+    linked by cursors instead: the sort value and primary key of the last row of a page
+    for the next one, and of its first row for the previous one. A page then starts
+    from its cursor in the column's B-tree index, however deep it is.
+
+    The primary key breaks ties in the direction of the sort column. Rows whose sort
+    column is NULL come last in ascending order and first in descending order, as in
+    PostgreSQL, and are reached in a query of their own, so that every query can use
+    the index.
+
+    Lists sorted otherwise, e.g. on several columns, keep their numbered pages.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Cursors hold values of the sort column, so they don't outlive a new sort.
+        if new_params and ORDER_VAR in new_params:
+            remove = [*(remove or ()), AFTER_VAR, BEFORE_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_ordering(self, request, queryset):
+        ordering = []
+        for field in super().get_ordering(request, queryset):
+            if field not in ordering:
+                ordering.append(field)
+        if (
+            len(ordering) == 2
+            and isinstance(ordering[0], str)
+            and ordering[0].lstrip("-") in self.model_admin.keyset_fields
+            and ordering[1] in ("pk", "-pk")
+        ):
+            descending = ordering[0].startswith("-")
+            ordering[1] = "-pk" if descending else "pk"
+        return ordering
+
+    def get_keyset(self):
+        """
+        Return the sort column of a list sorted for keyset pagination, or `None` if it's
+        only sorted by primary key, along with whether it's sorted in descending order.
+
+        Raises:
+        - LookupError: If the list isn't sorted for keyset pagination.
+        """
+        ordering = list(self.queryset.query.order_by)
+        if ordering in (["pk"], ["-pk"]):
+            return None, ordering[0] == "-pk"
+        if len(ordering) == 2 and all(isinstance(field, str) for field in ordering):
+            name = ordering[0].lstrip("-")
+            descending = ordering[0].startswith("-")
+            if name in self.model_admin.keyset_fields and ordering[1] == (
+                "-pk" if descending else "pk"
+            ):
+                return self.lookup_opts.get_field(name), descending
+        raise LookupError("The list isn't sorted for keyset pagination")
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.keyset_pagination = False
+        if not self.multi_page or (self.show_all and self.can_show_all):
+            return
+        try:
+            field, descending = self.get_keyset()
+        except LookupError:
+            return
+
+        after, before = self.params.get(AFTER_VAR), self.params.get(BEFORE_VAR)
+        cursor = self.decode_cursor(field, after or before) if after or before else None
+        limit = self.list_per_page
+        if before:
+            # Rows before the cursor come in reverse order, nearest first.
+            rows = self.fetch_rows(field, cursor, not descending, limit + 1)
+            has_previous, has_next = len(rows) > limit, True
+            rows = rows[:limit][::-1]
+        else:
+            rows = self.fetch_rows(field, cursor, descending, limit + 1)
+            has_previous, has_next = cursor is not None, len(rows) > limit
+            rows = rows[:limit]
+
+        self.keyset_pagination = True
+        self.result_list = rows
+        self.previous_url = self.next_url = None
+        if rows and has_previous:
+            self.previous_url = self.get_query_string(
+                {BEFORE_VAR: self.encode_cursor(field, rows[0])}, [AFTER_VAR]
+            )
+        if rows and has_next:
+            self.next_url = self.get_query_string(
+                {AFTER_VAR: self.encode_cursor(field, rows[-1])}, [BEFORE_VAR]
+            )
+
+    def fetch_rows(self, field, cursor, backwards, limit):
+        """
+        Fetch up to `limit` rows following the cursor in ascending order of the sort
+        column, or preceding it when `backwards`, from the nearest one on.
+
+        In ascending order, rows are sorted by value then primary key, and rows without
+        a value follow by primary key. Each part of that order a page may cross is
+        fetched with a query of its own.
+        """
+        if field is None:
+            if cursor is None:
+                parts = [(Q(), ["-pk" if backwards else "pk"])]
+            else:
+                lookup = "pk__lt" if backwards else "pk__gt"
+                parts = [(Q(**{lookup: cursor[0]}), ["-pk" if backwards else "pk"])]
+        else:
+            parts = self.get_keyset_parts(field, cursor, backwards)
+
+        rows = []
+        for condition, ordering in parts:
+            queryset = self.queryset.filter(condition).order_by(*ordering)
+            rows.extend(queryset[: limit - len(rows)])
+            if len(rows) == limit:
+                break
+        return rows
+
+    @staticmethod
+    def get_keyset_parts(field, cursor, backwards):
+        """
+        Return the conditions and orderings of the parts of the sort order, from the
+        cursor on.
+        """
+        name = field.name
+        ordering = [f"-{name}", "-pk"] if backwards else [name, "pk"]
+        null_ordering = ["-pk" if backwards else "pk"]
+        values = [(Q(**{f"{name}__isnull": False}), ordering)]
+        nulls = [(Q(**{f"{name}__isnull": True}), null_ordering)] if field.null else []
+        if cursor is not None:
+            value, pk = cursor
+            if value is None:
+                pk_lookup = "pk__lt" if backwards else "pk__gt"
+                nulls = [(Q(**{f"{name}__isnull": True, pk_lookup: pk}), null_ordering)]
+                values = values if backwards else []
+            elif backwards:
+                # The first condition bounds the index scan, the second breaks ties.
+                condition = Q(**{f"{name}__lte": value}) & (
+                    Q(**{f"{name}__lt": value}) | Q(pk__lt=pk)
+                )
+                values, nulls = [(condition, ordering)], []
+            else:
+                condition = Q(**{f"{name}__gte": value}) & (
+                    Q(**{f"{name}__gt": value}) | Q(pk__gt=pk)
+                )
+                values = [(condition, ordering)]
+        return nulls + values if backwards else values + nulls
+
+    @staticmethod
+    def encode_cursor(field, row) -> str:
+        values = (
+            [str(row.pk)]
+            if field is None
+            else [getattr(row, field.attname), str(row.pk)]
+        )
+        return json.dumps(values, default=str)
+
+    def decode_cursor(self, field, cursor: str):
+        """
+        Parse a cursor of `encode_cursor` into the sort value and the primary key.
+
+        Raises:
+        - IncorrectLookupParameters: If the cursor isn't valid for the sort column.
+        """
+        pk_field = self.lookup_opts.pk
+        try:
+            values = json.loads(cursor)
+            if field is None:
+                (pk,) = values
+                return (pk_field.to_python(pk),)
+            value, pk = values
+            return field.to_python(value), pk_field.to_python(pk)
+        except (ValueError, TypeError, ValidationError) as e:
+            raise IncorrectLookupParameters(e)
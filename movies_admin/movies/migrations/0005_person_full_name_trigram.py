@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0004_alter_personfilmwork_role"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Django filters icontains lookups on UPPER(column) on PostgreSQL, so the index
+        # is built on that expression for the admin's person search to use it.
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS idx_person_full_name_trgm "
+                "ON content.person USING gin (UPPER(full_name) gin_trgm_ops);"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS content.idx_person_full_name_trgm;",
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0005_person_full_name_trigram"),
+    ]
+
+    operations = [
+        # The expression of FILMWORK_SEARCH_VECTOR in movies.admin, which has to stay
+        # in sync with it for the admin's search to use the index.
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX IF NOT EXISTS idx_film_work_search ON content.film_work
+            USING gin ((
+                setweight(to_tsvector('russian', COALESCE(title, '')), 'A')
+                || setweight(to_tsvector('english', COALESCE(title, '')), 'A')
+                || setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+                || setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+            ));
+            """,
+            reverse_sql="DROP INDEX IF EXISTS content.idx_film_work_search;",
+        ),
+    ]
@@ -1 +1,220 @@
-# Create your tests here.
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from .admin import FilmworkAdmin
+from .models import Filmwork, FilmworkType, Genre, GenreFilmwork, Person, PersonFilmwork
+
+
+class FilmworkAdminQueriesTest(TestCase):
+    """
+    The pages of film works run the same number of queries however many genres and
+    persons the film works are linked to.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        genres = Genre.objects.bulk_create(
+            Genre(name=f"Genre {number}") for number in range(5)
+        )
+        persons = Person.objects.bulk_create(
+            Person(full_name=f"Person {number}") for number in range(30)
+        )
+        cls.filmworks = Filmwork.objects.bulk_create(
+            Filmwork(title=f"Film {number}", type=FilmworkType.TV_SHOW)
+            for number in range(20)
+        )
+        GenreFilmwork.objects.bulk_create(
+            GenreFilmwork(film_work=filmwork, genre=genre)
+            for filmwork in cls.filmworks
+            for genre in genres
+        )
+        PersonFilmwork.objects.bulk_create(
+            PersonFilmwork(film_work=filmwork, person=person)
+            for filmwork in cls.filmworks
+            for person in persons
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_changelist_queries(self):
+        # Session, user, distinct ratings of the filter, table estimate, count and page.
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse("admin:movies_filmwork_changelist"))
+        self.assertContains(response, "Genre 0, Genre 1, Genre 2, Genre 3, Genre 4")
+
+    def test_changelist_estimates_large_counts(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE "content"."film_work"')
+        with mock.patch("movies.paginators.EXACT_COUNT_THRESHOLD", 10):
+            response = self.client.get(reverse("admin:movies_filmwork_changelist"))
+            filtered = self.client.get(
+                reverse("admin:movies_filmwork_changelist"), {"type": "tv_show"}
+            )
+        self.assertTrue(response.context["cl"].paginator.approximate)
+        self.assertContains(response, "~20 Кинопроизведения")
+        self.assertTrue(filtered.context["cl"].paginator.approximate)
+
+    def test_change_page_queries(self):
+        url = reverse("admin:movies_filmwork_change", args=(self.filmworks[0].pk,))
+        # Session, user, savepoint, film work, the rows of each inline with their
+        # related objects, content type and savepoint release.
+        with self.assertNumQueries(8):
+            response = self.client.get(url)
+        self.assertContains(response, 'name="personfilmwork_set-29-person"')
+        self.assertContains(response, "selected>Person 29</option>", html=False)
+
+
+class FilmworkAdminSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        Filmwork.objects.bulk_create(
+            [
+                Filmwork(title="Star Wars", description="An epic space opera."),
+                Filmwork(title="Space Jam", description="Basketball with cartoons."),
+                Filmwork(title="Солярис", description="Полёт к далёкой планете."),
+                Filmwork(title="Heat", description="A crime drama."),
+            ]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, term):
+        response = self.client.get(
+            reverse("admin:movies_filmwork_changelist"), {"q": term}
+        )
+        return [filmwork.title for filmwork in response.context["cl"].result_list]
+
+    def test_matches_are_ranked_by_field(self):
+        self.assertEqual(self.search("spaces"), ["Space Jam", "Star Wars"])
+
+    def test_matches_russian_word_forms(self):
+        self.assertEqual(self.search("планета"), ["Солярис"])
+
+    def test_falls_back_to_substring_search(self):
+        self.assertEqual(self.search("ar Wa"), ["Star Wars"])
+
+
+class PersonAdminSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Person.objects.bulk_create(
+            Person(full_name=name)
+            for name in ["Андрей Тарковский", "Harrison Ford", "Harrison Ford Jr."]
+        )
+
+    def search(self, term):
+        model_admin = admin.site._registry[Person]
+        request = RequestFactory().get("/", {"q": term})
+        queryset, _ = model_admin.get_search_results(
+            request, Person.objects.order_by("full_name"), term
+        )
+        return queryset
+
+    def test_matches_substrings_ignoring_case(self):
+        self.assertQuerysetEqual(
+            self.search("RISON f"),
+            ["Harrison Ford", "Harrison Ford Jr."],
+            lambda person: person.full_name,
+        )
+        self.assertQuerysetEqual(
+            self.search("тарков"),
+            ["Андрей Тарковский"],
+            lambda person: person.full_name,
+        )
+
+    def test_search_uses_trigram_index(self):
+        with connection.cursor() as cursor:
+            # The table is too small for the planner to pick the index on its own.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn("idx_person_full_name_trgm", self.search("rison").explain())
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        ratings = [None, 5.0, 7.5, None, 5.0, 9.1, 5.0, 1.2, None, 7.5, 3.3]
+        Filmwork.objects.bulk_create(
+            Filmwork(title=f"Film {number}", rating=rating)
+            for number, rating in enumerate(ratings)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(FilmworkAdmin, "list_per_page", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def walk(self, params, link):
+        """
+        Follow the previous or next links of the changelist from its first page on,
+        and return the pages.
+        """
+        url = reverse("admin:movies_filmwork_changelist")
+        response = self.client.get(url, params)
+        pages = []
+        while True:
+            cl = response.context["cl"]
+            self.assertTrue(cl.keyset_pagination)
+            pages.append([filmwork.pk for filmwork in cl.result_list])
+            if not getattr(cl, link):
+                return pages, cl
+            response = self.client.get(url + getattr(cl, link))
+
+    def test_pages_by_rating(self):
+        rated = Filmwork.objects.filter(rating__isnull=False).order_by("rating", "pk")
+        unrated = Filmwork.objects.filter(rating__isnull=True).order_by("pk")
+        expected = [filmwork.pk for filmwork in [*rated, *unrated]]
+        column = FilmworkAdmin.list_display.index("rating") + 1
+
+        for order, ordered in ((str(column), expected), (f"-{column}", expected[::-1])):
+            with self.subTest(order=order):
+                pages, cl = self.walk({"o": order}, "next_url")
+                self.assertEqual([pk for page in pages for pk in page], ordered)
+                self.assertEqual(len(pages), 4)
+
+                response = self.client.get(
+                    reverse("admin:movies_filmwork_changelist") + cl.previous_url
+                )
+                self.assertEqual(
+                    [filmwork.pk for filmwork in response.context["cl"].result_list],
+                    pages[-2],
+                )
+
+    def test_walks_back_to_first_page(self):
+        pages, cl = self.walk({}, "next_url")
+        expected = [filmwork.pk for filmwork in Filmwork.objects.order_by("-pk")]
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+        url = reverse("admin:movies_filmwork_changelist")
+        response = self.client.get(url + cl.previous_url)
+        backwards = []
+        while True:
+            cl = response.context["cl"]
+            backwards.insert(0, [filmwork.pk for filmwork in cl.result_list])
+            if not cl.previous_url:
+                break
+            response = self.client.get(url + cl.previous_url)
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_other_orders_keep_numbered_pages(self):
+        column = FilmworkAdmin.list_display.index("type") + 1
+        response = self.client.get(
+            reverse("admin:movies_filmwork_changelist"), {"o": column}
+        )
+        self.assertFalse(response.context["cl"].keyset_pagination)
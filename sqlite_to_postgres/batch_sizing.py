@@ -0,0 +1,75 @@
+import logging
+import threading
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+BYTES_SAMPLE_SIZE = 100
+
+
+def estimate_batch_bytes(records: List[tuple]) -> int:
+    """
+    Estimate the size of a batch of records as text, from a sample of its rows.
+
+    Parameters:
+    - records (List[tuple]): List of records. Each record is represented as a tuple.
+
+    Returns:
+    - int: Approximate number of bytes the batch takes when sent to PostgreSQL.
+    """
+    if not records:
+        return 0
+    sample = records[:BYTES_SAMPLE_SIZE]
+    sample_bytes = sum(
+        len(str(value)) for record in sample for value in record if value is not None
+    )
+    return sample_bytes * len(records) // len(sample)
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size that adjusts itself towards a target commit time and memory ceiling.
+
+    After every batch, the observed time and size per row are used to compute the size
+    that would hit `target_seconds` without exceeding `max_bytes`. The batch size moves
+    half-way towards that size, and never changes by more than a factor of two at once,
+    so a single slow commit doesn't make it swing wildly.
+
+    Observations may come from several writer threads at the same time.
+    """
+
+    def __init__(
+        self,
+        initial_size: int,
+        target_seconds: float,
+        max_bytes: int,
+        min_size: int = 10,
+        max_size: int = 100_000,
+    ):
+        self.size = initial_size
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def observe(self, rows: int, nbytes: int, seconds: float):
+        """
+        Adjust the batch size after a batch has been written.
+
+        Parameters:
+        - rows (int): Number of rows in the batch.
+        - nbytes (int): Approximate size of the batch in bytes.
+        - seconds (float): Time it took to write and commit the batch.
+        """
+        if rows <= 0 or seconds <= 0:
+            return
+
+        desired = self.target_seconds * rows / seconds
+        if nbytes > 0:
+            desired = min(desired, self.max_bytes * rows / nbytes)
+
+        with self._lock:
+            size = (self.size + desired) / 2
+            size = max(self.size / 2, min(self.size * 2, size))
+            self.size = int(max(self.min_size, min(self.max_size, size)))
@@ -0,0 +1,376 @@
+import argparse
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+
+from checkpoints import create_checkpoint_table, reset_checkpoints
+from generate_sqlite import random_text, random_timestamp
+from get_from_sqlite import sqlite_conn_context
+from metrics import MigrationReport
+from migrate_data import migrate_table, open_pipeline
+from models import TABLES, FilmWork, Person
+from put_into_postgres import (
+    PIPELINE_DEPTH,
+    SCHEMA,
+    WRITER_DRIVERS,
+    WRITERS,
+    postgres_conn_context,
+)
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+def fake_film_work() -> tuple:
+    return (
+        str(uuid.uuid4()),
+        random_text(1, 8).title(),
+        random_text(20, 250),
+        None,
+        round(random.uniform(0, 10), 1),
+        random.choice(["movie", "tv_show"]),
+        random_timestamp(),
+        random_timestamp(),
+    )
+
+
+def fake_person() -> tuple:
+    return (
+        str(uuid.uuid4()),
+        random_text(2, 3).title(),
+        random_timestamp(),
+        random_timestamp(),
+    )
+
+
+FAKE_TABLES: Dict[str, tuple] = {
+    "film_work": (FilmWork, fake_film_work),
+    "person": (Person, fake_person),
+}
+
+
+def get_postgres_settings() -> Dict[str, str]:
+    return {
+        "host": os.getenv("POSTGRES_HOST"),
+        "dbname": os.getenv("POSTGRES_DBNAME"),
+        "user": os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+    }
+
+
+class LatencyProxy:
+    """
+    Relay to PostgreSQL that delays the traffic, to emulate a database far away.
+
+    The relay listens on a Unix socket in a temporary directory, which is used as the
+    host of the connections. Data is forwarded half of `round_trip` seconds after it
+    was received in each direction, without limiting the bandwidth, so that requests
+    sent back to back overlap as on a real network and only waiting for replies costs
+    time.
+
+    Parameters:
+    - host (str): Host of the PostgreSQL server, or the directory of its Unix socket.
+    - round_trip (float): Round-trip time added to the connections, in seconds.
+    """
+
+    def __init__(self, host: str, round_trip: float):
+        self.target = host
+        self.delay = round_trip / 2
+        self.directory = tempfile.mkdtemp(prefix="pg-latency-")
+        self.server = socket.socket(socket.AF_UNIX)
+        self.server.bind(os.path.join(self.directory, ".s.PGSQL.5432"))
+        self.server.listen()
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def connect_target(self) -> socket.socket:
+        if self.target.startswith("/"):
+            upstream = socket.socket(socket.AF_UNIX)
+            upstream.connect(os.path.join(self.target, ".s.PGSQL.5432"))
+            return upstream
+        upstream = socket.create_connection((self.target, 5432))
+        upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return upstream
+
+    def accept(self):
+        while True:
+            client, _ = self.server.accept()
+            upstream = self.connect_target()
+            for source, destination in ((client, upstream), (upstream, client)):
+                chunks: queue.Queue = queue.Queue()
+                threading.Thread(
+                    target=self.receive, args=(source, chunks), daemon=True
+                ).start()
+                threading.Thread(
+                    target=self.send, args=(destination, chunks), daemon=True
+                ).start()
+
+    def receive(self, source: socket.socket, chunks: queue.Queue):
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b""
+            chunks.put((time.perf_counter() + self.delay, data))
+            if not data:
+                return
+
+    @staticmethod
+    def send(destination: socket.socket, chunks: queue.Queue):
+        while True:
+            due, data = chunks.get()
+            pause = due - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            try:
+                if not data:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                destination.sendall(data)
+            except OSError:
+                return
+
+
+@contextmanager
+def benchmark_settings(latency_ms: float):
+    """
+    Yield the PostgreSQL settings of the benchmark, through a `LatencyProxy` if needed.
+    """
+    settings = get_postgres_settings()
+    if latency_ms <= 0:
+        yield settings
+        return
+    proxy = LatencyProxy(settings["host"], latency_ms / 1000)
+    try:
+        yield {**settings, "host": proxy.directory}
+    finally:
+        proxy.server.close()
+
+
+def run_writer(
+    conn,
+    writer: Callable,
+    table_name: str,
+    records: List[tuple],
+    batch_size: int,
+    pipeline_depth: int = 0,
+) -> float:
+    """
+    Write the records in batches with the given writer and return the elapsed time.
+
+    With a `pipeline_depth`, the batches are kept in flight on a pipeline. The inserted
+    rows are deleted afterwards, so the benchmark leaves the target table as it found it.
+    """
+    table_model = FAKE_TABLES[table_name][0]
+    started = time.perf_counter()
+    with open_pipeline(conn, pipeline_depth) as pipeline:
+        in_flight = {"pipeline": pipeline, "done": lambda rejected: None}
+        for offset in range(0, len(records), batch_size):
+            writer(
+                conn,
+                table_name,
+                table_model,
+                records[offset : offset + batch_size],
+                **(in_flight if pipeline else {}),
+            )
+    elapsed = time.perf_counter() - started
+
+    cursor = conn.cursor()
+    cursor.execute(
+        f"DELETE FROM {SCHEMA}.{table_name} WHERE id = ANY(%s::uuid[])",
+        ([record[0] for record in records],),
+    )
+    conn.commit()
+    return elapsed
+
+
+def benchmark_writers(args):
+    """
+    Compare the throughput of the available PostgreSQL writers on a single table.
+
+    Synthetic rows are generated in memory and written into the target table with
+    each writer in turn. Every writer gets the same rows, and the rows are removed
+    after each run.
+    """
+    row_factory = FAKE_TABLES[args.table][1]
+    records = [row_factory() for _ in range(args.rows)]
+
+    with benchmark_settings(args.latency_ms) as settings:
+        for writer_mode in args.writers:
+            with postgres_conn_context(
+                **settings, driver=WRITER_DRIVERS[writer_mode]
+            ) as conn:
+                elapsed = run_writer(
+                    conn,
+                    WRITERS[writer_mode],
+                    args.table,
+                    records,
+                    args.batch_size,
+                    PIPELINE_DEPTH if writer_mode == "pipeline" else 0,
+                )
+            logger.info(
+                f"{writer_mode}: {args.rows} rows into {args.table} in {elapsed:.2f}s "
+                f"({args.rows / elapsed:.0f} rows/s)"
+            )
+
+
+def run_migration(
+    sqlite_path: str,
+    postgres_settings: Dict[str, str],
+    writer_mode: str,
+    batch_size: int,
+) -> dict:
+    """
+    Migrate every table of the catalog into emptied target tables and summarize the run.
+
+    This runs in a fresh child process, so the reported peak RSS belongs to this run only.
+    """
+    report = MigrationReport()
+    with sqlite_conn_context(sqlite_path) as sqlite_conn, postgres_conn_context(
+        **postgres_settings
+    ) as postgres_conn, postgres_conn_context(
+        **postgres_settings, driver=WRITER_DRIVERS[writer_mode]
+    ) as writer_conn:
+        cursor = postgres_conn.cursor()
+        cursor.execute(
+            f"TRUNCATE {', '.join(f'{SCHEMA}.{name}' for name in TABLES)} CASCADE"
+        )
+        postgres_conn.commit()
+        create_checkpoint_table(postgres_conn)
+
+        for table_name, table_model in TABLES.items():
+            reset_checkpoints(postgres_conn, table_name)
+            migrate_table(
+                sqlite_conn,
+                writer_conn,
+                table_name,
+                table_model,
+                batch_size,
+                WRITERS[writer_mode],
+                stats=report.table(table_name),
+                pipeline_depth=PIPELINE_DEPTH if writer_mode == "pipeline" else 0,
+            )
+
+    summary = report.summary()
+    summary["total"]["peak_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+    return summary
+
+
+def benchmark_migration(args):
+    """
+    Run `migrate_table` end to end on an SQLite catalog with each writer in turn.
+
+    The content tables of the target database are truncated before every run, so this
+    must only be pointed at a scratch database. Results are printed as JSON.
+    """
+    if not args.truncate:
+        raise SystemExit(
+            "The migration benchmark empties the content tables, pass --truncate"
+        )
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for writer_mode in args.writers:
+        with context.Pool(1) as pool, benchmark_settings(args.latency_ms) as settings:
+            results[writer_mode] = pool.apply(
+                run_migration,
+                (
+                    args.sqlite_path,
+                    settings,
+                    writer_mode,
+                    args.batch_size,
+                ),
+            )
+        total = results[writer_mode]["total"]
+        logger.info(
+            f"{writer_mode}: {total['rows']} rows in {total['seconds']}s "
+            f"({total['rows_per_second']} rows/s), peak RSS {total['peak_rss_mb']} MB"
+        )
+
+    sys.stdout.write(json.dumps(results, indent=2) + "\n")
+
+
+def main():
+    """
+    Benchmark the migration against a local PostgreSQL database.
+
+    Subcommands:
+    - writers: Compare the writers on synthetic rows of a single table.
+    - migrate: Migrate a whole SQLite catalog, e.g. one built by `generate_sqlite.py`,
+      and record rows/s and peak RSS for each writer.
+
+    Both subcommands take `--latency-ms` to relay the connections through a
+    `LatencyProxy`, which shows how the writers cope with a distant database, and
+    `--writers` to pick the writers to compare. By default every writer is compared,
+    except the pipeline writer when psycopg 3 isn't installed.
+
+    Environment Variables:
+    - POSTGRES_HOST, POSTGRES_DBNAME, POSTGRES_USER, POSTGRES_PASSWORD: Target database.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the migration.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    writers = subparsers.add_parser("writers", help="compare writer throughput")
+    writers.add_argument("--table", choices=sorted(FAKE_TABLES), default="film_work")
+    writers.add_argument("--rows", type=int, default=100_000)
+    writers.set_defaults(run=benchmark_writers)
+
+    migrate = subparsers.add_parser("migrate", help="benchmark a full migration")
+    migrate.add_argument("sqlite_path", help="path of the SQLite catalog to migrate")
+    migrate.add_argument(
+        "--truncate",
+        action="store_true",
+        help="confirm that the content tables of the target may be emptied",
+    )
+    migrate.set_defaults(run=benchmark_migration)
+
+    for subparser in (writers, migrate):
+        subparser.add_argument("--batch-size", type=int, default=1_000)
+        subparser.add_argument(
+            "--writers",
+            nargs="+",
+            choices=sorted(WRITERS),
+            help="writers to compare (default: all of them)",
+        )
+        subparser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=0.0,
+            help="round-trip time added to every PostgreSQL connection",
+        )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    if args.writers is None:
+        args.writers = sorted(WRITERS)
+        if importlib.util.find_spec("psycopg") is None:
+            logger.warning(
+                "Skipping the pipeline writer, which needs psycopg 3: "
+                "poetry install -E pipeline"
+            )
+            args.writers = [
+                writer_mode
+                for writer_mode in args.writers
+                if WRITER_DRIVERS[writer_mode] != "psycopg3"
+            ]
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import logging
+from typing import Optional
+
+CHECKPOINT_TABLE = "public.migration_checkpoint"
+WATERMARK_TABLE = "public.migration_watermark"
+logger = logging.getLogger(__name__)
+
+
+def create_checkpoint_table(conn):
+    """
+    Create the control table holding migration checkpoints, if it doesn't exist yet.
+
+    Every committed batch is recorded as a range of SQLite keys `(start_key, end_key]`
+    of a table. Ranges rather than a single high-water mark are stored, so that
+    batches committed out of order by concurrent writers are tracked correctly.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+        table_name TEXT NOT NULL,
+        start_key BIGINT NOT NULL,
+        end_key BIGINT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+        PRIMARY KEY (table_name, start_key)
+    );
+    """
+    )
+    conn.commit()
+
+
+def record_checkpoint(cursor, table_name: str, start_key: int, end_key: int):
+    """
+    Record a migrated batch of a table.
+
+    This is meant to be called by a writer right before it commits the batch, so the
+    checkpoint is stored in the same transaction as the rows it describes.
+
+    Parameters:
+    - cursor (psycopg2.extensions.cursor): Cursor of the transaction writing the batch.
+    - table_name (str): Name of the migrated table.
+    - start_key (int): Key the batch starts after.
+    - end_key (int): Last key in the batch.
+    """
+    cursor.execute(
+        f"""
+    INSERT INTO {CHECKPOINT_TABLE} (table_name, start_key, end_key)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (table_name, start_key) DO UPDATE SET end_key = EXCLUDED.end_key;
+    """,
+        (table_name, start_key, end_key),
+    )
+
+
+def reset_checkpoints(conn, table_name: str) -> int:
+    """
+    Forget all checkpoints of a table, so that it's migrated from the beginning.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table.
+
+    Returns:
+    - int: The key to start the migration after, which is always 0.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"DELETE FROM {CHECKPOINT_TABLE} WHERE table_name = %s", (table_name,)
+    )
+    conn.commit()
+    return 0
+
+
+def load_resume_key(conn, table_name: str) -> int:
+    """
+    Find the key a resumed migration of a table should continue after.
+
+    The recorded ranges are walked from the beginning of the table for as long as they
+    are contiguous. Everything up to the first gap is known to be committed and is
+    compacted into a single range; anything after the gap is migrated again and
+    skipped by PostgreSQL if it's already there.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table.
+
+    Returns:
+    - int: The last key of the contiguous committed prefix, 0 if there is none.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+    SELECT start_key, end_key FROM {CHECKPOINT_TABLE}
+    WHERE table_name = %s
+    ORDER BY start_key;
+    """,
+        (table_name,),
+    )
+
+    resume_key = 0
+    for start_key, end_key in cursor.fetchall():
+        if start_key > resume_key:
+            break
+        resume_key = max(resume_key, end_key)
+
+    cursor.execute(
+        f"""
+    DELETE FROM {CHECKPOINT_TABLE}
+    WHERE table_name = %s AND end_key <= %s;
+    """,
+        (table_name, resume_key),
+    )
+    if resume_key:
+        record_checkpoint(cursor, table_name, 0, resume_key)
+    conn.commit()
+
+    logger.info(f"Resuming migration of table {table_name} after key {resume_key}")
+    return resume_key
+
+
+def create_watermark_table(conn):
+    """
+    Create the control table holding delta-sync watermarks, if it doesn't exist yet.
+
+    The watermark of a table is the greatest `updated_at` (or `created_at`, for tables
+    without `updated_at`) value synced so far, stored verbatim as read from SQLite.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+        table_name TEXT PRIMARY KEY,
+        watermark TEXT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    );
+    """
+    )
+    conn.commit()
+
+
+def load_watermark(conn, table_name: str) -> Optional[str]:
+    """
+    Fetch the delta-sync watermark of a table.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table.
+
+    Returns:
+    - Optional[str]: The watermark, or None if the table was never synced.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT watermark FROM {WATERMARK_TABLE} WHERE table_name = %s",
+        (table_name,),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def save_watermark(conn, table_name: str, watermark: str):
+    """
+    Store the delta-sync watermark of a table.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table.
+    - watermark (str): Greatest timestamp synced so far.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+    INSERT INTO {WATERMARK_TABLE} (table_name, watermark)
+    VALUES (%s, %s)
+    ON CONFLICT (table_name) DO UPDATE
+    SET watermark = EXCLUDED.watermark, updated_at = now();
+    """,
+        (table_name, watermark),
+    )
+    conn.commit()
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+
+class DeadLetterWriter:
+    """
+    Appends the records PostgreSQL rejected to one NDJSON file per table.
+
+    Every line holds the record as an object keyed by column, along with the error it
+    was rejected with, so the rows can be fixed and replayed later. Files are opened
+    lazily, so tables without rejected records leave no file behind. The file of a
+    table that is migrated again from scratch is cleared with `reset`, whereas a
+    resumed run keeps appending to it.
+
+    Records may come from several writer threads at the same time.
+
+    Parameters:
+    - directory (str): Directory the `<table>.ndjson` files are written to. It's
+      created if needed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.counts: Dict[str, int] = {}
+        self._files: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def path(self, table_name: str) -> str:
+        return os.path.join(self.directory, f"{table_name}.ndjson")
+
+    def reset(self, table_name: str):
+        """
+        Remove the rejected records of a table written by previous runs.
+        """
+        with self._lock:
+            file = self._files.pop(table_name, None)
+            if file is not None:
+                file.close()
+            self.counts.pop(table_name, None)
+            try:
+                os.remove(self.path(table_name))
+            except FileNotFoundError:
+                pass
+
+    def write(
+        self, table_name: str, columns: List[str], rejected: List[Tuple[tuple, str]]
+    ):
+        """
+        Append rejected records of a table with their errors.
+
+        Parameters:
+        - table_name (str): Name of the table the records were written to.
+        - columns (List[str]): Names of the columns the records hold, in order.
+        - rejected (List[Tuple[tuple, str]]): Rejected records with their error.
+        """
+        if not rejected:
+            return
+        lines = "".join(
+            json.dumps(
+                {
+                    "table": table_name,
+                    "record": dict(zip(columns, record)),
+                    "error": error,
+                },
+                default=str,
+            )
+            + "\n"
+            for record, error in rejected
+        )
+        with self._lock:
+            file = self._files.get(table_name)
+            if file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                file = self._files[table_name] = open(self.path(table_name), "a")
+            file.write(lines)
+            file.flush()
+            self.counts[table_name] = self.counts.get(table_name, 0) + len(rejected)
+
+    def close(self):
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files.clear()
@@ -0,0 +1,222 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from put_into_postgres import SCHEMA, postgres_conn_context
+
+DEFERRED_INDEX_TABLE = "public.migration_deferred_index"
+logger = logging.getLogger(__name__)
+
+
+def create_deferred_index_table(conn):
+    """
+    Create the control table holding the definitions of dropped indexes, if needed.
+
+    Definitions are stored in the database rather than in memory, so indexes dropped
+    by a run that crashed can still be rebuilt by the next one.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+    CREATE TABLE IF NOT EXISTS {DEFERRED_INDEX_TABLE} (
+        index_name TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        definition TEXT NOT NULL,
+        constraint_name TEXT,
+        dropped_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    );
+    """
+    )
+    conn.commit()
+
+
+def fetch_secondary_indexes(conn, table_names: List[str]) -> List[Tuple[str, ...]]:
+    """
+    Look up the indexes of the tables other than their primary keys.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_names (List[str]): Names of the tables whose indexes are looked up.
+
+    Returns:
+    - List[Tuple[str, ...]]: The name, table name and `CREATE INDEX` statement of every
+      index, along with the name of the unique constraint it backs, if any.
+
+    Raises:
+    - psycopg2.Error: If there's an error in querying the PostgreSQL catalog.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+    SELECT index_class.relname, table_class.relname,
+           pg_get_indexdef(index_class.oid), con.conname
+    FROM pg_index AS idx
+    JOIN pg_class AS index_class ON index_class.oid = idx.indexrelid
+    JOIN pg_class AS table_class ON table_class.oid = idx.indrelid
+    JOIN pg_namespace AS ns ON ns.oid = table_class.relnamespace
+    LEFT JOIN pg_constraint AS con
+        ON con.conindid = idx.indexrelid AND con.contype = 'u'
+    WHERE ns.nspname = %s AND table_class.relname = ANY(%s) AND NOT idx.indisprimary
+    ORDER BY table_class.relname, index_class.relname;
+    """,
+        (SCHEMA, table_names),
+    )
+    return cursor.fetchall()
+
+
+def drop_secondary_indexes(conn, table_names: List[str]) -> int:
+    """
+    Record the definitions of the secondary indexes of the tables, then drop them.
+
+    Every index but the primary keys is dropped, since the writers rely on the primary
+    keys to skip existing rows. Indexes backing a unique constraint are dropped along
+    with the constraint, which is recreated on top of the rebuilt index. Recording and
+    dropping happen in one transaction, so no index is ever dropped unrecorded.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_names (List[str]): Names of the tables whose indexes are dropped.
+
+    Returns:
+    - int: Number of dropped indexes.
+
+    Raises:
+    - psycopg2.Error: If there's an error in querying or altering the PostgreSQL catalog.
+    """
+    indexes = fetch_secondary_indexes(conn, table_names)
+    cursor = conn.cursor()
+    try:
+        for index_name, table_name, definition, constraint_name in indexes:
+            cursor.execute(
+                f"""
+            INSERT INTO {DEFERRED_INDEX_TABLE}
+            (index_name, table_name, definition, constraint_name)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (index_name) DO NOTHING;
+            """,
+                (index_name, table_name, definition, constraint_name),
+            )
+            if constraint_name:
+                cursor.execute(
+                    f"ALTER TABLE {SCHEMA}.{table_name} "
+                    f"DROP CONSTRAINT {constraint_name}"
+                )
+            else:
+                cursor.execute(f"DROP INDEX {SCHEMA}.{index_name}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"Dropped {len(indexes)} secondary indexes until the load is done")
+    return len(indexes)
+
+
+def build_index(
+    postgres_settings: Dict[str, str], index_name: str, definition: str
+) -> float:
+    """
+    Build a recorded index on a dedicated connection and return the time it took.
+    """
+    started = time.perf_counter()
+    definition = definition.replace(" INDEX ", " INDEX IF NOT EXISTS ", 1)
+    with postgres_conn_context(**postgres_settings) as conn:
+        cursor = conn.cursor()
+        cursor.execute(definition)
+        conn.commit()
+    elapsed = time.perf_counter() - started
+    logger.info(f"Built index {index_name} in {elapsed:.2f}s")
+    return elapsed
+
+
+def rebuild_secondary_indexes(
+    postgres_settings: Dict[str, str],
+    table_names: List[str],
+    workers: int,
+):
+    """
+    Rebuild the indexes recorded by `drop_secondary_indexes`, then analyze the tables.
+
+    Indexes are built concurrently on `workers` connections. Unique constraints are
+    then recreated on top of their rebuilt index, which doesn't scan the table again.
+    The definition of an index is only forgotten once it has been restored, so if
+    anything fails, e.g. because duplicates were loaded under a unique index, the
+    remaining definitions stay recorded and are retried by the next call.
+
+    Parameters:
+    - postgres_settings (Dict[str, str]): Keyword arguments for `postgres_conn_context`.
+    - table_names (List[str]): Names of the tables to analyze afterwards, if any.
+    - workers (int): Number of indexes built at the same time.
+
+    Raises:
+    - Exception: The first error raised while restoring an index or constraint.
+    """
+    with postgres_conn_context(**postgres_settings) as conn:
+        create_deferred_index_table(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT index_name, table_name, definition, constraint_name "
+            f"FROM {DEFERRED_INDEX_TABLE} ORDER BY dropped_at, index_name"
+        )
+        indexes = cursor.fetchall()
+
+    first_error: Optional[Exception] = None
+    failed = 0
+    if indexes:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {
+                executor.submit(build_index, postgres_settings, name, definition): (
+                    name,
+                    table_name,
+                    constraint_name,
+                )
+                for name, table_name, definition, constraint_name in indexes
+            }
+
+        with postgres_conn_context(**postgres_settings) as conn:
+            cursor = conn.cursor()
+            for future, (name, table_name, constraint_name) in futures.items():
+                try:
+                    future.result()
+                    if constraint_name:
+                        cursor.execute(
+                            "SELECT 1 FROM pg_constraint WHERE conname = %s "
+                            "AND conrelid = %s::regclass",
+                            (constraint_name, f"{SCHEMA}.{table_name}"),
+                        )
+                        if not cursor.fetchone():
+                            cursor.execute(
+                                f"ALTER TABLE {SCHEMA}.{table_name} ADD CONSTRAINT "
+                                f"{constraint_name} UNIQUE USING INDEX {name}"
+                            )
+                    cursor.execute(
+                        f"DELETE FROM {DEFERRED_INDEX_TABLE} WHERE index_name = %s",
+                        (name,),
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.exception(f"Failed to restore index {name}: {e}")
+                    first_error = first_error or e
+                    failed += 1
+
+        logger.info(
+            f"Restored {len(indexes) - failed} of {len(indexes)} secondary indexes "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    if table_names:
+        with postgres_conn_context(**postgres_settings) as conn:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            for table_name in table_names:
+                cursor.execute(f"ANALYZE {SCHEMA}.{table_name}")
+        logger.info(f"Analyzed tables {', '.join(table_names)}")
+
+    if first_error:
+        raise first_error
@@ -0,0 +1,239 @@
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import string
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE film_work (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    creation_date DATE,
+    file_path TEXT,
+    rating FLOAT,
+    type TEXT NOT NULL,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE genre (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE person (
+    id TEXT PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE genre_film_work (
+    id TEXT PRIMARY KEY,
+    film_work_id TEXT NOT NULL,
+    genre_id TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+CREATE TABLE person_film_work (
+    id TEXT PRIMARY KEY,
+    film_work_id TEXT NOT NULL,
+    person_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+CREATE UNIQUE INDEX film_work_genre ON genre_film_work (film_work_id, genre_id);
+CREATE UNIQUE INDEX film_work_person_role
+ON person_film_work (film_work_id, person_id, role);
+"""
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+GENRES = 30
+GENRES_PER_FILM_WORK = 2
+PERSONS_PER_FILM_WORK = 4
+ROLES = ("actor", "writer", "director")
+CHUNK_SIZE = 10_000
+EPOCH = datetime(2021, 6, 16, tzinfo=timezone.utc)
+WORDS = [
+    "".join(random.Random(index).choices(string.ascii_lowercase, k=1 + index % 9))
+    for index in range(2_000)
+]
+
+
+def entity_id(table_name: str, index: int) -> str:
+    """
+    Build the ID of the n-th row of a table.
+
+    IDs are derived from the index, so link tables can reference rows that were
+    generated earlier without keeping all of their IDs in memory.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"{table_name}:{index}"))
+
+
+def random_timestamp() -> str:
+    """
+    Build a random timestamp string in the format used by the SQLite source.
+    """
+    moment = EPOCH + timedelta(
+        seconds=random.randint(0, 10**7), microseconds=random.randint(0, 999_999)
+    )
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f+00")
+
+
+def random_text(min_words: int, max_words: int) -> str:
+    return " ".join(random.choices(WORDS, k=random.randint(min_words, max_words)))
+
+
+def film_work_rows(count: int) -> Iterator[tuple]:
+    for index in range(count):
+        creation_date = date(1950, 1, 1) + timedelta(days=random.randint(0, 27_000))
+        yield (
+            entity_id("film_work", index),
+            random_text(1, 8).title(),
+            random_text(20, 250) if random.random() > 0.1 else None,
+            creation_date.isoformat() if random.random() > 0.3 else None,
+            None,
+            round(random.uniform(0, 10), 1) if random.random() > 0.05 else None,
+            "movie" if random.random() > 0.2 else "tv_show",
+            random_timestamp(),
+            random_timestamp(),
+        )
+
+
+def genre_rows(count: int) -> Iterator[tuple]:
+    for index in range(count):
+        yield (
+            entity_id("genre", index),
+            f"Genre {index}",
+            random_text(5, 30),
+            random_timestamp(),
+            random_timestamp(),
+        )
+
+
+def person_rows(count: int) -> Iterator[tuple]:
+    for index in range(count):
+        yield (
+            entity_id("person", index),
+            random_text(2, 3).title(),
+            random_timestamp(),
+            random_timestamp(),
+        )
+
+
+def genre_film_work_rows(film_works: int, genres: int) -> Iterator[tuple]:
+    for film_work in range(film_works):
+        sampled = random.sample(range(genres), GENRES_PER_FILM_WORK)
+        for position, genre in enumerate(sampled):
+            yield (
+                entity_id("genre_film_work", film_work * len(sampled) + position),
+                entity_id("film_work", film_work),
+                entity_id("genre", genre),
+                random_timestamp(),
+            )
+
+
+def person_film_work_rows(film_works: int, persons: int) -> Iterator[tuple]:
+    for film_work in range(film_works):
+        sampled = random.sample(range(persons), PERSONS_PER_FILM_WORK)
+        for position, person in enumerate(sampled):
+            yield (
+                entity_id("person_film_work", film_work * len(sampled) + position),
+                entity_id("film_work", film_work),
+                entity_id("person", person),
+                random.choice(ROLES),
+                random_timestamp(),
+            )
+
+
+def insert_rows(conn, table_name: str, rows: Iterator[tuple]) -> int:
+    """
+    Insert the generated rows into a table in chunks and return their number.
+    """
+    total = 0
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        placeholders = ",".join("?" * len(chunk[0]))
+        conn.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})", chunk)
+        total += len(chunk)
+    conn.commit()
+    logger.info(f"Generated {total} rows in table {table_name}")
+    return total
+
+
+def generate_catalog(path: str, film_works: int, seed: int = 0):
+    """
+    Build an SQLite database shaped like the legacy movie catalog.
+
+    The database has the same tables and columns as the source of the migration,
+    including the `file_path` column. There is one person per film work, each film
+    work has two genres and four persons, and text columns have realistic lengths.
+
+    Parameters:
+    - path (str): Path of the SQLite database to create. An existing file is replaced.
+    - film_works (int): Number of film works; the other tables are scaled from it.
+    - seed (int): Seed of the random generator, so the same catalog can be rebuilt.
+    """
+    random.seed(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        insert_rows(conn, "film_work", film_work_rows(film_works))
+        insert_rows(conn, "genre", genre_rows(GENRES))
+        insert_rows(conn, "person", person_rows(film_works))
+        insert_rows(conn, "genre_film_work", genre_film_work_rows(film_works, GENRES))
+        insert_rows(
+            conn, "person_film_work", person_film_work_rows(film_works, film_works)
+        )
+    finally:
+        conn.close()
+
+
+def parse_scale(value: str) -> int:
+    """
+    Parse a scale given either as a preset name such as "1m" or as a number.
+    """
+    if value.lower() in SCALES:
+        return SCALES[value.lower()]
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected one of {', '.join(SCALES)} or an integer but got {value}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic SQLite movie catalog."
+    )
+    parser.add_argument("path", help="path of the SQLite database to create")
+    parser.add_argument(
+        "--scale",
+        type=parse_scale,
+        default=SCALES["10k"],
+        help=f"number of film works, or one of {', '.join(SCALES)}",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    generate_catalog(args.path, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
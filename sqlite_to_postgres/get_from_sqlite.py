@@ -1,22 +1,46 @@
 import logging
 import sqlite3
 from contextlib import contextmanager
-from typing import List
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 
 EXCLUDED_COLUMN = "file_path"
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class Batch:
+    """
+    A batch of rows read from SQLite, covering the keys `(start_key, end_key]`.
+    """
+
+    start_key: int
+    end_key: int
+    records: List[tuple]
+
+
 @contextmanager
-def sqlite_conn_context(db_path: str):
+def sqlite_conn_context(
+    db_path: str, read_only: bool = False, immutable: bool = False, mmap_size: int = 0
+):
     """
     Context manager for managing SQLite database connections.
 
     This context manager provides a connection to the SQLite database and ensures
-    the connection is properly closed after usage.
+    the connection is properly closed after usage. Rows are returned as plain tuples,
+    which are cheaper to build than `sqlite3.Row` objects; use a `RowCodec` to map
+    them to the fields of a table.
 
     Parameters:
     - db_path (str): Path to the SQLite database file.
+    - read_only (bool): Open the database with a `mode=ro` URI, so that several
+      connections can read it without ever taking a write lock.
+    - immutable (bool): With `read_only`, also tell SQLite that the file can't change,
+      which skips locking and change detection altogether. Only safe if nothing else
+      writes to the database while it's open.
+    - mmap_size (int): When positive, read up to this many bytes of the database
+      through a memory map instead of `read` calls.
 
     Yields:
     - sqlite3.Connection: SQLite database connection object.
@@ -25,9 +49,16 @@ def sqlite_conn_context(db_path: str):
     with sqlite_conn_context('path/to/db.sqlite3') as conn:
         # Perform database operations using conn
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    if read_only:
+        uri = f"{Path(db_path).absolute().as_uri()}?mode=ro"
+        if immutable:
+            uri += "&immutable=1"
+        conn = sqlite3.connect(uri, uri=True)
+    else:
+        conn = sqlite3.connect(db_path)
     try:
+        if mmap_size > 0:
+            conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
         yield conn
     finally:
         conn.close()
@@ -58,32 +89,137 @@ def fetch_sqlite_columns(conn, table_name: str) -> List[str]:
 
 
 def fetch_from_sqlite(
-    conn, table_name: str, columns: List[str], offset: int, batch_size: int
-) -> List[tuple]:
+    conn,
+    table_name: str,
+    columns: List[str],
+    batch_size: Union[int, Callable[[], int]],
+    after_key: int = 0,
+    until_key: Optional[int] = None,
+) -> Iterator[Batch]:
     """
-    Fetch a batch of rows from a table in the SQLite database based on the provided offset and batch size.
+    Stream the rows of a table in the SQLite database in batches of the provided size.
+
+    Rows are read in `rowid` order through a single cursor with `fetchmany`, so every
+    batch costs the same regardless of how far into the table it is, unlike
+    `LIMIT ... OFFSET` pagination which re-skips all of the earlier rows.
 
     Parameters:
     - conn (sqlite3.Connection): SQLite database connection object.
     - table_name (str): Name of the table to fetch rows from.
-    - columns (List[str]): List of column names to fetch.
-    - offset (int): Starting point for fetching rows.
-    - batch_size (int): Number of rows to fetch.
+    - columns (List[str]): List of column names to fetch. The excluded column is skipped.
+    - batch_size (Union[int, Callable[[], int]]): Number of rows in each batch, or a
+      callable returning the size of the next batch.
+    - after_key (int): Only rows with a greater `rowid` are fetched, used to resume
+      an interrupted migration.
+    - until_key (Optional[int]): When given, only rows up to this `rowid` are fetched,
+      so that a range of the table can be read on its own.
+
+    Yields:
+    - Batch: Next batch of rows fetched from the table, along with its range of keys.
+      The `rowid` of every row is prepended to the selected columns.
+
+    Raises:
+    - sqlite3.Error: If there's an error in querying the SQLite database. The error is
+      raised rather than ending the stream early, which would leave the rest of the
+      table, or of its range, silently unmigrated.
+    """
+    selected = [column for column in columns if column != EXCLUDED_COLUMN]
+    next_size = batch_size if callable(batch_size) else lambda: batch_size
+    query = f"SELECT rowid, {','.join(selected)} FROM {table_name} WHERE rowid > ?"
+    parameters: tuple = (after_key,)
+    if until_key is not None:
+        query += " AND rowid <= ?"
+        parameters += (until_key,)
+    query += " ORDER BY rowid"
+    cursor = conn.cursor()
+    cursor.execute(query, parameters)
+    while True:
+        rows = cursor.fetchmany(next_size())
+        if not rows:
+            return
+        end_key = rows[-1][0]
+        yield Batch(after_key, end_key, rows)
+        after_key = end_key
+
+
+def split_key_ranges(
+    conn, table_name: str, after_key: int, parts: int, min_rows: int
+) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split the keys of a table after `after_key` into ranges that can be read in parallel.
+
+    The ranges are `(start_key, end_key]` intervals of `rowid` of equal width, based on
+    the largest `rowid`, which SQLite finds without scanning the table. Every range
+    spans at least `min_rows` keys, so small tables aren't split, and the last range
+    is open-ended to include rows appended in the meantime.
+
+    Parameters:
+    - conn (sqlite3.Connection): SQLite database connection object.
+    - table_name (str): Name of the table to split.
+    - after_key (int): Key the first range starts after.
+    - parts (int): Maximum number of ranges.
+    - min_rows (int): Minimum number of keys in a range.
 
     Returns:
-    - List[tuple]: List of rows fetched from the table. Each row is represented as a tuple.
+    - List[Tuple[int, Optional[int]]]: The start and end keys of every range, in order.
+      The end key of the last range is None.
 
     Raises:
     - sqlite3.Error: If there's an error in querying the SQLite database.
     """
-    try:
-        cursor = conn.cursor()
-        if EXCLUDED_COLUMN in columns:
-            columns.remove(EXCLUDED_COLUMN)
-        cursor.execute(
-            f"SELECT {','.join(columns)} FROM {table_name} LIMIT {batch_size} OFFSET {offset}"
-        )
-        return cursor.fetchall()
-    except sqlite3.Error as e:
-        logger.exception(f"SQLite error occurred while fetching data: {e}")
-        return []
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT MAX(rowid) FROM {table_name}")
+    last_key = cursor.fetchone()[0] or 0
+    span = last_key - after_key
+    parts = max(1, min(parts, span // max(1, min_rows)))
+    bounds = [after_key + span * part // parts for part in range(parts)]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def fetch_changed_from_sqlite(
+    conn,
+    table_name: str,
+    columns: List[str],
+    batch_size: int,
+    watermark_column: str,
+    watermark: Optional[str] = None,
+) -> Iterator[List[tuple]]:
+    """
+    Stream the rows of a table changed after the given watermark in batches.
+
+    Rows are read in `watermark_column` order, so the last row of every batch holds
+    the greatest watermark seen so far.
+
+    Parameters:
+    - conn (sqlite3.Connection): SQLite database connection object.
+    - table_name (str): Name of the table to fetch rows from.
+    - columns (List[str]): List of column names to fetch. The excluded column is skipped.
+    - batch_size (int): Number of rows in each batch.
+    - watermark_column (str): Timestamp column compared with the watermark.
+    - watermark (Optional[str]): Only rows with the same or a greater timestamp are
+      fetched, so that rows written after the previous sync with the very timestamp
+      it ended on aren't missed. When None, every row of the table is fetched.
+
+    Yields:
+    - List[tuple]: Next batch of rows fetched from the table. Each row is represented as a tuple.
+
+    Raises:
+    - sqlite3.Error: If there's an error in querying the SQLite database. The error is
+      raised rather than ending the stream early, which would let the sync move the
+      watermark past rows it never read.
+    """
+    selected = [column for column in columns if column != EXCLUDED_COLUMN]
+    query = f"SELECT {','.join(selected)} FROM {table_name}"
+    parameters: tuple = ()
+    if watermark is not None:
+        query += f" WHERE {watermark_column} >= ?"
+        parameters = (watermark,)
+    query += f" ORDER BY {watermark_column}"
+
+    cursor = conn.cursor()
+    cursor.execute(query, parameters)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
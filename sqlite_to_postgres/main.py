@@ -1,14 +1,85 @@
+import argparse
+import json
 import logging
 import os
+import sys
+from functools import partial
+from typing import Dict, Optional, Type
 
 from dotenv import load_dotenv
 
+from batch_sizing import AdaptiveBatchSize
+from checkpoints import (
+    create_checkpoint_table,
+    create_watermark_table,
+    load_resume_key,
+    reset_checkpoints,
+)
+from dead_letters import DeadLetterWriter
+from deferred_indexes import (
+    create_deferred_index_table,
+    drop_secondary_indexes,
+    rebuild_secondary_indexes,
+)
 from get_from_sqlite import sqlite_conn_context
-from migrate_data import migrate_table
-from models import FilmWork, Genre, Person, GenreFilmWork, PersonFilmWork
-from put_into_postgres import postgres_conn_context
+from metrics import MigrationReport
+from migrate_data import migrate_table, migrate_table_pipelined, sync_table
+from models import TABLES
+from put_into_postgres import (
+    postgres_conn_context,
+    PIPELINE_DEPTH,
+    WRITER_DRIVERS,
+    WRITERS,
+)
+from scheduler import fetch_table_dependencies, run_in_dependency_order
+from shadow_tables import (
+    SHADOW_SCHEMA,
+    check_swappable,
+    create_shadow_tables,
+    finalize_shadow_tables,
+    swap_shadow_tables,
+)
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+AUTO_BATCH_INITIAL_SIZE = 1000
+
+
+def get_int_env(name: str, default: int) -> int:
+    """
+    Read an optional integer environment variable.
+
+    Parameters:
+    - name (str): Name of the environment variable.
+    - default (int): Value used when the variable is not set.
+
+    Returns:
+    - int: The parsed value.
+
+    Raises:
+    - ValueError: If the variable is set but is not an integer.
+    """
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Expected {name} to be an integer but got {value}")
+
+
+def publish_report(report: MigrationReport, metrics_textfile: Optional[str]):
+    """
+    Print the JSON summary of a run and, if requested, write it as Prometheus metrics.
+
+    Parameters:
+    - report (MigrationReport): Statistics collected during the run.
+    - metrics_textfile (Optional[str]): Path of the Prometheus textfile to write.
+    """
+    sys.stdout.write(json.dumps(report.summary(), indent=2) + "\n")
+    if metrics_textfile:
+        report.write_prometheus(metrics_textfile)
 
 
 def main():
@@ -18,7 +89,9 @@ def main():
     This function:
     1. Reads required environment variables.
     2. Establishes connections to both SQLite and PostgreSQL databases.
-    3. Loops over the pre-defined tables to migrate them in batches.
+    3. Migrates the pre-defined tables in batches, running tables that don't depend
+       on each other concurrently and starting the link tables once their parents
+       are loaded.
 
     Environment Variables:
     - SQLITE_DB_PATH: Path to the SQLite database.
@@ -26,7 +99,48 @@ def main():
     - POSTGRES_DBNAME: Name of the PostgreSQL database.
     - POSTGRES_USER: PostgreSQL user.
     - POSTGRES_PASSWORD: Password for the PostgreSQL user.
-    - BATCH_SIZE: Number of records to migrate in each batch.
+    - BATCH_SIZE: Number of records to migrate in each batch, or "auto" to tune the
+      batch size of every table while it's migrated.
+    - BATCH_TARGET_SECONDS: Commit time the auto-tuning aims for (default 1.0).
+    - BATCH_MAX_MEGABYTES: Size of a batch the auto-tuning never exceeds (default 64).
+    - WRITER_MODE: How batches are written, "insert" (default), "copy", or "pipeline",
+      which needs psycopg 3 and saves round trips when the database is far away.
+    - PIPELINE_DEPTH: Number of batches the "pipeline" writer keeps in flight on each
+      connection before waiting for their results, at least 1 (default 8).
+    - WRITER_THREADS: Number of writer threads running alongside the SQLite reader.
+      When not set or 0, each table is migrated serially on a single connection.
+    - QUEUE_DEPTH: Maximum number of batches waiting for a writer thread, at least 1
+      (default 4).
+    - READER_THREADS: Number of SQLite connections reading a large table concurrently,
+      each over its own range of rowids (default 1). Only applies with WRITER_THREADS.
+    - SQLITE_IMMUTABLE: When 1, tell SQLite the source can't change while it's read,
+      which skips file locking. Only safe if nothing writes to it (default 0).
+    - SQLITE_MMAP_MEGABYTES: Size of the memory map the source is read through
+      (default 256, 0 to disable).
+    - TABLE_WORKERS: Number of tables migrated at the same time (default 1).
+    - INDEX_WORKERS: Number of indexes built at the same time with --defer-indexes or
+      --shadow (default 4).
+    - DEAD_LETTER_DIR: Directory the records PostgreSQL rejects are written to, as one
+      NDJSON file per table (default "dead_letters").
+    - METRICS_TEXTFILE: When set, the run's statistics are also written to this file in
+      the Prometheus text format, for the node exporter's textfile collector.
+
+    Command-line Arguments:
+    - --resume: Continue each table after its last checkpoint instead of starting over.
+    - --delta: Only sync the rows changed since the previous delta run, updating rows
+      that already exist. The writer and threading settings don't apply to this mode.
+    - --defer-indexes: Drop the secondary indexes and unique constraints of the tables
+      before loading them, so that rows are inserted without index maintenance. They
+      are rebuilt concurrently by INDEX_WORKERS connections once the load is over, even
+      if it failed, and the tables are analyzed. Indexes left dropped by a crashed run
+      are rebuilt by the next run.
+    - --shadow: Reload every table from scratch into UNLOGGED shadow copies, which are
+      then made logged, indexed and swapped with the live tables in one short
+      transaction, so readers never see a partial load. The swap only happens if no
+      batch failed and no record was rejected; otherwise the live tables are left
+      untouched.
+    - --swap-with-rejected: With --shadow, swap the tables even if records were
+      rejected to the dead-letter files, which are then missing from the live tables.
 
     Raises:
     - ValueError: If any of the required environment variables are missing or invalid.
@@ -34,8 +148,50 @@ def main():
     Notes:
     The actual data migration is handled by the `migrate_table` function. If a record
     with the same ID already exists in the PostgreSQL table, the insertion will be
-    skipped for that record.
+    skipped for that record. Records that PostgreSQL rejects, e.g. because of an invalid
+    value or a missing foreign key, are isolated and written to the dead-letter files
+    while the rest of their batch is committed. The dead-letter files of previous runs
+    are cleared, unless the run is resumed. Every committed batch is checkpointed, so
+    an interrupted run can be continued with `--resume`. A JSON summary with
+    throughput, batch latency and the time spent in every phase of each table is
+    printed at the end.
     """
+    parser = argparse.ArgumentParser(
+        description="Migrate data from SQLite to PostgreSQL."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue after the last checkpoint of every table",
+    )
+    mode.add_argument(
+        "--delta",
+        action="store_true",
+        help="only sync the rows changed since the previous delta run",
+    )
+    mode.add_argument(
+        "--shadow",
+        action="store_true",
+        help="reload into shadow tables and swap them with the live ones",
+    )
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="drop the secondary indexes during the load and rebuild them afterwards",
+    )
+    parser.add_argument(
+        "--swap-with-rejected",
+        action="store_true",
+        help="with --shadow, swap the tables even if records were rejected",
+    )
+    args = parser.parse_args()
+    if args.swap_with_rejected and not args.shadow:
+        parser.error("--swap-with-rejected only applies to --shadow")
+    if args.defer_indexes and args.delta:
+        parser.error("--defer-indexes only applies to full loads, not to --delta")
+    if args.defer_indexes and args.shadow:
+        parser.error("--shadow already builds the indexes after the load")
 
     db_path = os.getenv("SQLITE_DB_PATH")
     if not db_path:
@@ -50,7 +206,18 @@ def main():
         raise ValueError("One or more PostgreSQL environment variables are not set")
 
     batch_size = os.getenv("BATCH_SIZE")
-    if batch_size:
+    auto_tune = batch_size == "auto"
+    if auto_tune:
+        batch_size = AUTO_BATCH_INITIAL_SIZE
+        target_seconds = os.getenv("BATCH_TARGET_SECONDS", "1.0")
+        try:
+            target_seconds = float(target_seconds)
+        except ValueError:
+            raise ValueError(
+                f"Expected BATCH_TARGET_SECONDS to be a number but got {target_seconds}"
+            )
+        max_bytes = get_int_env("BATCH_MAX_MEGABYTES", 64) * 1024 * 1024
+    elif batch_size:
         try:
             batch_size = int(batch_size)
         except ValueError:
@@ -60,27 +227,197 @@ def main():
     else:
         raise ValueError("BATCH_SIZE environment variable not set")
 
+    writer_mode = os.getenv("WRITER_MODE", "insert")
+    writer = WRITERS.get(writer_mode)
+    if not writer:
+        raise ValueError(
+            f"Expected WRITER_MODE to be one of {', '.join(WRITERS)} but got {writer_mode}"
+        )
+    if args.shadow:
+        writer = partial(writer, schema=SHADOW_SCHEMA)
+    pipeline_depth = 0
+    if writer_mode == "pipeline":
+        pipeline_depth = get_int_env("PIPELINE_DEPTH", PIPELINE_DEPTH)
+        if pipeline_depth < 1:
+            raise ValueError(
+                f"Expected PIPELINE_DEPTH to be at least 1 but got {pipeline_depth}"
+            )
+
+    writer_threads = get_int_env("WRITER_THREADS", 0)
+    queue_depth = get_int_env("QUEUE_DEPTH", 4)
+    if queue_depth < 1:
+        # A queue of size 0 would be unbounded and let readers fill up the memory.
+        raise ValueError(f"Expected QUEUE_DEPTH to be at least 1 but got {queue_depth}")
+    reader_threads = get_int_env("READER_THREADS", 1)
+    table_workers = get_int_env("TABLE_WORKERS", 1)
+    index_workers = get_int_env("INDEX_WORKERS", 4)
+    metrics_textfile = os.getenv("METRICS_TEXTFILE")
+    dead_letter_dir = os.getenv("DEAD_LETTER_DIR", "dead_letters")
+
     log_level = os.getenv("LOG_LEVEL", "INFO")
     logging.basicConfig(
         level=log_level,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
 
-    with sqlite_conn_context(db_path) as sqlite_conn, postgres_conn_context(
-        host, dbname, user, password
-    ) as postgres_conn:
-        tables = {
-            "film_work": FilmWork,
-            "genre": Genre,
-            "person": Person,
-            "genre_film_work": GenreFilmWork,
-            "person_film_work": PersonFilmWork,
+    postgres_settings = {
+        "host": host,
+        "dbname": dbname,
+        "user": user,
+        "password": password,
+    }
+
+    sqlite_settings = {
+        "db_path": db_path,
+        "read_only": True,
+        "immutable": get_int_env("SQLITE_IMMUTABLE", 0) == 1,
+        "mmap_size": get_int_env("SQLITE_MMAP_MEGABYTES", 256) * 1024 * 1024,
+    }
+    writer_settings = {**postgres_settings, "driver": WRITER_DRIVERS[writer_mode]}
+    report = MigrationReport()
+
+    if args.delta:
+        sync_counts: Dict[str, Dict[str, int]] = {}
+
+        def sync(table_name: str, table_model: Type):
+            with sqlite_conn_context(db_path) as sqlite_conn, postgres_conn_context(
+                **postgres_settings
+            ) as postgres_conn:
+                sync_counts[table_name] = sync_table(
+                    sqlite_conn,
+                    postgres_conn,
+                    table_name,
+                    table_model,
+                    batch_size,
+                    report.table(table_name),
+                )
+
+        with postgres_conn_context(**postgres_settings) as postgres_conn:
+            dependencies = fetch_table_dependencies(postgres_conn, list(TABLES))
+            create_watermark_table(postgres_conn)
+
+        run_in_dependency_order(TABLES, dependencies, sync, table_workers)
+        totals = {
+            key: sum(counts[key] for counts in sync_counts.values())
+            for key in ("inserted", "updated", "unchanged", "failed")
+        }
+        logger.info(
+            f"Delta sync finished: {totals['inserted']} inserted, "
+            f"{totals['updated']} updated, {totals['unchanged']} unchanged, "
+            f"{totals['failed']} failed"
+        )
+        publish_report(report, metrics_textfile)
+        return
+
+    dead_letters = DeadLetterWriter(dead_letter_dir)
+
+    def migrate(table_name: str, table_model: Type):
+        batch_sizer = (
+            AdaptiveBatchSize(batch_size, target_seconds, max_bytes)
+            if auto_tune
+            else None
+        )
+        with sqlite_conn_context(**sqlite_settings) as sqlite_conn:
+            if writer_threads > 0:
+                migrate_table_pipelined(
+                    sqlite_conn,
+                    writer_settings,
+                    table_name,
+                    table_model,
+                    batch_size,
+                    writer,
+                    queue_depth,
+                    writer_threads,
+                    after_keys[table_name],
+                    batch_sizer,
+                    report.table(table_name),
+                    dead_letters,
+                    reader_threads,
+                    sqlite_settings,
+                    pipeline_depth,
+                )
+                return
+
+            with postgres_conn_context(**writer_settings) as postgres_conn:
+                migrate_table(
+                    sqlite_conn,
+                    postgres_conn,
+                    table_name,
+                    table_model,
+                    batch_size,
+                    writer,
+                    after_keys[table_name],
+                    batch_sizer,
+                    report.table(table_name),
+                    dead_letters,
+                    pipeline_depth,
+                )
+
+    with postgres_conn_context(**postgres_settings) as postgres_conn:
+        dependencies = fetch_table_dependencies(postgres_conn, list(TABLES))
+        create_checkpoint_table(postgres_conn)
+        create_deferred_index_table(postgres_conn)
+        if args.defer_indexes:
+            drop_secondary_indexes(postgres_conn, list(TABLES))
+        if args.shadow:
+            check_swappable(postgres_conn, list(TABLES))
+            create_shadow_tables(postgres_conn, list(TABLES))
+        after_keys = {
+            table_name: (
+                load_resume_key(postgres_conn, table_name)
+                if args.resume
+                else reset_checkpoints(postgres_conn, table_name)
+            )
+            for table_name in TABLES
         }
+    if not args.resume:
+        for table_name in TABLES:
+            dead_letters.reset(table_name)
+
+    try:
+        run_in_dependency_order(TABLES, dependencies, migrate, table_workers)
+    finally:
+        dead_letters.close()
+        rebuild_secondary_indexes(
+            postgres_settings,
+            list(TABLES) if args.defer_indexes else [],
+            index_workers,
+        )
+    for table_name, count in dead_letters.counts.items():
+        logger.warning(
+            f"{count} records of table {table_name} were rejected, "
+            f"see {dead_letters.path(table_name)}"
+        )
 
-        for table_name, table_model in tables.items():
-            migrate_table(
-                sqlite_conn, postgres_conn, table_name, table_model, batch_size
+    if args.shadow:
+        failed_rows = report.summary()["total"]["failed_rows"]
+        if failed_rows:
+            logger.error(
+                f"{failed_rows} records failed to load, keeping the live tables and "
+                f"leaving the shadow tables in {SHADOW_SCHEMA} for inspection"
+            )
+            publish_report(report, metrics_textfile)
+            sys.exit(1)
+        rejected_rows = sum(dead_letters.counts.values())
+        if rejected_rows and not args.swap_with_rejected:
+            logger.error(
+                f"{rejected_rows} records were rejected, keeping the live tables and "
+                f"leaving the shadow tables in {SHADOW_SCHEMA} for inspection; pass "
+                "--swap-with-rejected to swap them anyway"
+            )
+            publish_report(report, metrics_textfile)
+            sys.exit(1)
+        if rejected_rows:
+            logger.warning(
+                f"Swapping the shadow tables without the {rejected_rows} rejected "
+                "records, as --swap-with-rejected was passed"
             )
+        finalize_shadow_tables(
+            postgres_settings, list(TABLES), dependencies, index_workers
+        )
+        with postgres_conn_context(**postgres_settings) as postgres_conn:
+            swap_shadow_tables(postgres_conn, list(TABLES))
+    publish_report(report, metrics_textfile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+PHASES = ("fetch", "transform", "write", "commit")
+METRIC_PREFIX = "sqlite_to_postgres"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Compute a percentile of the values with the nearest-rank method.
+
+    Parameters:
+    - values (List[float]): Values to compute the percentile of.
+    - fraction (float): Percentile as a fraction, e.g. 0.95.
+
+    Returns:
+    - float: The percentile, or 0.0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # The smallest value with at least `fraction` of the values at or below it.
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class TableStats:
+    """
+    Timings and counters collected while a single table is migrated.
+
+    Time is split into phases: `fetch` is spent reading from SQLite, `transform`
+    turning SQLite rows into records, `write` building and executing the statements
+    in PostgreSQL, and `commit` committing them. Batch latency is the write and commit
+    time of a batch. Byte counts are estimates based on a sample of every batch.
+    `rows` only counts committed rows; rows PostgreSQL rejected one by one count as
+    `rejected_rows`, and rows of batches that were rolled back as `failed_rows`.
+
+    Updates may come from several writer threads at the same time.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.rejected_rows = 0
+        self.failed_rows = 0
+        self.bytes = 0
+        self.batch_latencies: List[float] = []
+        self.phase_seconds: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.started = time.perf_counter()
+        self.finished = self.started
+        self._lock = threading.Lock()
+
+    def add_time(self, phase: str, seconds: float):
+        with self._lock:
+            self.phase_seconds[phase] += seconds
+
+    @contextmanager
+    def phase(self, phase: str):
+        """
+        Add the time spent in the block to the given phase.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - started)
+
+    def add_batch(self, rows: int, nbytes: int, latency: float):
+        with self._lock:
+            self.rows += rows
+            self.bytes += nbytes
+            self.batch_latencies.append(latency)
+
+    def add_rejected(self, rows: int):
+        with self._lock:
+            self.rejected_rows += rows
+
+    def add_failed(self, rows: int):
+        with self._lock:
+            self.failed_rows += rows
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        """
+        Summarize the collected statistics as a JSON-serializable dictionary.
+        """
+        elapsed = self.finished - self.started
+        return {
+            "rows": self.rows,
+            "rejected_rows": self.rejected_rows,
+            "failed_rows": self.failed_rows,
+            "bytes": self.bytes,
+            "batches": len(self.batch_latencies),
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "batch_latency_p50": round(percentile(self.batch_latencies, 0.5), 4),
+            "batch_latency_p95": round(percentile(self.batch_latencies, 0.95), 4),
+            "phase_seconds": {
+                phase: round(seconds, 3)
+                for phase, seconds in self.phase_seconds.items()
+            },
+        }
+
+
+class MigrationReport:
+    """
+    Statistics of all tables of a migration run.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, TableStats] = {}
+        self.started = time.time()
+
+    def table(self, table_name: str) -> TableStats:
+        return self.tables.setdefault(table_name, TableStats())
+
+    def summary(self) -> dict:
+        """
+        Summarize the run as a JSON-serializable dictionary, per table and in total.
+        """
+        tables = {name: stats.summary() for name, stats in self.tables.items()}
+        elapsed = time.time() - self.started
+        rows = sum(table["rows"] for table in tables.values())
+        return {
+            "tables": tables,
+            "total": {
+                "rows": rows,
+                "rejected_rows": sum(
+                    table["rejected_rows"] for table in tables.values()
+                ),
+                "failed_rows": sum(table["failed_rows"] for table in tables.values()),
+                "bytes": sum(table["bytes"] for table in tables.values()),
+                "seconds": round(elapsed, 3),
+                "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+            },
+        }
+
+    def write_prometheus(self, path: str):
+        """
+        Write the statistics in the Prometheus text exposition format.
+
+        The file is written next to its destination and renamed into place, so the node
+        exporter's textfile collector never reads a partial file.
+
+        Parameters:
+        - path (str): Path of the `.prom` file to write.
+        """
+        summary = self.summary()
+        lines = []
+
+        def metric(name: str, help_text: str, samples: List[tuple]):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{METRIC_PREFIX}_{name}{label_text} {value}")
+
+        tables = summary["tables"]
+        metric(
+            "rows",
+            "Rows migrated in the last run.",
+            [((("table", name),), table["rows"]) for name, table in tables.items()],
+        )
+        metric(
+            "rejected_rows",
+            "Rows PostgreSQL rejected in the last run.",
+            [
+                ((("table", name),), table["rejected_rows"])
+                for name, table in tables.items()
+            ],
+        )
+        metric(
+            "failed_rows",
+            "Rows of batches that were rolled back in the last run.",
+            [
+                ((("table", name),), table["failed_rows"])
+                for name, table in tables.items()
+            ],
+        )
+        metric(
+            "bytes",
+            "Approximate bytes migrated in the last run.",
+            [((("table", name),), table["bytes"]) for name, table in tables.items()],
+        )
+        metric(
+            "seconds",
+            "Wall-clock time spent migrating the table in the last run.",
+            [((("table", name),), table["seconds"]) for name, table in tables.items()],
+        )
+        metric(
+            "phase_seconds",
+            "Time spent in each phase of the migration in the last run.",
+            [
+                ((("table", name), ("phase", phase)), seconds)
+                for name, table in tables.items()
+                for phase, seconds in table["phase_seconds"].items()
+            ],
+        )
+        metric(
+            "batch_latency_seconds",
+            "Write and commit latency of a batch in the last run.",
+            [
+                ((("table", name), ("quantile", quantile)), table[key])
+                for name, table in tables.items()
+                for quantile, key in (
+                    ("0.5", "batch_latency_p50"),
+                    ("0.95", "batch_latency_p95"),
+                )
+            ],
+        )
+        metric(
+            "last_run_timestamp_seconds",
+            "Time the last run finished at.",
+            [((), round(time.time()))],
+        )
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temporary_path, path)
@@ -1,11 +1,188 @@
-from typing import Type
+import logging
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import fields
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
 
-from get_from_sqlite import fetch_sqlite_columns, fetch_from_sqlite
-from put_into_postgres import insert_into_postgres
+from batch_sizing import AdaptiveBatchSize, estimate_batch_bytes
+from checkpoints import load_watermark, record_checkpoint, save_watermark
+from dead_letters import DeadLetterWriter
+from get_from_sqlite import (
+    EXCLUDED_COLUMN,
+    Batch,
+    fetch_changed_from_sqlite,
+    fetch_sqlite_columns,
+    fetch_from_sqlite,
+    split_key_ranges,
+    sqlite_conn_context,
+)
+from metrics import TableStats
+from put_into_postgres import (
+    BatchPipeline,
+    insert_into_postgres,
+    postgres_conn_context,
+    upsert_into_postgres,
+)
+from row_codecs import RowCodec
+
+QUEUE_POLL_INTERVAL = 0.1
+RANGE_MIN_ROWS = 50_000
+logger = logging.getLogger(__name__)
+
+
+def source_columns(sqlite_conn, table_name: str) -> List[str]:
+    """
+    Fetch the columns of an SQLite table that the fetch functions select.
+    """
+    columns = fetch_sqlite_columns(sqlite_conn, table_name)
+    return [column for column in columns if column != EXCLUDED_COLUMN]
+
+
+def transform_batch(batch: Batch, codec: RowCodec) -> Batch:
+    """
+    Turn the SQLite rows of a batch into records, dropping the leading `rowid`.
+    """
+    batch.records = codec.project(batch.records)
+    return batch
+
+
+def read_batches(
+    sqlite_conn,
+    table_name: str,
+    table_model: Type,
+    batch_size: Union[int, Callable[[], int]],
+    after_key: int,
+    stats: TableStats,
+    until_key: Optional[int] = None,
+) -> Iterator[Batch]:
+    """
+    Read the batches of a table from SQLite and transform them into records.
+
+    The time spent reading and transforming is added to the `fetch` and `transform`
+    phases of the table's statistics. When `until_key` is given, only the keys up to
+    it are read.
+    """
+    columns = source_columns(sqlite_conn, table_name)
+    codec = RowCodec(table_model, ["rowid"] + columns)
+    batches = fetch_from_sqlite(
+        sqlite_conn, table_name, columns, batch_size, after_key, until_key
+    )
+    while True:
+        with stats.phase("fetch"):
+            batch = next(batches, None)
+        if batch is None:
+            return
+        with stats.phase("transform"):
+            transform_batch(batch, codec)
+        yield batch
+
+
+def write_batch(
+    postgres_conn,
+    table_name: str,
+    table_model: Type,
+    batch: Batch,
+    writer: Callable,
+    batch_sizer: Optional[AdaptiveBatchSize] = None,
+    stats: Optional[TableStats] = None,
+    dead_letters: Optional[DeadLetterWriter] = None,
+    pipeline: Optional[BatchPipeline] = None,
+):
+    """
+    Write a batch into PostgreSQL and record its checkpoint in the same transaction.
+
+    The time spent until the checkpoint is recorded counts as the `write` phase, the
+    rest as `commit`. When a batch sizer is given, it's told how long every clean batch
+    took. Records the writer rejected are counted and sent to the dead-letter writer,
+    if any; they are covered by the checkpoint like the rest of the batch.
+
+    When a `pipeline` is given, the writer must be `pipeline_into_postgres`: the batch
+    is queued on it and accounted for once the pipeline reports its outcome, so the
+    `commit` phase includes the wait for the batches in flight with it.
+    """
+    checkpoint_time = []
+
+    def checkpoint(cursor):
+        record_checkpoint(cursor, table_name, batch.start_key, batch.end_key)
+        checkpoint_time.append(time.perf_counter())
+
+    def done(rejected: Optional[List[Tuple[tuple, str]]]):
+        finished = time.perf_counter()
+        committing = checkpoint_time[-1] if checkpoint_time else finished
+        committed = len(batch.records) - len(rejected) if rejected is not None else 0
+
+        if stats:
+            stats.add_time("write", committing - started)
+            stats.add_time("commit", finished - committing)
+            stats.add_batch(committed, nbytes, finished - started)
+            if rejected is None:
+                stats.add_failed(len(batch.records))
+            else:
+                stats.add_rejected(len(rejected))
+        if rejected and dead_letters:
+            columns = [f.name for f in fields(table_model)]
+            dead_letters.write(table_name, columns, rejected)
+        if batch_sizer and rejected == []:
+            batch_sizer.observe(len(batch.records), nbytes, finished - started)
+
+    nbytes = estimate_batch_bytes(batch.records)
+    started = time.perf_counter()
+    if pipeline is not None:
+        writer(
+            postgres_conn,
+            table_name,
+            table_model,
+            batch.records,
+            checkpoint,
+            pipeline=pipeline,
+            done=done,
+        )
+    else:
+        done(writer(postgres_conn, table_name, table_model, batch.records, checkpoint))
+
+
+def open_pipeline(postgres_conn, pipeline_depth: int):
+    """
+    Open a `BatchPipeline` on the connection, or nothing when `pipeline_depth` is 0.
+    """
+    if pipeline_depth > 0:
+        return BatchPipeline(postgres_conn, pipeline_depth)
+    return nullcontext()
+
+
+def batch_size_source(batch_size: int, batch_sizer: Optional[AdaptiveBatchSize]):
+    """
+    Pick what `fetch_from_sqlite` should read the batch size from.
+    """
+    if batch_sizer:
+        return lambda: batch_sizer.size
+    return batch_size
+
+
+def log_batch_size(table_name: str, batch_sizer: Optional[AdaptiveBatchSize]):
+    """
+    Log the batch size the auto-tuning settled on for a table.
+    """
+    if batch_sizer:
+        logger.info(
+            f"Auto-tuned batch size for table {table_name}: {batch_sizer.size} rows"
+        )
 
 
 def migrate_table(
-    sqlite_conn, postgres_conn, table_name: str, table_model: Type, batch_size: int
+    sqlite_conn,
+    postgres_conn,
+    table_name: str,
+    table_model: Type,
+    batch_size: int,
+    writer: Callable = insert_into_postgres,
+    after_key: int = 0,
+    batch_sizer: Optional[AdaptiveBatchSize] = None,
+    stats: Optional[TableStats] = None,
+    dead_letters: Optional[DeadLetterWriter] = None,
+    pipeline_depth: int = 0,
 ):
     """
     Migrate data from a table in an SQLite database to a table in a PostgreSQL database.
@@ -20,22 +197,409 @@ def migrate_table(
     - table_name (str): Name of the table to migrate.
     - table_model (Type): DataClass type representing the table's schema in the PostgreSQL database.
     - batch_size (int): Number of records to fetch and insert in each batch.
+    - writer (Callable): Function that writes a batch into PostgreSQL, either
+      `insert_into_postgres` (default) or `copy_into_postgres`.
+    - after_key (int): SQLite key to continue after, as returned by `load_resume_key`.
+    - batch_sizer (Optional[AdaptiveBatchSize]): When given, the batch size is tuned
+      while the table is migrated and `batch_size` is ignored.
+    - stats (Optional[TableStats]): Collects timings and counters of the migration.
+    - dead_letters (Optional[DeadLetterWriter]): Receives the records PostgreSQL rejected.
+    - pipeline_depth (int): With `pipeline_into_postgres`, the number of batches kept in
+      flight on the connection (see `BatchPipeline`). 0 (default) writes batches one at
+      a time.
 
     Notes:
     If a record with the same ID already exists in the PostgreSQL table, the insertion
-    will be skipped for that record (due to the ON CONFLICT clause in `insert_into_postgres` function).
+    will be skipped for that record (due to the ON CONFLICT clause used by both writers).
+    Records that fail on their own are rejected while the rest of their batch is
+    committed.
+    Every committed batch is recorded as a checkpoint in the same transaction, so the
+    checkpoint table must exist (see `create_checkpoint_table`).
     """
-    columns = fetch_sqlite_columns(sqlite_conn, table_name)
-    offset = 0
+    stats = stats or TableStats()
 
-    while True:
-        records = fetch_from_sqlite(
-            sqlite_conn, table_name, columns, offset, batch_size
+    with open_pipeline(postgres_conn, pipeline_depth) as pipeline:
+        for batch in read_batches(
+            sqlite_conn,
+            table_name,
+            table_model,
+            batch_size_source(batch_size, batch_sizer),
+            after_key,
+            stats,
+        ):
+            write_batch(
+                postgres_conn,
+                table_name,
+                table_model,
+                batch,
+                writer,
+                batch_sizer,
+                stats,
+                dead_letters,
+                pipeline,
+            )
+
+    stats.finish()
+    log_batch_size(table_name, batch_sizer)
+
+
+def write_batches(
+    batches: queue.Queue,
+    stop: threading.Event,
+    errors: List[Exception],
+    postgres_settings: Dict[str, str],
+    table_name: str,
+    table_model: Type,
+    writer: Callable,
+    batch_sizer: Optional[AdaptiveBatchSize] = None,
+    stats: Optional[TableStats] = None,
+    dead_letters: Optional[DeadLetterWriter] = None,
+    pipeline_depth: int = 0,
+):
+    """
+    Drain batches from the queue into PostgreSQL on a dedicated connection.
+
+    The worker runs until it receives the `None` sentinel. If anything fails, the
+    error is recorded, `stop` is set and the remaining batches are discarded until
+    the sentinel arrives, so the reader is never left blocked on a full queue. Batches
+    kept in flight on a pipeline are synced whenever the queue runs empty, so they
+    aren't held back waiting for the reader.
+
+    Parameters:
+    - batches (queue.Queue): Queue of batches, terminated by `None`.
+    - stop (threading.Event): Set when any thread of the pipeline has failed.
+    - errors (List[Exception]): Collects the errors raised by the workers.
+    - postgres_settings (Dict[str, str]): Keyword arguments for `postgres_conn_context`.
+    - table_name (str): Name of the table to write into.
+    - table_model (Type): DataClass type representing the table's schema.
+    - writer (Callable): Function that writes a batch into PostgreSQL.
+    - batch_sizer (Optional[AdaptiveBatchSize]): Told how long every batch took to write.
+    - stats (Optional[TableStats]): Collects timings and counters of the writes.
+    - dead_letters (Optional[DeadLetterWriter]): Receives the records PostgreSQL rejected.
+    - pipeline_depth (int): With `pipeline_into_postgres`, the number of batches kept in
+      flight on the connection. 0 (default) writes batches one at a time.
+    """
+    drained = False
+    try:
+        with postgres_conn_context(**postgres_settings) as postgres_conn, open_pipeline(
+            postgres_conn, pipeline_depth
+        ) as pipeline:
+            while not drained:
+                try:
+                    batch = batches.get_nowait()
+                except queue.Empty:
+                    if pipeline:
+                        pipeline.flush()
+                    batch = batches.get()
+                if batch is None:
+                    drained = True
+                elif not stop.is_set():
+                    write_batch(
+                        postgres_conn,
+                        table_name,
+                        table_model,
+                        batch,
+                        writer,
+                        batch_sizer,
+                        stats,
+                        dead_letters,
+                        pipeline,
+                    )
+    except Exception as e:
+        logger.exception(f"Writer failed while migrating table {table_name}: {e}")
+        errors.append(e)
+        stop.set()
+        while not drained:
+            drained = batches.get() is None
+
+
+def enqueue_batches(
+    source: Iterator[Batch], batches: queue.Queue, stop: threading.Event
+):
+    """
+    Put batches on the writers' queue until they run out or the pipeline stops.
+    """
+    for batch in source:
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=QUEUE_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        if stop.is_set():
+            return
+
+
+def read_range(
+    batches: queue.Queue,
+    stop: threading.Event,
+    errors: List[Exception],
+    sqlite_settings: Dict[str, object],
+    table_name: str,
+    table_model: Type,
+    batch_size: Union[int, Callable[[], int]],
+    after_key: int,
+    until_key: Optional[int],
+    stats: TableStats,
+):
+    """
+    Read a range of keys of a table on a dedicated SQLite connection into the queue.
+
+    If anything fails, the error is recorded and `stop` is set, so that the other
+    readers and the writers stop as well.
+    """
+    try:
+        with sqlite_conn_context(**sqlite_settings) as sqlite_conn:
+            enqueue_batches(
+                read_batches(
+                    sqlite_conn,
+                    table_name,
+                    table_model,
+                    batch_size,
+                    after_key,
+                    stats,
+                    until_key,
+                ),
+                batches,
+                stop,
+            )
+    except Exception as e:
+        logger.exception(f"Reader failed while migrating table {table_name}: {e}")
+        errors.append(e)
+        stop.set()
+
+
+def migrate_table_pipelined(
+    sqlite_conn,
+    postgres_settings: Dict[str, str],
+    table_name: str,
+    table_model: Type,
+    batch_size: int,
+    writer: Callable = insert_into_postgres,
+    queue_depth: int = 4,
+    workers: int = 1,
+    after_key: int = 0,
+    batch_sizer: Optional[AdaptiveBatchSize] = None,
+    stats: Optional[TableStats] = None,
+    dead_letters: Optional[DeadLetterWriter] = None,
+    readers: int = 1,
+    sqlite_settings: Optional[Dict[str, object]] = None,
+    pipeline_depth: int = 0,
+):
+    """
+    Migrate a table like `migrate_table`, overlapping SQLite reads with PostgreSQL writes.
+
+    The calling thread reads batches from SQLite into a bounded queue while `workers`
+    writer threads drain it, each on its own PostgreSQL connection. When the queue is
+    full the reader waits, so at most `queue_depth + workers` batches are held in memory,
+    plus `pipeline_depth` per worker kept in flight on a pipeline.
+    If the reader or any writer fails, every thread stops and the first error is raised.
+
+    With several `readers`, the keys of the table are split into ranges (see
+    `split_key_ranges`) that reader threads read concurrently into the same queue, each
+    on its own SQLite connection opened with `sqlite_settings`. Small tables are still
+    read by the calling thread alone.
+
+    Parameters:
+    - sqlite_conn (sqlite3.Connection): SQLite database connection object.
+    - postgres_settings (Dict[str, str]): Keyword arguments for `postgres_conn_context`.
+    - table_name (str): Name of the table to migrate.
+    - table_model (Type): DataClass type representing the table's schema in the PostgreSQL database.
+    - batch_size (int): Number of records to fetch and insert in each batch.
+    - writer (Callable): Function that writes a batch into PostgreSQL.
+    - queue_depth (int): Maximum number of batches waiting for a writer.
+    - workers (int): Number of writer threads.
+    - after_key (int): SQLite key to continue after, as returned by `load_resume_key`.
+    - batch_sizer (Optional[AdaptiveBatchSize]): When given, the batch size is tuned
+      while the table is migrated and `batch_size` is ignored.
+    - stats (Optional[TableStats]): Collects timings and counters of the migration.
+    - dead_letters (Optional[DeadLetterWriter]): Receives the records PostgreSQL rejected.
+    - readers (int): Maximum number of reader threads.
+    - sqlite_settings (Optional[Dict[str, object]]): Keyword arguments for
+      `sqlite_conn_context`, required for more than one reader.
+    - pipeline_depth (int): With `pipeline_into_postgres`, the number of batches each
+      worker keeps in flight on its connection. 0 (default) writes batches one at a time.
+
+    Raises:
+    - Exception: The first error raised by any of the readers or writers.
+
+    Notes:
+    With more than one worker or reader, batches may be committed out of order.
+    """
+    stats = stats or TableStats()
+    batches: queue.Queue = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    errors: List[Exception] = []
+    threads = [
+        threading.Thread(
+            target=write_batches,
+            args=(
+                batches,
+                stop,
+                errors,
+                postgres_settings,
+                table_name,
+                table_model,
+                writer,
+                batch_sizer,
+                stats,
+                dead_letters,
+                pipeline_depth,
+            ),
+            name=f"{table_name}-writer-{number}",
         )
+        for number in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    ranges = [(after_key, None)]
+    if readers > 1 and sqlite_settings:
+        ranges = split_key_ranges(
+            sqlite_conn, table_name, after_key, readers, RANGE_MIN_ROWS
+        )
+
+    completed = False
+    try:
+        if len(ranges) == 1:
+            enqueue_batches(
+                read_batches(
+                    sqlite_conn,
+                    table_name,
+                    table_model,
+                    batch_size_source(batch_size, batch_sizer),
+                    after_key,
+                    stats,
+                ),
+                batches,
+                stop,
+            )
+        else:
+            logger.info(
+                f"Reading table {table_name} in {len(ranges)} ranges concurrently"
+            )
+            reader_threads = [
+                threading.Thread(
+                    target=read_range,
+                    args=(
+                        batches,
+                        stop,
+                        errors,
+                        sqlite_settings,
+                        table_name,
+                        table_model,
+                        batch_size_source(batch_size, batch_sizer),
+                        start_key,
+                        end_key,
+                        stats,
+                    ),
+                    name=f"{table_name}-reader-{number}",
+                )
+                for number, (start_key, end_key) in enumerate(ranges)
+            ]
+            for thread in reader_threads:
+                thread.start()
+            for thread in reader_threads:
+                thread.join()
+        completed = True
+    finally:
+        if not completed:
+            stop.set()
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    stats.finish()
+    log_batch_size(table_name, batch_sizer)
+
+
+def sync_table(
+    sqlite_conn,
+    postgres_conn,
+    table_name: str,
+    table_model: Type,
+    batch_size: int,
+    stats: Optional[TableStats] = None,
+) -> Dict[str, int]:
+    """
+    Apply the rows of an SQLite table changed since the previous sync to PostgreSQL.
+
+    Only rows whose `updated_at` (or `created_at`, for tables without `updated_at`) is
+    at or after the table's watermark are extracted. They are upserted, so rows that
+    already exist in PostgreSQL are updated instead of skipped. Rows stamped with the
+    watermark itself are extracted again by every sync, since rows written after the
+    previous sync may share its timestamp; they are upserted as unchanged. The
+    watermark is moved forward once the whole delta has been applied; if the sync is
+    interrupted, the next run extracts the same delta again, which is harmless.
 
-        if not records:
+    Parameters:
+    - sqlite_conn (sqlite3.Connection): SQLite database connection object.
+    - postgres_conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table to sync.
+    - table_model (Type): DataClass type representing the table's schema in the PostgreSQL database.
+    - batch_size (int): Number of records to fetch and upsert in each batch.
+    - stats (Optional[TableStats]): Collects timings and counters of the sync.
+
+    Returns:
+    - Dict[str, int]: Number of rows that were inserted, updated, unchanged and failed.
+
+    Notes:
+    Rows with a NULL timestamp are only picked up by the first sync of a table. The
+    watermark table must exist (see `create_watermark_table`).
+    """
+    field_names = [f.name for f in fields(table_model)]
+    watermark_column = "updated_at" if "updated_at" in field_names else "created_at"
+    watermark_index = field_names.index(watermark_column)
+    watermark = load_watermark(postgres_conn, table_name)
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    stats = stats or TableStats()
+
+    columns = source_columns(sqlite_conn, table_name)
+    codec = RowCodec(table_model, columns)
+    changes = fetch_changed_from_sqlite(
+        sqlite_conn, table_name, columns, batch_size, watermark_column, watermark
+    )
+    while True:
+        with stats.phase("fetch"):
+            rows = next(changes, None)
+        if rows is None:
             break
+        with stats.phase("transform"):
+            records = codec.project(rows)
+
+        nbytes = estimate_batch_bytes(records)
+        started = time.perf_counter()
+        result = upsert_into_postgres(postgres_conn, table_name, table_model, records)
+        latency = time.perf_counter() - started
+        stats.add_time("write", latency)
+        stats.add_batch(len(records) if result is not None else 0, nbytes, latency)
+        if result is None:
+            counts["failed"] += len(records)
+            stats.add_failed(len(records))
+            continue
+        inserted, updated = result
+        counts["inserted"] += inserted
+        counts["updated"] += updated
+        counts["unchanged"] += len(records) - inserted - updated
+        if records[-1][watermark_index] is not None:
+            watermark = records[-1][watermark_index]
 
-        insert_into_postgres(postgres_conn, table_name, table_model, records)
+    if counts["failed"]:
+        logger.warning(
+            f"Keeping the watermark of table {table_name}, "
+            f"{counts['failed']} rows failed to sync"
+        )
+    elif watermark is not None:
+        save_watermark(postgres_conn, table_name, watermark)
 
-        offset += batch_size
+    stats.finish()
+    logger.info(
+        f"Synced table {table_name}: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+        f"{counts['failed']} failed"
+    )
+    return counts
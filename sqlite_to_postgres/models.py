@@ -1,13 +1,14 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
+from uuid import UUID
 
 
 @dataclass
 class FilmWork:
-    id: str
+    id: UUID
     title: str
     description: str
-    creation_date: datetime
+    creation_date: date
     rating: float
     type: str
     created_at: datetime
@@ -16,7 +17,7 @@ class FilmWork:
 
 @dataclass
 class Genre:
-    id: str
+    id: UUID
     name: str
     description: str
     created_at: datetime
@@ -25,7 +26,7 @@ class Genre:
 
 @dataclass
 class Person:
-    id: str
+    id: UUID
     full_name: str
     created_at: datetime
     updated_at: datetime
@@ -33,16 +34,25 @@ class Person:
 
 @dataclass
 class GenreFilmWork:
-    id: str
-    film_work_id: str
-    genre_id: str
+    id: UUID
+    film_work_id: UUID
+    genre_id: UUID
     created_at: datetime
 
 
 @dataclass
 class PersonFilmWork:
-    id: str
-    film_work_id: str
-    person_id: str
+    id: UUID
+    film_work_id: UUID
+    person_id: UUID
     role: str
     created_at: datetime
+
+
+TABLES = {
+    "film_work": FilmWork,
+    "genre": Genre,
+    "person": Person,
+    "genre_film_work": GenreFilmWork,
+    "person_film_work": PersonFilmWork,
+}
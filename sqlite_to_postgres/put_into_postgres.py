@@ -1,15 +1,32 @@
+import io
 import logging
-from contextlib import contextmanager
-from dataclasses import fields
-from typing import Type, List
+from contextlib import ExitStack, contextmanager, suppress
+from dataclasses import dataclass, fields
+from typing import Callable, List, Optional, Tuple, Type
 
 import psycopg2
 
+try:
+    import psycopg
+except ImportError:  # psycopg 3 is only needed by the pipeline writer.
+    psycopg = None
+
+SCHEMA = "content"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+COPY_NULL = "\\N"
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+PIPELINE_ROW_ERRORS = (
+    (psycopg.errors.DataError, psycopg.errors.IntegrityError) if psycopg else ()
+)
+PIPELINE_MAX_PARAMETERS = 65_535
+PIPELINE_DEPTH = 8
 logger = logging.getLogger(__name__)
 
 
 @contextmanager
-def postgres_conn_context(host: str, dbname: str, user: str, password: str):
+def postgres_conn_context(
+    host: str, dbname: str, user: str, password: str, driver: str = "psycopg2"
+):
     """
     Context manager for managing PostgreSQL database connections.
 
@@ -21,60 +38,685 @@ def postgres_conn_context(host: str, dbname: str, user: str, password: str):
     - dbname (str): Name of the database to connect to.
     - user (str): Username to use for authentication.
     - password (str): Password to use for authentication.
+    - driver (str): "psycopg2" (default), or "psycopg3" for the connections of the
+      pipeline writer (see `WRITER_DRIVERS`). psycopg 3 connections are opened in
+      autocommit mode, and their transactions are delimited explicitly. They don't
+      prepare statements automatically, as the preparations queued in a pipeline are
+      skipped when an earlier statement fails, while psycopg counts them as done.
 
     Yields:
-    - psycopg2.extensions.connection: PostgreSQL database connection object.
+    - psycopg2.extensions.connection: PostgreSQL database connection object, or a
+      `psycopg.Connection` with the psycopg3 driver.
+
+    Raises:
+    - ValueError: If the psycopg3 driver is requested but psycopg 3 isn't installed.
 
     Example:
     with postgres_conn_context('localhost', 'mydb', 'user', 'pass') as conn:
         # Perform database operations using conn
     """
-    conn = psycopg2.connect(host=host, dbname=dbname, user=user, password=password)
+    if driver == "psycopg3":
+        if psycopg is None:
+            raise ValueError(
+                "The psycopg3 driver requires psycopg 3: poetry install -E pipeline"
+            )
+        conn = psycopg.connect(
+            host=host,
+            dbname=dbname,
+            user=user,
+            password=password,
+            autocommit=True,
+            prepare_threshold=None,
+        )
+    else:
+        conn = psycopg2.connect(host=host, dbname=dbname, user=user, password=password)
     try:
         yield conn
     finally:
         conn.close()
 
 
-def insert_into_postgres(
-    conn, table_name: str, table_model: Type, records: List[tuple]
+def execute_insert(
+    cursor,
+    table_name: str,
+    columns: List[str],
+    records: List[tuple],
+    schema: str = SCHEMA,
 ):
+    """
+    Insert records with a single multi-row INSERT, skipping IDs that already exist.
+
+    Raises:
+    - psycopg2.Error: If there's an error in inserting records into PostgreSQL.
+    """
+    placeholders = ", ".join(["%s"] * len(columns))
+
+    mogrified_values = [
+        cursor.mogrify(f"({placeholders})", record).decode("utf-8")
+        for record in records
+    ]
+    all_values = ", ".join(mogrified_values)
+
+    insert_query = f"""
+    INSERT INTO {schema}.{table_name} ({','.join(columns)})
+    VALUES {all_values}
+    ON CONFLICT (id) DO NOTHING;
+    """
+    cursor.execute(insert_query)
+
+
+def insert_isolating_errors(
+    cursor,
+    table_name: str,
+    columns: List[str],
+    records: List[tuple],
+    schema: str = SCHEMA,
+    execute: Optional[Callable] = None,
+    errors: Tuple[Type[Exception], ...] = ROW_ERRORS,
+) -> List[Tuple[tuple, str]]:
+    """
+    Insert records that failed as a batch, isolating the records that can't be inserted.
+
+    The records are split in halves, and every half is inserted under a savepoint. A
+    half that fails is rolled back to its savepoint and split again, until the failing
+    records are inserted one at a time. Every other record is inserted in the current
+    transaction, in as few statements as the failures allow.
+
+    Parameters:
+    - cursor (psycopg2.extensions.cursor): Cursor of a transaction with no failed statement.
+    - table_name (str): Name of the table to insert records into.
+    - columns (List[str]): Names of the columns the records hold, in order.
+    - records (List[tuple]): Records that failed to be inserted together.
+    - schema (str): Schema of the table.
+    - execute (Optional[Callable]): Inserts a part of the records, `execute_insert` by
+      default.
+    - errors (Tuple[Type[Exception], ...]): Errors caused by the values of a record.
+
+    Returns:
+    - List[Tuple[tuple, str]]: The records that failed on their own, with their error.
+
+    Raises:
+    - psycopg2.Error: If an error unrelated to the values of the records occurs.
+    """
+    rejected: List[Tuple[tuple, str]] = []
+    execute = execute or execute_insert
+
+    def insert_part(part: List[tuple]):
+        cursor.execute("SAVEPOINT isolate_errors")
+        try:
+            execute(cursor, table_name, columns, part, schema)
+            cursor.execute("RELEASE SAVEPOINT isolate_errors")
+        except errors as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT isolate_errors")
+            if len(part) == 1:
+                rejected.append((part[0], str(e).strip()))
+            else:
+                split(part)
+
+    def split(part: List[tuple]):
+        middle = len(part) // 2
+        insert_part(part[:middle])
+        insert_part(part[middle:])
+
+    if len(records) == 1:
+        insert_part(records)
+    else:
+        split(records)
+    return rejected
+
+
+def write_or_isolate_errors(
+    conn,
+    table_name: str,
+    columns: List[str],
+    records: List[tuple],
+    execute: Callable,
+    before_commit: Optional[Callable],
+    schema: str = SCHEMA,
+) -> Optional[List[Tuple[tuple, str]]]:
+    """
+    Write a batch in a single transaction, isolating the bad records if it fails.
+
+    The batch is first written as a whole with `execute`, so a clean batch costs
+    exactly one statement. If that fails because of the values of some records, the
+    transaction is rolled back and the batch is inserted again with
+    `insert_isolating_errors`, which commits every record but the failing ones.
+    Deferred constraints, such as the foreign keys Django creates, are made immediate
+    for the second attempt, so that their violations are caught per record instead of
+    failing the commit.
+
+    Returns:
+    - Optional[List[Tuple[tuple, str]]]: The rejected records with their error, or None
+      if the whole batch was rolled back.
+    """
+    cursor = conn.cursor()
+    try:
+        try:
+            execute(cursor, table_name, columns, records, schema)
+            if before_commit:
+                before_commit(cursor)
+            conn.commit()
+            return []
+        except ROW_ERRORS as e:
+            conn.rollback()
+            logger.warning(
+                f"Batch of {len(records)} records failed in table {table_name}, "
+                f"isolating the failing records: {e}"
+            )
+
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        rejected = insert_isolating_errors(cursor, table_name, columns, records, schema)
+        if before_commit:
+            before_commit(cursor)
+        conn.commit()
+        return rejected
+
+    except psycopg2.Error as e:
+        logger.exception(f"Error writing records into PostgreSQL: {e}")
+        conn.rollback()
+        return None
+
+
+def insert_into_postgres(
+    conn,
+    table_name: str,
+    table_model: Type,
+    records: List[tuple],
+    before_commit: Optional[Callable] = None,
+    schema: str = SCHEMA,
+) -> Optional[List[Tuple[tuple, str]]]:
     """
     Insert a batch of records into a table in the PostgreSQL database.
 
     If a record with the same ID already exists in the table, the insertion will
-    be skipped for that record (due to the ON CONFLICT clause).
+    be skipped for that record (due to the ON CONFLICT clause). If some records can't
+    be inserted, e.g. because of an invalid value or a missing foreign key, they are
+    isolated and rejected while the rest of the batch is committed (see
+    `write_or_isolate_errors`).
 
     Parameters:
     - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
     - table_name (str): Name of the table to insert records into.
     - table_model (Type): DataClass type representing the table's schema.
     - records (List[tuple]): List of records to insert. Each record is represented as a tuple.
+    - before_commit (Optional[Callable]): Called with the cursor right before the commit,
+      to run additional statements in the same transaction.
+    - schema (str): Schema of the table, e.g. to load a shadow copy of it.
+
+    Returns:
+    - Optional[List[Tuple[tuple, str]]]: The rejected records with their error, or None
+      if the whole batch was rolled back.
 
     Raises:
     - psycopg2.Error: If there's an error in inserting records into PostgreSQL.
     """
-    cursor = conn.cursor()
-    schema = "content"
     columns = [f.name for f in fields(table_model)]
-    placeholders = ", ".join(["%s"] * len(columns))
+    return write_or_isolate_errors(
+        conn, table_name, columns, records, execute_insert, before_commit, schema
+    )
 
-    mogrified_values = [
-        cursor.mogrify(f"({placeholders})", record).decode("utf-8")
-        for record in records
-    ]
-    all_values = ", ".join(mogrified_values)
 
-    insert_query = f"""
+def format_copy_value(value) -> str:
+    """
+    Render a single value in PostgreSQL COPY text format.
+
+    Parameters:
+    - value: Value to render. None becomes the COPY NULL marker.
+
+    Returns:
+    - str: The escaped textual representation of the value.
+    """
+    if value is None:
+        return COPY_NULL
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_to_staging(
+    cursor,
+    table_name: str,
+    columns: List[str],
+    records: List[tuple],
+    schema: str = SCHEMA,
+):
+    """
+    Stream a batch of records with `COPY ... FROM STDIN` into the staging table of a table.
+
+    The staging table is a temporary copy of the target table's structure. It is created
+    once per connection and is emptied on every commit.
+
+    Parameters:
+    - cursor (psycopg2.extensions.cursor): Cursor of the transaction writing the batch.
+    - table_name (str): Name of the target table.
+    - columns (List[str]): Names of the columns the records hold, in order.
+    - records (List[tuple]): List of records to copy. Each record is represented as a tuple.
+    - schema (str): Schema of the target table.
+
+    Returns:
+    - str: Name of the staging table holding the batch.
+
+    Raises:
+    - psycopg2.Error: If there's an error in copying records into PostgreSQL.
+    """
+    staging_table = f"staging_{table_name}"
+
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write("\t".join([format_copy_value(value) for value in record]))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor.execute(
+        f"""
+    CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table}
+    (LIKE {schema}.{table_name} INCLUDING DEFAULTS)
+    ON COMMIT DELETE ROWS;
+    """
+    )
+    cursor.copy_expert(f"COPY {staging_table} ({','.join(columns)}) FROM STDIN", buffer)
+    return staging_table
+
+
+def execute_copy(
+    cursor,
+    table_name: str,
+    columns: List[str],
+    records: List[tuple],
+    schema: str = SCHEMA,
+):
+    """
+    Copy records into the staging table and merge them, skipping IDs that already exist.
+
+    Raises:
+    - psycopg2.Error: If there's an error in copying records into PostgreSQL.
+    """
+    staging_table = copy_to_staging(cursor, table_name, columns, records, schema)
+    cursor.execute(
+        f"""
     INSERT INTO {schema}.{table_name} ({','.join(columns)})
-    VALUES {all_values}
+    SELECT {','.join(columns)} FROM {staging_table}
     ON CONFLICT (id) DO NOTHING;
     """
+    )
+
+
+def copy_into_postgres(
+    conn,
+    table_name: str,
+    table_model: Type,
+    records: List[tuple],
+    before_commit: Optional[Callable] = None,
+    schema: str = SCHEMA,
+) -> Optional[List[Tuple[tuple, str]]]:
+    """
+    Insert a batch of records into a table in the PostgreSQL database using COPY.
+
+    The batch is streamed into a temporary staging table (see `copy_to_staging`) and
+    then merged into the target table. If a record with the same ID already exists in
+    the table, the insertion will be skipped for that record (due to the ON CONFLICT
+    clause), and failing records are rejected, exactly as in `insert_into_postgres`.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table to insert records into.
+    - table_model (Type): DataClass type representing the table's schema.
+    - records (List[tuple]): List of records to insert. Each record is represented as a tuple.
+    - before_commit (Optional[Callable]): Called with the cursor right before the commit,
+      to run additional statements in the same transaction.
+    - schema (str): Schema of the table, e.g. to load a shadow copy of it.
+
+    Returns:
+    - Optional[List[Tuple[tuple, str]]]: The rejected records with their error, or None
+      if the whole batch was rolled back.
+
+    Raises:
+    - psycopg2.Error: If there's an error in inserting records into PostgreSQL.
+    """
+    columns = [f.name for f in fields(table_model)]
+    return write_or_isolate_errors(
+        conn, table_name, columns, records, execute_copy, before_commit, schema
+    )
+
+
+def upsert_into_postgres(
+    conn,
+    table_name: str,
+    table_model: Type,
+    records: List[tuple],
+    before_commit: Optional[Callable] = None,
+) -> Optional[Tuple[int, int]]:
+    """
+    Insert or update a batch of records in a table in the PostgreSQL database.
+
+    Unlike the other writers, a record whose ID already exists in the table replaces
+    the stored row (due to the ON CONFLICT DO UPDATE clause). Rows whose values are
+    identical to the incoming record are left untouched.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_name (str): Name of the table to write records into.
+    - table_model (Type): DataClass type representing the table's schema.
+    - records (List[tuple]): List of records to write. Each record is represented as a tuple.
+    - before_commit (Optional[Callable]): Called with the cursor right before the commit,
+      to run additional statements in the same transaction.
+
+    Returns:
+    - Optional[Tuple[int, int]]: Number of inserted and of updated rows, or None if the
+      batch failed and was rolled back. The remaining records were unchanged.
+
+    Raises:
+    - psycopg2.Error: If there's an error in writing records into PostgreSQL.
+    """
+    cursor = conn.cursor()
+    columns = [f.name for f in fields(table_model)]
+    updated_columns = [column for column in columns if column != "id"]
+    assignments = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in updated_columns
+    )
+    current = ", ".join(f"target.{column}" for column in updated_columns)
+    incoming = ", ".join(f"EXCLUDED.{column}" for column in updated_columns)
 
     try:
-        cursor.execute(insert_query)
+        staging_table = copy_to_staging(cursor, table_name, columns, records)
+        cursor.execute(
+            f"""
+        WITH upserted AS (
+            INSERT INTO {SCHEMA}.{table_name} AS target ({','.join(columns)})
+            SELECT {','.join(columns)} FROM {staging_table}
+            ON CONFLICT (id) DO UPDATE SET {assignments}
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+        FROM upserted;
+        """
+        )
+        inserted, updated = cursor.fetchone()
+        if before_commit:
+            before_commit(cursor)
         conn.commit()
+        return inserted, updated
 
     except psycopg2.Error as e:
-        logger.exception(f"Error inserting record into PostgreSQL: {e}")
+        logger.exception(f"Error upserting records into PostgreSQL: {e}")
         conn.rollback()
+        return None
+
+
+def execute_pipelined_insert(
+    cursor,
+    table_name: str,
+    columns: List[str],
+    records: List[tuple],
+    schema: str = SCHEMA,
+):
+    """
+    Insert records with multi-row INSERTs bound on the server, skipping existing IDs.
+
+    The records are split so that no statement exceeds the number of parameters the
+    protocol allows.
+    """
+    rows_per_statement = PIPELINE_MAX_PARAMETERS // len(columns)
+    row_placeholders = f"({', '.join(['%s'] * len(columns))})"
+    for offset in range(0, len(records), rows_per_statement):
+        part = records[offset : offset + rows_per_statement]
+        cursor.execute(
+            f"""
+        INSERT INTO {schema}.{table_name} ({','.join(columns)})
+        VALUES {', '.join([row_placeholders] * len(part))}
+        ON CONFLICT (id) DO NOTHING;
+        """,
+            [value for record in part for value in record],
+        )
+
+
+@dataclass
+class PipelinedBatch:
+    """
+    A batch queued on a `BatchPipeline`, with the cursor its statements were sent on.
+    """
+
+    table_name: str
+    columns: List[str]
+    records: List[tuple]
+    before_commit: Optional[Callable]
+    schema: str
+    done: Callable[[Optional[List[Tuple[tuple, str]]]], None]
+    cursor: object = None
+
+
+class BatchPipeline:
+    """
+    Keep batches in flight on a psycopg 3 connection, syncing once every `depth` batches.
+
+    Every batch is queued in pipeline mode as its own transaction: `BEGIN`, the INSERT
+    statements, the statements of `before_commit` and `COMMIT`, without waiting for any
+    result. The pipeline stays open across batches and is only synced once `depth`
+    batches are queued or `flush` is called, so the connection waits for a round trip
+    every `depth` batches instead of after every batch, which is what dominates when
+    the database is far away. The connection must be in autocommit mode, as
+    `postgres_conn_context` opens it with the psycopg3 driver.
+
+    When a batch fails, the batches queued before it are committed and the server skips
+    every statement after it until the sync. The batches are told apart by the status of
+    the last statement each cursor completed: the failed batch is written again outside
+    the pipeline with `insert_isolating_errors`, so that only its failing records are
+    rejected, and the skipped batches are queued again.
+
+    The outcome of every batch is passed to its `done` callback once it's known: the
+    rejected records with their error, or None if the whole batch was rolled back.
+    """
+
+    def __init__(self, conn, depth: int = PIPELINE_DEPTH):
+        self.conn = conn
+        self.depth = depth
+        self._pending: List[PipelinedBatch] = []
+        self._pipeline = None
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        self._leave()
+
+    def submit(
+        self,
+        table_name: str,
+        table_model: Type,
+        records: List[tuple],
+        done: Callable[[Optional[List[Tuple[tuple, str]]]], None],
+        before_commit: Optional[Callable] = None,
+        schema: str = SCHEMA,
+    ):
+        """
+        Queue a batch of records, syncing the pipeline if `depth` batches are queued.
+
+        Parameters:
+        - table_name (str): Name of the table to insert records into.
+        - table_model (Type): DataClass type representing the table's schema.
+        - records (List[tuple]): List of records to insert.
+        - done (Callable): Called with the outcome of the batch once it's known.
+        - before_commit (Optional[Callable]): Called with the cursor right before the
+          commit, to queue additional statements in the same transaction.
+        - schema (str): Schema of the table, e.g. to load a shadow copy of it.
+        """
+        columns = [f.name for f in fields(table_model)]
+        self._send(
+            [PipelinedBatch(table_name, columns, records, before_commit, schema, done)]
+        )
+        if len(self._pending) >= self.depth:
+            self.flush()
+
+    def flush(self):
+        """
+        Sync the pipeline and report the outcome of every batch still in flight.
+        """
+        while self._pending:
+            try:
+                self._pipeline.sync()
+            except psycopg.Error as e:
+                self._send(self._recover(e))
+            else:
+                batches, self._pending = self._pending, []
+                for batch in batches:
+                    batch.done([])
+
+    def _send(self, batches: List[PipelinedBatch]):
+        """
+        Queue batches on the pipeline, recovering when an earlier batch turns out failed.
+        """
+        while batches:
+            batch = batches.pop(0)
+            if self._pipeline is None:
+                self._pipeline = self._stack.enter_context(self.conn.pipeline())
+            self._pending.append(batch)
+            batch.cursor = self.conn.cursor()
+            try:
+                batch.cursor.execute("BEGIN")
+                execute_pipelined_insert(
+                    batch.cursor,
+                    batch.table_name,
+                    batch.columns,
+                    batch.records,
+                    batch.schema,
+                )
+                if batch.before_commit:
+                    batch.before_commit(batch.cursor)
+                batch.cursor.execute("COMMIT")
+            except psycopg.Error as e:
+                batches[:0] = self._recover(e)
+
+    def _recover(self, error: Exception) -> List[PipelinedBatch]:
+        """
+        Settle the batches in flight after `error`, returning those the server skipped.
+        """
+        # Collect the results of the skipped statements before leaving the pipeline,
+        # which would otherwise log them as an ignored error.
+        with suppress(psycopg.Error):
+            self._pipeline.sync()
+        self._leave()
+        self.conn.rollback()
+
+        batches, self._pending = self._pending, []
+        failed = next(
+            (
+                number
+                for number, batch in enumerate(batches)
+                if batch.cursor.statusmessage != "COMMIT"
+            ),
+            None,
+        )
+        if failed is None:
+            raise error
+        for batch in batches[:failed]:
+            batch.done([])
+        batches[failed].done(self._isolate(batches[failed], error))
+        return batches[failed + 1 :]
+
+    def _leave(self):
+        """
+        Leave pipeline mode, if the connection is in it.
+        """
+        self._pipeline = None
+        self._stack.close()
+
+    def _isolate(
+        self, batch: PipelinedBatch, error: Exception
+    ) -> Optional[List[Tuple[tuple, str]]]:
+        """
+        Write a failed batch again outside the pipeline, rejecting its failing records.
+        """
+        if not isinstance(error, PIPELINE_ROW_ERRORS):
+            logger.exception(f"Error writing records into PostgreSQL: {error}")
+            return None
+        logger.warning(
+            f"Batch of {len(batch.records)} records failed in table "
+            f"{batch.table_name}, isolating the failing records: {error}"
+        )
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            rejected = insert_isolating_errors(
+                cursor,
+                batch.table_name,
+                batch.columns,
+                batch.records,
+                batch.schema,
+                execute_pipelined_insert,
+                PIPELINE_ROW_ERRORS,
+            )
+            if batch.before_commit:
+                batch.before_commit(cursor)
+            cursor.execute("COMMIT")
+            return rejected
+        except psycopg.Error as e:
+            logger.exception(f"Error writing records into PostgreSQL: {e}")
+            self.conn.rollback()
+            return None
+
+
+def pipeline_into_postgres(
+    conn,
+    table_name: str,
+    table_model: Type,
+    records: List[tuple],
+    before_commit: Optional[Callable] = None,
+    schema: str = SCHEMA,
+    pipeline: Optional[BatchPipeline] = None,
+    done: Optional[Callable[[Optional[List[Tuple[tuple, str]]]], None]] = None,
+) -> Optional[List[Tuple[tuple, str]]]:
+    """
+    Insert a batch of records with psycopg 3, in pipeline mode.
+
+    `BEGIN`, the INSERT statements, the statements of `before_commit` and `COMMIT`
+    are all sent before any result is awaited, so a batch costs one round trip to the
+    server instead of one per statement. When a `pipeline` is given, the batch is
+    queued on it and its outcome is passed to `done` once the pipeline is synced,
+    keeping several batches in flight on the connection (see `BatchPipeline`).
+    Otherwise the batch is synced right away. If a record with the same ID already
+    exists in the table, the insertion will be skipped for that record, and failing
+    records are rejected, exactly as in `insert_into_postgres`.
+
+    Parameters:
+    - conn (psycopg.Connection): Connection opened with the psycopg3 driver.
+    - table_name (str): Name of the table to insert records into.
+    - table_model (Type): DataClass type representing the table's schema.
+    - records (List[tuple]): List of records to insert. Each record is represented as a tuple.
+    - before_commit (Optional[Callable]): Called with the cursor right before the commit,
+      to run additional statements in the same transaction.
+    - schema (str): Schema of the table, e.g. to load a shadow copy of it.
+    - pipeline (Optional[BatchPipeline]): Pipeline open on `conn` to queue the batch on.
+    - done (Optional[Callable]): Called with the outcome of a batch queued on `pipeline`.
+
+    Returns:
+    - Optional[List[Tuple[tuple, str]]]: The rejected records with their error, or None
+      if the whole batch was rolled back. When queued on a `pipeline`, the outcome is
+      passed to `done` instead and None is returned.
+    """
+    if pipeline is not None:
+        pipeline.submit(table_name, table_model, records, done, before_commit, schema)
+        return None
+
+    outcome = []
+    with BatchPipeline(conn, depth=1) as pipeline:
+        pipeline.submit(
+            table_name, table_model, records, outcome.append, before_commit, schema
+        )
+    return outcome[0]
+
+
+WRITERS = {
+    "insert": insert_into_postgres,
+    "copy": copy_into_postgres,
+    "pipeline": pipeline_into_postgres,
+}
+
+# Driver of the connections every writer expects, for `postgres_conn_context`.
+WRITER_DRIVERS = {
+    "insert": "psycopg2",
+    "copy": "psycopg2",
+    "pipeline": "psycopg3",
+}
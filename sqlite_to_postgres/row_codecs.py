@@ -0,0 +1,125 @@
+import re
+from dataclasses import fields
+from datetime import date, datetime
+from operator import itemgetter
+from typing import Callable, Dict, List, Sequence, Type
+from uuid import UUID
+
+# The fraction of the seconds of a timestamp, up to its offset.
+FRACTION = re.compile(r"\.\d{1,5}(?!\d)")
+
+
+def parse_timestamp(text: str) -> datetime:
+    """
+    Parse a timestamp in the format stored by the SQLite source.
+
+    Timestamps look like `2021-06-16 20:14:09.221855+00`. The hour-only UTC offset is
+    expanded to `+00:00` and the text is parsed with `datetime.fromisoformat`, which is
+    far faster than a general-purpose date parser. Before Python 3.11 it only accepts
+    fractions of 3 or 6 digits, so other fractions, e.g. `.22`, are padded to 6 digits
+    when the first attempt fails.
+
+    Parameters:
+    - text (str): Timestamp as stored in SQLite.
+
+    Returns:
+    - datetime: The timestamp, timezone-aware when the text has an offset.
+
+    Raises:
+    - ValueError: If the text isn't a timestamp.
+    """
+    if len(text) > 3 and text[-3] in "+-":
+        text += ":00"
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        padded = FRACTION.sub(lambda match: match[0].ljust(7, "0"), text, count=1)
+        if padded == text:
+            raise
+        return datetime.fromisoformat(padded)
+
+
+def parse_date(text: str) -> date:
+    return date.fromisoformat(text[:10])
+
+
+def parse_uuid(text: str) -> UUID:
+    return UUID(text)
+
+
+DECODERS: Dict[type, Callable] = {
+    datetime: parse_timestamp,
+    date: parse_date,
+    UUID: parse_uuid,
+}
+
+
+class RowCodec:
+    """
+    Converter between SQLite rows and the records of a table, built once per table.
+
+    The position of every field of the table's dataclass in the SQLite row is looked
+    up when the codec is built, so converting a row is a single `itemgetter` call and
+    neither column names nor dataclass instances are involved per row. Fields are
+    returned in the order of the dataclass, which is the order the writers use.
+
+    - `project` only picks and reorders the columns. Values stay as SQLite returned
+      them, which is exactly the text PostgreSQL parses on input, so the migration
+      doesn't pay for parsing values that are sent back as text anyway.
+    - `decode` also turns timestamp, date and UUID text into Python objects, as
+      needed to compare SQLite rows with the rows psycopg2 returns.
+
+    Parameters:
+    - table_model (Type): DataClass type representing the table's schema.
+    - source_columns (Sequence[str]): Columns of the SQLite rows, in order.
+
+    Raises:
+    - ValueError: If a field of the dataclass is missing from the SQLite columns.
+    """
+
+    def __init__(self, table_model: Type, source_columns: Sequence[str]):
+        model_fields = fields(table_model)
+        missing = [f.name for f in model_fields if f.name not in source_columns]
+        if missing:
+            raise ValueError(
+                f"{table_model.__name__} fields missing from the SQLite columns: "
+                f"{', '.join(missing)}"
+            )
+
+        self.columns = [f.name for f in model_fields]
+        source_columns = list(source_columns)
+        indexes = [source_columns.index(name) for name in self.columns]
+        if len(indexes) == 1:
+            index = indexes[0]
+            self._getter = lambda row: (row[index],)
+        else:
+            self._getter = itemgetter(*indexes)
+        self._decoders = [
+            (position, DECODERS[f.type])
+            for position, f in enumerate(model_fields)
+            if f.type in DECODERS
+        ]
+
+    def project(self, rows: List[Sequence]) -> List[tuple]:
+        """
+        Pick the fields of the table from a batch of SQLite rows.
+        """
+        return list(map(self._getter, rows))
+
+    def decode(self, rows: List[Sequence]) -> List[tuple]:
+        """
+        Pick the fields of the table from a batch of SQLite rows and parse their values.
+
+        NULLs and values that SQLite already returned as non-text are left as they are.
+        """
+        getter = self._getter
+        decoders = self._decoders
+        records = []
+        for row in rows:
+            values = list(getter(row))
+            for position, decoder in decoders:
+                value = values[position]
+                if value.__class__ is str:
+                    values[position] = decoder(value)
+            records.append(tuple(values))
+        return records
@@ -0,0 +1,104 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Set, Type
+
+from put_into_postgres import SCHEMA
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_table_dependencies(conn, table_names: List[str]) -> Dict[str, Set[str]]:
+    """
+    Build the foreign-key dependency graph of the given tables in the PostgreSQL database.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_names (List[str]): Names of the tables to include in the graph.
+
+    Returns:
+    - Dict[str, Set[str]]: For each table, the set of tables it references. Only the
+      given tables are considered and self-references are ignored.
+
+    Raises:
+    - psycopg2.Error: If there's an error in querying the PostgreSQL catalog.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+    SELECT child.relname, parent.relname
+    FROM pg_constraint AS con
+    JOIN pg_class AS child ON child.oid = con.conrelid
+    JOIN pg_class AS parent ON parent.oid = con.confrelid
+    JOIN pg_namespace AS ns ON ns.oid = child.relnamespace
+    WHERE con.contype = 'f' AND ns.nspname = %s;
+    """,
+        (SCHEMA,),
+    )
+
+    dependencies: Dict[str, Set[str]] = {
+        table_name: set() for table_name in table_names
+    }
+    for child, parent in cursor.fetchall():
+        if child in dependencies and parent in dependencies and child != parent:
+            dependencies[child].add(parent)
+    return dependencies
+
+
+def run_in_dependency_order(
+    tables: Dict[str, Type],
+    dependencies: Dict[str, Set[str]],
+    migrate: Callable[[str, Type], None],
+    workers: int,
+):
+    """
+    Migrate tables concurrently, starting each one as soon as all of its parents are done.
+
+    Tables without pending dependencies run in parallel on a pool of `workers` threads,
+    in the order they are listed in `tables`. The `migrate` callable is expected to open
+    its own connections, since connections must not be shared between threads.
+
+    Parameters:
+    - tables (Dict[str, Type]): Table names mapped to their DataClass types.
+    - dependencies (Dict[str, Set[str]]): Tables each table depends on, as returned by
+      `fetch_table_dependencies`. Dependencies on tables that aren't migrated are
+      ignored.
+    - migrate (Callable[[str, Type], None]): Function that migrates a single table.
+    - workers (int): Maximum number of tables migrated at the same time.
+
+    Raises:
+    - ValueError: If the dependencies contain a cycle.
+    - Exception: The first error raised while migrating a table. Tables that have not
+      started yet are cancelled, tables already running are allowed to finish.
+    """
+    pending = dict(tables)
+    parents = {
+        table_name: dependencies.get(table_name, set()) & tables.keys()
+        for table_name in tables
+    }
+    done: Set[str] = set()
+    running: Dict[Future, str] = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for table_name, table_model in list(pending.items()):
+                if parents[table_name] <= done:
+                    logger.info(f"Starting migration of table {table_name}")
+                    future = executor.submit(migrate, table_name, table_model)
+                    running[future] = table_name
+                    del pending[table_name]
+
+            if not running:
+                raise ValueError(
+                    f"Circular dependencies between tables: {', '.join(pending)}"
+                )
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table_name = running.pop(future)
+                error = future.exception()
+                if error:
+                    for other in running:
+                        other.cancel()
+                    raise error
+                logger.info(f"Finished migration of table {table_name}")
+                done.add(table_name)
@@ -0,0 +1,276 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set
+
+import psycopg2
+import psycopg2.errors
+
+from deferred_indexes import build_index, fetch_secondary_indexes
+from put_into_postgres import SCHEMA, postgres_conn_context
+
+SHADOW_SCHEMA = f"{SCHEMA}_shadow"
+RETIRED_SCHEMA = f"{SCHEMA}_retired"
+SWAP_LOCK_TIMEOUT = "5s"
+SWAP_ATTEMPTS = 12
+logger = logging.getLogger(__name__)
+
+
+def qualify_catalog_names(cursor):
+    """
+    Make the catalog functions of a session schema-qualify every table they print.
+    """
+    cursor.execute("SET search_path TO pg_catalog")
+
+
+def check_swappable(conn, table_names: List[str]):
+    """
+    Make sure no other relation depends on the tables, since a swap would leave it behind.
+
+    Foreign keys of other tables and views keep pointing to the tables they were
+    created on, so after a swap they would reference the retired tables, and be
+    dropped along with them.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_names (List[str]): Names of the tables to swap.
+
+    Raises:
+    - ValueError: If a foreign key or a view outside of the tables depends on them.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+    SELECT DISTINCT dependent.oid::regclass::text
+    FROM pg_class AS parent
+    JOIN pg_namespace AS ns ON ns.oid = parent.relnamespace
+    JOIN (
+        SELECT con.confrelid AS parent_oid, con.conrelid AS dependent_oid
+        FROM pg_constraint AS con WHERE con.contype = 'f'
+        UNION
+        SELECT dep.refobjid, rewrite.ev_class
+        FROM pg_depend AS dep
+        JOIN pg_rewrite AS rewrite ON rewrite.oid = dep.objid
+        WHERE dep.classid = 'pg_rewrite'::regclass
+    ) AS link ON link.parent_oid = parent.oid
+    JOIN pg_class AS dependent ON dependent.oid = link.dependent_oid
+    JOIN pg_namespace AS dependent_ns ON dependent_ns.oid = dependent.relnamespace
+    WHERE ns.nspname = %s AND parent.relname = ANY(%s)
+      AND NOT (dependent_ns.nspname = %s AND dependent.relname = ANY(%s));
+    """,
+        (SCHEMA, table_names, SCHEMA, table_names),
+    )
+    dependents = [row[0] for row in cursor.fetchall()]
+    conn.rollback()
+    if dependents:
+        raise ValueError(
+            f"Can't swap tables that other relations depend on: {', '.join(dependents)}"
+        )
+
+
+def create_shadow_tables(conn, table_names: List[str]):
+    """
+    Create empty UNLOGGED copies of the tables in the shadow schema.
+
+    Any leftover shadow schema of a previous run is dropped first. The copies have the
+    columns, defaults, check constraints and primary keys of the tables, which the
+    writers need to skip existing rows, along with the foreign keys between them, so
+    that orphan records are rejected as they are in place. Secondary indexes are only
+    built by `finalize_shadow_tables`, once the copies are loaded.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_names (List[str]): Names of the tables to copy.
+
+    Raises:
+    - psycopg2.Error: If there's an error in creating the tables.
+    """
+    cursor = conn.cursor()
+    try:
+        qualify_catalog_names(cursor)
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SHADOW_SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SHADOW_SCHEMA}")
+        for table_name in table_names:
+            cursor.execute(
+                f"""
+            CREATE UNLOGGED TABLE {SHADOW_SCHEMA}.{table_name}
+            (LIKE {SCHEMA}.{table_name}
+             INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE);
+            """
+            )
+
+        cursor.execute(
+            """
+        SELECT table_class.relname, con.conname, pg_get_constraintdef(con.oid),
+               con.contype, parent.relname
+        FROM pg_constraint AS con
+        JOIN pg_class AS table_class ON table_class.oid = con.conrelid
+        JOIN pg_namespace AS ns ON ns.oid = table_class.relnamespace
+        LEFT JOIN pg_class AS parent ON parent.oid = con.confrelid
+        WHERE ns.nspname = %s AND table_class.relname = ANY(%s)
+          AND con.contype IN ('p', 'f')
+        ORDER BY con.contype DESC, table_class.relname, con.conname;
+        """,
+            (SCHEMA, table_names),
+        )
+        for table_name, name, definition, kind, parent in cursor.fetchall():
+            if kind == "f":
+                if parent not in table_names:
+                    continue
+                definition = definition.replace(
+                    f"REFERENCES {SCHEMA}.{parent}(",
+                    f"REFERENCES {SHADOW_SCHEMA}.{parent}(",
+                )
+            cursor.execute(
+                f"ALTER TABLE {SHADOW_SCHEMA}.{table_name} "
+                f"ADD CONSTRAINT {name} {definition}"
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"Created shadow tables {', '.join(table_names)} in {SHADOW_SCHEMA}")
+
+
+def finalize_shadow_tables(
+    postgres_settings: Dict[str, str],
+    table_names: List[str],
+    dependencies: Dict[str, Set[str]],
+    workers: int,
+):
+    """
+    Make the loaded shadow tables durable, index them and analyze them.
+
+    The tables are turned LOGGED parents first, since a logged table can't reference
+    an unlogged one. The secondary indexes and unique constraints of the live tables
+    are then built on the copies concurrently by `workers` connections, under the same
+    names, so that the schema is unchanged once the copies are swapped in.
+
+    Parameters:
+    - postgres_settings (Dict[str, str]): Keyword arguments for `postgres_conn_context`.
+    - table_names (List[str]): Names of the loaded tables.
+    - dependencies (Dict[str, Set[str]]): Tables each table references, as returned by
+      `fetch_table_dependencies`.
+    - workers (int): Number of indexes built at the same time.
+
+    Raises:
+    - psycopg2.Error: If a table can't be made logged or an index can't be built.
+    """
+    started = time.perf_counter()
+    with postgres_conn_context(**postgres_settings) as conn:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        qualify_catalog_names(cursor)
+        logged: Set[str] = set()
+        while len(logged) < len(table_names):
+            for table_name in table_names:
+                if (
+                    table_name not in logged
+                    and dependencies.get(table_name, set()) & set(table_names) <= logged
+                ):
+                    cursor.execute(
+                        f"ALTER TABLE {SHADOW_SCHEMA}.{table_name} SET LOGGED"
+                    )
+                    logged.add(table_name)
+        logger.info(
+            f"Made the shadow tables logged in {time.perf_counter() - started:.2f}s"
+        )
+        indexes = fetch_secondary_indexes(conn, table_names)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [
+            executor.submit(
+                build_index,
+                postgres_settings,
+                name,
+                definition.replace(
+                    f" ON {SCHEMA}.{table_name} ",
+                    f" ON {SHADOW_SCHEMA}.{table_name} ",
+                    1,
+                ),
+            )
+            for name, table_name, definition, _ in indexes
+        ]
+        for future in futures:
+            future.result()
+
+    with postgres_conn_context(**postgres_settings) as conn:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        for name, table_name, _, constraint_name in indexes:
+            if constraint_name:
+                cursor.execute(
+                    f"ALTER TABLE {SHADOW_SCHEMA}.{table_name} ADD CONSTRAINT "
+                    f"{constraint_name} UNIQUE USING INDEX {name}"
+                )
+        for table_name in table_names:
+            cursor.execute(f"ANALYZE {SHADOW_SCHEMA}.{table_name}")
+
+    logger.info(
+        f"Built {len(indexes)} indexes on the shadow tables and analyzed them in "
+        f"{time.perf_counter() - started:.2f}s"
+    )
+
+
+def swap_shadow_tables(conn, table_names: List[str]):
+    """
+    Replace the live tables with their shadow copies in one short transaction.
+
+    The live tables are moved to the retired schema and the copies take their place
+    with `SET SCHEMA`, which only updates the catalog, so readers see either the old
+    data or the new data and never a partial load. The exclusive locks are requested
+    with a lock timeout, so that a long-running reader delays the swap instead of
+    blocking every other query behind it, and the swap is retried a few times. The
+    retired tables are dropped once the swap is committed.
+
+    Privileges granted on the live tables aren't carried over to the copies.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - table_names (List[str]): Names of the tables to swap.
+
+    Raises:
+    - psycopg2.errors.LockNotAvailable: If the tables stayed locked by other sessions
+      through every attempt.
+    - psycopg2.Error: If there's an error in swapping the tables.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {RETIRED_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {RETIRED_SCHEMA}")
+    conn.commit()
+
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        started = time.perf_counter()
+        try:
+            cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+            cursor.execute(
+                f"LOCK TABLE "
+                f"{', '.join(f'{SCHEMA}.{name}' for name in table_names)} "
+                f"IN ACCESS EXCLUSIVE MODE"
+            )
+            for table_name in table_names:
+                cursor.execute(
+                    f"ALTER TABLE {SCHEMA}.{table_name} SET SCHEMA {RETIRED_SCHEMA}"
+                )
+            for table_name in table_names:
+                cursor.execute(
+                    f"ALTER TABLE {SHADOW_SCHEMA}.{table_name} SET SCHEMA {SCHEMA}"
+                )
+            conn.commit()
+            break
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == SWAP_ATTEMPTS:
+                raise
+            logger.warning(
+                f"Tables are busy, retrying the swap ({attempt}/{SWAP_ATTEMPTS})"
+            )
+        except Exception:
+            conn.rollback()
+            raise
+
+    logger.info(f"Swapped in the shadow tables in {time.perf_counter() - started:.3f}s")
+    cursor.execute(f"DROP SCHEMA {RETIRED_SCHEMA} CASCADE")
+    cursor.execute(f"DROP SCHEMA {SHADOW_SCHEMA}")
+    conn.commit()
@@ -0,0 +1,512 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Type
+
+import psycopg2
+from dotenv import load_dotenv
+
+from binary_copy import HEADER, TRAILER, BinaryCopyEncoder
+from checkpoints import (
+    create_checkpoint_table,
+    load_resume_key,
+    record_checkpoint,
+    reset_checkpoints,
+)
+from dead_letters import DeadLetterWriter
+from get_from_sqlite import fetch_from_sqlite, sqlite_conn_context
+from metrics import MigrationReport, TableStats
+from migrate_data import source_columns
+from models import TABLES
+from put_into_postgres import (
+    ROW_ERRORS,
+    SCHEMA,
+    insert_isolating_errors,
+    postgres_conn_context,
+)
+from row_codecs import RowCodec
+from scheduler import fetch_table_dependencies, run_in_dependency_order
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SPOOL_FORMAT = "pgcopy-binary"
+MANIFEST_FILE = "manifest.json"
+CHUNK_ROWS = 100_000
+FETCH_ROWS = 10_000
+COMPRESS_LEVEL = 3
+ENCODE_ERRORS = (ValueError, TypeError, OverflowError)
+
+
+def read_manifest(directory: str) -> dict:
+    """
+    Read the manifest of a spool directory, or an empty one if there is none yet.
+
+    Raises:
+    - ValueError: If the manifest was written in another format.
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"format": SPOOL_FORMAT, "tables": {}}
+    with open(path) as file:
+        manifest = json.load(file)
+    if manifest.get("format") != SPOOL_FORMAT:
+        raise ValueError(f"Expected a {SPOOL_FORMAT} spool in {directory}")
+    return manifest
+
+
+def write_manifest(directory: str, manifest: dict):
+    """
+    Replace the manifest of a spool directory atomically.
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def encode_rows(
+    table_name: str,
+    rows: List[tuple],
+    codec: RowCodec,
+    encoder: BinaryCopyEncoder,
+    dead_letters: DeadLetterWriter,
+) -> Tuple[bytes, int]:
+    """
+    Decode a batch of SQLite rows and encode them for a binary COPY.
+
+    If a value of the batch can't be decoded or encoded, the rows are encoded one at a
+    time and the failing ones are sent to the dead-letter writer as SQLite returned
+    them, so a single bad value doesn't stop the extract.
+
+    Returns:
+    - Tuple[bytes, int]: The encoded rows and how many of them there are.
+    """
+    try:
+        return encoder.encode(codec.decode(rows)), len(rows)
+    except ENCODE_ERRORS:
+        pass
+
+    parts = []
+    rejected = []
+    for row in rows:
+        try:
+            parts.append(encoder.encode(codec.decode([row])))
+        except ENCODE_ERRORS as e:
+            rejected.append((codec.project([row])[0], f"{type(e).__name__}: {e}"))
+    dead_letters.write(table_name, codec.columns, rejected)
+    return b"".join(parts), len(parts)
+
+
+def extract_table(
+    sqlite_path: str,
+    directory: str,
+    table_name: str,
+    table_model: Type,
+    chunk_rows: int,
+    dead_letters: DeadLetterWriter,
+    stats: TableStats,
+) -> dict:
+    """
+    Stream an SQLite table into gzip-compressed binary COPY files of `chunk_rows` rows.
+
+    Rows are read in `rowid` order and every chunk is a complete COPY stream, which is
+    written to a temporary file and renamed once it's complete. The spool files left by
+    a previous extract of the table are removed first.
+
+    Parameters:
+    - sqlite_path (str): Path to the SQLite database file.
+    - directory (str): Spool directory the `<table>/<chunk>.pgcopy.gz` files go to.
+    - table_name (str): Name of the table to extract.
+    - table_model (Type): DataClass type representing the table's schema.
+    - chunk_rows (int): Number of rows after which a new file is started.
+    - dead_letters (DeadLetterWriter): Receives the rows that can't be encoded.
+    - stats (TableStats): Statistics of the table.
+
+    Returns:
+    - dict: The manifest entry of the table, with its columns and their types, and the
+      path, key range and row count of every chunk.
+
+    Raises:
+    - RuntimeError: If fewer rows than the table holds were read.
+    """
+    table_directory = os.path.join(directory, table_name)
+    shutil.rmtree(table_directory, ignore_errors=True)
+    os.makedirs(table_directory)
+
+    encoder = BinaryCopyEncoder(table_model)
+    chunks: List[dict] = []
+    chunk: Optional[dict] = None
+    file = None
+    read_rows = 0
+
+    def close_chunk():
+        file.write(TRAILER)
+        file.close()
+        path = os.path.join(directory, chunk["file"])
+        os.replace(f"{path}.tmp", path)
+        chunks.append(chunk)
+
+    with sqlite_conn_context(sqlite_path) as sqlite_conn:
+        columns = source_columns(sqlite_conn, table_name)
+        codec = RowCodec(table_model, ["rowid"] + columns)
+        batches = fetch_from_sqlite(sqlite_conn, table_name, columns, FETCH_ROWS)
+        while True:
+            with stats.phase("fetch"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            read_rows += len(batch.records)
+            with stats.phase("transform"):
+                data, rows = encode_rows(
+                    table_name, batch.records, codec, encoder, dead_letters
+                )
+            stats.add_rejected(len(batch.records) - rows)
+
+            started = time.perf_counter()
+            if chunk is None:
+                chunk = {
+                    "file": f"{table_name}/{len(chunks) + 1:06d}.pgcopy.gz",
+                    "start_key": batch.start_key,
+                    "end_key": batch.end_key,
+                    "rows": 0,
+                }
+                file = gzip.open(
+                    os.path.join(directory, f"{chunk['file']}.tmp"),
+                    "wb",
+                    compresslevel=COMPRESS_LEVEL,
+                )
+                file.write(HEADER)
+            file.write(data)
+            chunk["end_key"] = batch.end_key
+            chunk["rows"] += rows
+            if chunk["rows"] >= chunk_rows:
+                close_chunk()
+                chunk = None
+            elapsed = time.perf_counter() - started
+            stats.add_time("write", elapsed)
+            stats.add_batch(rows, len(data), elapsed)
+
+        if chunk is not None:
+            close_chunk()
+
+        cursor = sqlite_conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        expected_rows = cursor.fetchone()[0]
+
+    stats.finish()
+    if read_rows < expected_rows:
+        raise RuntimeError(
+            f"Read {read_rows} of the {expected_rows} rows of table {table_name}"
+        )
+    logger.info(
+        f"Extracted {stats.rows} rows of table {table_name} in {len(chunks)} files"
+    )
+    return {
+        "columns": encoder.columns,
+        "column_types": encoder.column_types,
+        "rows": sum(chunk["rows"] for chunk in chunks),
+        "chunks": chunks,
+    }
+
+
+def check_target_columns(conn, table_name: str, entry: dict):
+    """
+    Make sure the target table has the spooled columns with binary-compatible types.
+
+    Binary COPY input isn't parsed, so a value spooled for another column type would
+    be rejected at best, and misread at worst.
+
+    Raises:
+    - ValueError: If a column is missing or has an incompatible type.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = %s AND table_name = %s",
+        (SCHEMA, table_name),
+    )
+    target_types = dict(cursor.fetchall())
+    conn.rollback()
+    for column in entry["columns"]:
+        if target_types.get(column) not in entry["column_types"][column]:
+            raise ValueError(
+                f"Column {table_name}.{column} is {target_types.get(column)} but "
+                f"was spooled as {' or '.join(entry['column_types'][column])}"
+            )
+
+
+def load_chunk(
+    conn, table_name: str, columns: List[str], path: str, before_commit
+) -> Optional[List[Tuple[tuple, str]]]:
+    """
+    Load a spooled chunk in a single transaction, skipping IDs that already exist.
+
+    The chunk is copied with `COPY ... (FORMAT binary)` into a temporary staging
+    table, then merged into the table. If the merge fails because of some records,
+    e.g. orphans, the staged records are inserted again with `insert_isolating_errors`
+    and only the failing ones are rejected. Constraints are made immediate, so that
+    foreign keys fail the merge rather than the commit.
+
+    Returns:
+    - Optional[List[Tuple[tuple, str]]]: The rejected records with their error, or None
+      if the whole chunk was rolled back.
+    """
+    staging_table = f"staging_{table_name}"
+    column_list = ",".join(columns)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(
+            f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table}
+        (LIKE {SCHEMA}.{table_name} INCLUDING DEFAULTS)
+        ON COMMIT DELETE ROWS;
+        """
+        )
+        with gzip.open(path, "rb") as file:
+            cursor.copy_expert(
+                f"COPY {staging_table} ({column_list}) FROM STDIN (FORMAT binary)",
+                file,
+            )
+
+        rejected: List[Tuple[tuple, str]] = []
+        cursor.execute("SAVEPOINT merge_chunk")
+        try:
+            cursor.execute(
+                f"""
+            INSERT INTO {SCHEMA}.{table_name} ({column_list})
+            SELECT {column_list} FROM {staging_table}
+            ON CONFLICT (id) DO NOTHING;
+            """
+            )
+        except ROW_ERRORS as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT merge_chunk")
+            logger.warning(
+                f"Chunk {path} failed in table {table_name}, "
+                f"isolating the failing records: {e}"
+            )
+            cursor.execute(f"SELECT {column_list} FROM {staging_table}")
+            records = cursor.fetchall()
+            rejected = insert_isolating_errors(cursor, table_name, columns, records)
+
+        before_commit(cursor)
+        conn.commit()
+        return rejected
+
+    except psycopg2.Error as e:
+        logger.exception(f"Error loading {path} into PostgreSQL: {e}")
+        conn.rollback()
+        return None
+
+
+def load_table(
+    postgres_settings: Dict[str, str],
+    directory: str,
+    table_name: str,
+    entry: dict,
+    after_key: int,
+    dead_letters: DeadLetterWriter,
+    stats: TableStats,
+):
+    """
+    Load the spooled chunks of a table in order, each in its own transaction.
+
+    Every chunk is checkpointed along with its rows, so chunks up to `after_key` are
+    skipped. A chunk that fails is counted as failed and the next one is loaded.
+
+    Parameters:
+    - postgres_settings (Dict[str, str]): Keyword arguments for `postgres_conn_context`.
+    - directory (str): Spool directory.
+    - table_name (str): Name of the table to load.
+    - entry (dict): Manifest entry of the table, as returned by `extract_table`.
+    - after_key (int): Key the load resumes after.
+    - dead_letters (DeadLetterWriter): Receives the records PostgreSQL rejects.
+    - stats (TableStats): Statistics of the table.
+    """
+    columns = entry["columns"]
+    with postgres_conn_context(**postgres_settings) as conn:
+        check_target_columns(conn, table_name, entry)
+        for chunk in entry["chunks"]:
+            if chunk["end_key"] <= after_key:
+                continue
+            path = os.path.join(directory, chunk["file"])
+            checkpoint_time = []
+
+            def checkpoint(cursor):
+                record_checkpoint(
+                    cursor, table_name, chunk["start_key"], chunk["end_key"]
+                )
+                checkpoint_time.append(time.perf_counter())
+
+            started = time.perf_counter()
+            rejected = load_chunk(conn, table_name, columns, path, checkpoint)
+            finished = time.perf_counter()
+            committing = checkpoint_time[-1] if checkpoint_time else finished
+
+            stats.add_time("write", committing - started)
+            stats.add_time("commit", finished - committing)
+            if rejected is None:
+                stats.add_failed(chunk["rows"])
+                stats.add_batch(0, 0, finished - started)
+                continue
+            stats.add_batch(
+                chunk["rows"] - len(rejected), os.path.getsize(path), finished - started
+            )
+            stats.add_rejected(len(rejected))
+            dead_letters.write(table_name, columns, rejected)
+    stats.finish()
+
+
+def main():
+    """
+    Extract SQLite tables to spool files, or load spool files into PostgreSQL.
+
+    `extract` streams every table into gzip-compressed files in PostgreSQL's binary
+    COPY format, along with a `manifest.json`, without connecting to PostgreSQL.
+    `load` replays a spool into PostgreSQL with `COPY ... FROM STDIN (FORMAT binary)`,
+    in foreign-key order. Loads skip the IDs that already exist, so a spool can be
+    loaded again, or into several databases. Rows that can't be encoded or that
+    PostgreSQL rejects go to the dead-letter files. A JSON summary of the run is
+    printed, and the exit status is 1 if a chunk failed to load as a whole.
+
+    Environment Variables:
+    - SQLITE_DB_PATH: Path to the SQLite database (extract).
+    - POSTGRES_HOST, POSTGRES_DBNAME, POSTGRES_USER, POSTGRES_PASSWORD: Target database
+      (load).
+    - DEAD_LETTER_DIR: Directory the rows that can't be encoded or that PostgreSQL
+      rejects are written to (default "dead_letters").
+
+    Command-line Arguments:
+    - extract DIRECTORY: Spool the tables to DIRECTORY.
+    - load DIRECTORY: Load the spool in DIRECTORY.
+    - --tables: Tables to extract or load (default: all of them).
+    - --workers: Number of tables extracted or loaded at the same time.
+    - --chunk-rows: Number of rows in every spool file (extract).
+    - --resume: Skip the chunks loaded by a previous load, and keep its dead letters
+      (load).
+    """
+    parser = argparse.ArgumentParser(
+        description="Spool SQLite tables to binary COPY files and load them."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    extract = commands.add_parser("extract", help="spool the SQLite tables")
+    extract.add_argument("directory")
+    extract.add_argument("--tables", nargs="+", choices=list(TABLES), default=None)
+    extract.add_argument("--workers", type=int, default=1)
+    extract.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    load = commands.add_parser("load", help="load a spool into PostgreSQL")
+    load.add_argument("directory")
+    load.add_argument("--tables", nargs="+", choices=list(TABLES), default=None)
+    load.add_argument("--workers", type=int, default=1)
+    load.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the chunks loaded by a previous load",
+    )
+    args = parser.parse_args()
+
+    dead_letters = DeadLetterWriter(os.getenv("DEAD_LETTER_DIR", "dead_letters"))
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    report = MigrationReport()
+
+    if args.command == "extract":
+        db_path = os.getenv("SQLITE_DB_PATH")
+        if not db_path:
+            raise ValueError("SQLITE_DB_PATH environment variable not set")
+        os.makedirs(args.directory, exist_ok=True)
+        manifest = read_manifest(args.directory)
+        tables = {name: TABLES[name] for name in args.tables or TABLES}
+        entries: Dict[str, dict] = {}
+
+        def extract_one(table_name: str, table_model: Type):
+            dead_letters.reset(table_name)
+            entries[table_name] = extract_table(
+                db_path,
+                args.directory,
+                table_name,
+                table_model,
+                args.chunk_rows,
+                dead_letters,
+                report.table(table_name),
+            )
+
+        try:
+            run_in_dependency_order(tables, {}, extract_one, args.workers)
+        finally:
+            dead_letters.close()
+        manifest["tables"].update(entries)
+        manifest["extracted_at"] = datetime.now(timezone.utc).isoformat()
+        write_manifest(args.directory, manifest)
+
+    else:
+        postgres_settings = {
+            "host": os.getenv("POSTGRES_HOST"),
+            "dbname": os.getenv("POSTGRES_DBNAME"),
+            "user": os.getenv("POSTGRES_USER"),
+            "password": os.getenv("POSTGRES_PASSWORD"),
+        }
+        if not all(postgres_settings.values()):
+            raise ValueError("One or more PostgreSQL environment variables are not set")
+        manifest = read_manifest(args.directory)
+        missing = [name for name in args.tables or [] if name not in manifest["tables"]]
+        if missing:
+            raise ValueError(f"Tables missing from the spool: {', '.join(missing)}")
+        tables = {
+            name: TABLES[name]
+            for name in args.tables or TABLES
+            if name in manifest["tables"]
+        }
+
+        with postgres_conn_context(**postgres_settings) as postgres_conn:
+            dependencies = fetch_table_dependencies(postgres_conn, list(tables))
+            create_checkpoint_table(postgres_conn)
+            after_keys = {
+                table_name: (
+                    load_resume_key(postgres_conn, table_name)
+                    if args.resume
+                    else reset_checkpoints(postgres_conn, table_name)
+                )
+                for table_name in tables
+            }
+        if not args.resume:
+            for table_name in tables:
+                dead_letters.reset(table_name)
+
+        def load_one(table_name: str, table_model: Type):
+            load_table(
+                postgres_settings,
+                args.directory,
+                table_name,
+                manifest["tables"][table_name],
+                after_keys[table_name],
+                dead_letters,
+                report.table(table_name),
+            )
+
+        try:
+            run_in_dependency_order(tables, dependencies, load_one, args.workers)
+        finally:
+            dead_letters.close()
+
+    for table_name, count in dead_letters.counts.items():
+        logger.warning(
+            f"{count} records of table {table_name} were rejected, "
+            f"see {dead_letters.path(table_name)}"
+        )
+    summary = report.summary()
+    sys.stdout.write(json.dumps(summary, indent=2) + "\n")
+    sys.exit(1 if summary["total"]["failed_rows"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import io
+from datetime import date, datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlite_to_postgres.binary_copy import HEADER, TRAILER, BinaryCopyEncoder
+from sqlite_to_postgres.models import FilmWork
+from sqlite_to_postgres.put_into_postgres import postgres_conn_context
+
+RECORDS = [
+    (
+        UUID("3d825f60-9fff-4dfe-b294-1a45fa1e115d"),
+        "Star Wars: Episode IV – A New Hope",
+        "Luke Skywalker joins forces with a Jedi Knight.",
+        date(1977, 5, 25),
+        8.6,
+        "movie",
+        datetime(2021, 6, 16, 20, 14, 9, 221855, tzinfo=timezone.utc),
+        datetime(2021, 6, 16, 23, 14, 9, 1, tzinfo=timezone(timedelta(hours=3))),
+    ),
+    (
+        UUID("0312ed51-8833-413f-bff5-0e139c11264a"),
+        "Солярис",
+        None,
+        None,
+        None,
+        "tv_show",
+        datetime(1999, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc),
+        datetime(2000, 1, 1),
+    ),
+    (
+        UUID("00000000-0000-0000-0000-000000000000"),
+        "",
+        "",
+        date(2000, 1, 1),
+        -0.1,
+        "movie",
+        datetime(2038, 1, 19, 3, 14, 8, tzinfo=timezone.utc),
+        datetime(1970, 1, 1, tzinfo=timezone(timedelta(hours=-5, minutes=-30))),
+    ),
+]
+
+
+def test_binary_copy_round_trip(settings):
+    """
+    Test that records encoded by `BinaryCopyEncoder` load unchanged with a binary COPY.
+
+    The records are copied into a temporary table shaped like `film_work`, which holds
+    every type the encoder supports, and read back. They cover NULLs, non-ASCII text,
+    dates and timestamps on both sides of PostgreSQL's epoch, timestamps with offsets,
+    naive timestamps, which are encoded as UTC, and fractional floats.
+
+    Parameters:
+    - settings (dict): A dictionary containing configuration settings.
+
+    Raises:
+    - AssertionError: If a record reads back differently from how it was encoded.
+    """
+    encoder = BinaryCopyEncoder(FilmWork)
+    data = HEADER + encoder.encode(RECORDS) + TRAILER
+    column_list = ", ".join(encoder.columns)
+
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        cursor = postgres_conn.cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE film_work_copy (LIKE content.film_work) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                f"COPY film_work_copy ({column_list}) FROM STDIN (FORMAT binary)",
+                io.BytesIO(data),
+            )
+            cursor.execute(
+                f"SELECT id::text, {column_list.split(', ', 1)[1]} FROM film_work_copy"
+            )
+            rows = {UUID(row[0]): row[1:] for row in cursor.fetchall()}
+        finally:
+            postgres_conn.rollback()
+
+    assert len(rows) == len(RECORDS)
+    for record in RECORDS:
+        expected = list(record[1:])
+        if expected[-1].tzinfo is None:
+            expected[-1] = expected[-1].replace(tzinfo=timezone.utc)
+        assert list(rows[record[0]]) == expected
+
+
+def test_binary_copy_empty_stream(settings):
+    """
+    Test that a stream of only the header and trailer loads no rows.
+    """
+    encoder = BinaryCopyEncoder(FilmWork)
+    assert encoder.encode([]) == b""
+
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        cursor = postgres_conn.cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE film_work_copy (LIKE content.film_work) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY film_work_copy FROM STDIN (FORMAT binary)",
+                io.BytesIO(HEADER + TRAILER),
+            )
+            cursor.execute("SELECT COUNT(*) FROM film_work_copy")
+            assert cursor.fetchone()[0] == 0
+        finally:
+            postgres_conn.rollback()
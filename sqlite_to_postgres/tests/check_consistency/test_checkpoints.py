@@ -0,0 +1,79 @@
+import pytest
+
+from sqlite_to_postgres.checkpoints import (
+    CHECKPOINT_TABLE,
+    create_checkpoint_table,
+    load_resume_key,
+    record_checkpoint,
+    reset_checkpoints,
+)
+from sqlite_to_postgres.put_into_postgres import postgres_conn_context
+
+TABLE_NAME = "test_checkpoints"
+
+
+@pytest.fixture
+def postgres_conn(settings):
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        create_checkpoint_table(postgres_conn)
+        reset_checkpoints(postgres_conn, TABLE_NAME)
+        yield postgres_conn
+        postgres_conn.rollback()
+        reset_checkpoints(postgres_conn, TABLE_NAME)
+
+
+def record_checkpoints(postgres_conn, ranges):
+    cursor = postgres_conn.cursor()
+    for start_key, end_key in ranges:
+        record_checkpoint(cursor, TABLE_NAME, start_key, end_key)
+    postgres_conn.commit()
+
+
+def stored_checkpoints(postgres_conn):
+    cursor = postgres_conn.cursor()
+    cursor.execute(
+        f"SELECT start_key, end_key FROM {CHECKPOINT_TABLE} "
+        "WHERE table_name = %s ORDER BY start_key",
+        (TABLE_NAME,),
+    )
+    return cursor.fetchall()
+
+
+def test_load_resume_key_without_checkpoints(postgres_conn):
+    assert load_resume_key(postgres_conn, TABLE_NAME) == 0
+    assert stored_checkpoints(postgres_conn) == []
+
+
+def test_load_resume_key_compacts_contiguous_prefix(postgres_conn):
+    """
+    Test that the ranges up to the first gap are compacted into one, and the ranges
+    after it are kept for a later resume.
+    """
+    # Committed out of order by concurrent writers, with a gap after key 250.
+    record_checkpoints(
+        postgres_conn, [(200, 250), (0, 100), (300, 400), (100, 200), (400, 500)]
+    )
+    assert load_resume_key(postgres_conn, TABLE_NAME) == 250
+    assert stored_checkpoints(postgres_conn) == [(0, 250), (300, 400), (400, 500)]
+
+    # The resumed run fills the gap.
+    record_checkpoints(postgres_conn, [(250, 300)])
+    assert load_resume_key(postgres_conn, TABLE_NAME) == 500
+    assert stored_checkpoints(postgres_conn) == [(0, 500)]
+
+
+def test_load_resume_key_with_overlapping_ranges(postgres_conn):
+    record_checkpoints(postgres_conn, [(0, 100), (50, 80), (80, 150)])
+    assert load_resume_key(postgres_conn, TABLE_NAME) == 150
+    assert stored_checkpoints(postgres_conn) == [(0, 150)]
+
+
+def test_load_resume_key_with_gap_at_start(postgres_conn):
+    record_checkpoints(postgres_conn, [(100, 200)])
+    assert load_resume_key(postgres_conn, TABLE_NAME) == 0
+    assert stored_checkpoints(postgres_conn) == [(100, 200)]
@@ -0,0 +1,139 @@
+import sqlite3
+from uuid import uuid4
+
+import pytest
+
+from sqlite_to_postgres.checkpoints import (
+    WATERMARK_TABLE,
+    create_watermark_table,
+    load_watermark,
+)
+from sqlite_to_postgres.migrate_data import sync_table
+from sqlite_to_postgres.models import Genre
+from sqlite_to_postgres.put_into_postgres import (
+    SCHEMA,
+    postgres_conn_context,
+    upsert_into_postgres,
+)
+
+TABLE_NAME = "genre"
+
+
+@pytest.fixture
+def postgres_conn(settings):
+    """
+    Connect to PostgreSQL with no delta-sync watermark stored for the table.
+
+    The watermark of the table and the genres the test wrote are restored afterwards,
+    so the migrated data is left as it was.
+    """
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        create_watermark_table(postgres_conn)
+        cursor = postgres_conn.cursor()
+        cursor.execute(f"SELECT id FROM {SCHEMA}.{TABLE_NAME}")
+        migrated = [row[0] for row in cursor.fetchall()]
+        watermark = load_watermark(postgres_conn, TABLE_NAME)
+        cursor.execute(
+            f"DELETE FROM {WATERMARK_TABLE} WHERE table_name = %s", (TABLE_NAME,)
+        )
+        postgres_conn.commit()
+        yield postgres_conn
+
+        postgres_conn.rollback()
+        cursor.execute(
+            f"DELETE FROM {SCHEMA}.{TABLE_NAME} WHERE NOT (id::text = ANY(%s))",
+            (migrated,),
+        )
+        cursor.execute(
+            f"DELETE FROM {WATERMARK_TABLE} WHERE table_name = %s", (TABLE_NAME,)
+        )
+        if watermark is not None:
+            cursor.execute(
+                f"INSERT INTO {WATERMARK_TABLE} (table_name, watermark) "
+                "VALUES (%s, %s)",
+                (TABLE_NAME, watermark),
+            )
+        postgres_conn.commit()
+
+
+@pytest.fixture
+def sqlite_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        f"CREATE TABLE {TABLE_NAME} (id TEXT PRIMARY KEY, name TEXT, "
+        "description TEXT, created_at TEXT, updated_at TEXT)"
+    )
+    yield conn
+    conn.close()
+
+
+def add_genre(sqlite_conn, updated_at, name="Drama"):
+    """
+    Add a genre to the SQLite table and return its ID.
+    """
+    genre_id = str(uuid4())
+    sqlite_conn.execute(
+        f"INSERT INTO {TABLE_NAME} VALUES (?, ?, NULL, ?, ?)",
+        (genre_id, name, "2030-01-01 00:00:00+00", updated_at),
+    )
+    return genre_id
+
+
+def test_upsert_into_postgres_counts(postgres_conn):
+    """
+    Test that new records are counted as inserted, changed ones as updated, and
+    identical ones are neither.
+    """
+    stamp = "2030-01-01 00:00:00+00"
+    records = [(str(uuid4()), f"Genre {n}", None, stamp, stamp) for n in range(3)]
+    assert upsert_into_postgres(postgres_conn, TABLE_NAME, Genre, records) == (3, 0)
+
+    records[0] = (records[0][0], "Renamed", *records[0][2:])
+    assert upsert_into_postgres(postgres_conn, TABLE_NAME, Genre, records) == (0, 1)
+
+    cursor = postgres_conn.cursor()
+    cursor.execute(
+        f"SELECT name FROM {SCHEMA}.{TABLE_NAME} WHERE id = %s", (records[0][0],)
+    )
+    assert cursor.fetchone() == ("Renamed",)
+
+
+def test_sync_table_rereads_rows_at_watermark(sqlite_conn, postgres_conn):
+    """
+    Test that a sync picks up the rows stamped with the previous watermark, along with
+    the rows changed after it, and moves the watermark to the latest change.
+    """
+    first_id = add_genre(sqlite_conn, "2030-01-01 00:00:01+00")
+    add_genre(sqlite_conn, "2030-01-01 00:00:02+00")
+    counts = sync_table(sqlite_conn, postgres_conn, TABLE_NAME, Genre, 2)
+    assert counts == {"inserted": 2, "updated": 0, "unchanged": 0, "failed": 0}
+    assert load_watermark(postgres_conn, TABLE_NAME) == "2030-01-01 00:00:02+00"
+
+    # Written after the sync, but with the very timestamp it ended on.
+    add_genre(sqlite_conn, "2030-01-01 00:00:02+00")
+    sqlite_conn.execute(
+        f"UPDATE {TABLE_NAME} SET name = 'Comedy', "
+        "updated_at = '2030-01-01 00:00:03+00' WHERE id = ?",
+        (first_id,),
+    )
+    counts = sync_table(sqlite_conn, postgres_conn, TABLE_NAME, Genre, 2)
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1, "failed": 0}
+    assert load_watermark(postgres_conn, TABLE_NAME) == "2030-01-01 00:00:03+00"
+
+
+def test_sync_table_keeps_watermark_after_failed_batch(sqlite_conn, postgres_conn):
+    """
+    Test that the watermark doesn't move when a batch fails, even if later batches
+    are applied, so the next sync extracts the failed rows again.
+    """
+    add_genre(sqlite_conn, "2030-01-01 00:00:01+00")
+    add_genre(sqlite_conn, "2030-01-01 00:00:02+00", name=None)
+    add_genre(sqlite_conn, "2030-01-01 00:00:03+00")
+    counts = sync_table(sqlite_conn, postgres_conn, TABLE_NAME, Genre, 1)
+    assert counts == {"inserted": 2, "updated": 0, "unchanged": 0, "failed": 1}
+    assert load_watermark(postgres_conn, TABLE_NAME) is None
@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from sqlite_to_postgres.models import Genre
+from sqlite_to_postgres.put_into_postgres import (
+    insert_into_postgres,
+    insert_isolating_errors,
+    postgres_conn_context,
+)
+
+CREATED = datetime(2021, 6, 16, 20, 14, 9, tzinfo=timezone.utc)
+COLUMNS = ["id", "name", "description", "created_at", "updated_at"]
+
+
+@pytest.fixture
+def postgres_conn(settings):
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        # Shaped like `genre`, and dropped with the connection.
+        postgres_conn.cursor().execute(
+            "CREATE TEMP TABLE genre (LIKE content.genre INCLUDING ALL)"
+        )
+        postgres_conn.commit()
+        yield postgres_conn
+
+
+def genre_batch(size):
+    return [
+        (str(uuid4()), f"Genre {uuid4()}", None, CREATED, CREATED) for _ in range(size)
+    ]
+
+
+def stored_ids(postgres_conn):
+    cursor = postgres_conn.cursor()
+    cursor.execute("SELECT id::text FROM pg_temp.genre")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def test_insert_isolating_errors_rejects_only_bad_records(postgres_conn):
+    """
+    Test that the records failing on their own are rejected with their error, while
+    the rest of the batch is inserted in the same transaction.
+    """
+    records = genre_batch(9)
+    # A NULL name and an ID that isn't a UUID.
+    records[2] = (records[2][0], None, *records[2][2:])
+    records[7] = ("not-a-uuid", *records[7][1:])
+
+    cursor = postgres_conn.cursor()
+    rejected = insert_isolating_errors(cursor, "genre", COLUMNS, records, "pg_temp")
+    postgres_conn.commit()
+
+    assert [record for record, _ in rejected] == [records[2], records[7]]
+    assert "not-null constraint" in rejected[0][1]
+    assert "invalid input syntax for type uuid" in rejected[1][1]
+    assert stored_ids(postgres_conn) == {
+        record[0] for number, record in enumerate(records) if number not in (2, 7)
+    }
+
+
+def test_insert_into_postgres_commits_good_records(postgres_conn):
+    """
+    Test that a batch with a bad record commits the good ones and rejects the bad one.
+    """
+    records = genre_batch(5)
+    records[3] = (records[3][0], None, *records[3][2:])
+
+    rejected = insert_into_postgres(
+        postgres_conn, "genre", Genre, records, schema="pg_temp"
+    )
+
+    assert [record for record, _ in rejected] == [records[3]]
+    postgres_conn.rollback()
+    assert stored_ids(postgres_conn) == {
+        record[0] for number, record in enumerate(records) if number != 3
+    }
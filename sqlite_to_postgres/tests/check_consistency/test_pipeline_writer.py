@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from sqlite_to_postgres.models import Genre
+from sqlite_to_postgres.put_into_postgres import BatchPipeline, postgres_conn_context
+
+pytest.importorskip("psycopg")
+
+CREATED = datetime(2021, 6, 16, 20, 14, 9, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def postgres_conn(settings):
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+        driver="psycopg3",
+    ) as postgres_conn:
+        # Shaped like `genre`, and dropped with the connection.
+        postgres_conn.execute(
+            "CREATE TEMP TABLE genre (LIKE content.genre INCLUDING ALL)"
+        )
+        yield postgres_conn
+
+
+def genre_batch(size, name="Drama"):
+    return [(uuid4(), name, None, CREATED, CREATED) for _ in range(size)]
+
+
+def stored_ids(postgres_conn):
+    return {row[0] for row in postgres_conn.execute("SELECT id FROM pg_temp.genre")}
+
+
+def test_batch_pipeline_commits_every_batch(postgres_conn):
+    """
+    Test that batches queued across several syncs are all committed, along with the
+    statements of their `before_commit`.
+    """
+    batches = [genre_batch(3) for _ in range(5)]
+    outcomes = []
+    with BatchPipeline(postgres_conn, depth=2) as pipeline:
+        for records in batches:
+            pipeline.submit(
+                "genre",
+                Genre,
+                records,
+                outcomes.append,
+                lambda cursor: cursor.execute(
+                    "UPDATE pg_temp.genre SET description = 'checked'"
+                ),
+                schema="pg_temp",
+            )
+
+    assert outcomes == [[]] * 5
+    assert stored_ids(postgres_conn) == {r[0] for records in batches for r in records}
+    assert postgres_conn.execute(
+        "SELECT count(*) FROM pg_temp.genre WHERE description IS NULL"
+    ).fetchone() == (0,)
+
+
+def test_batch_pipeline_isolates_failed_batch(postgres_conn):
+    """
+    Test that a failing record only rejects itself, while the batches queued before
+    and after its own in the same sync are committed.
+    """
+    batches = [genre_batch(3) for _ in range(4)]
+    bad_record = genre_batch(1, name=None)[0]
+    batches[1].insert(1, bad_record)
+    outcomes = []
+    with BatchPipeline(postgres_conn, depth=4) as pipeline:
+        for records in batches:
+            pipeline.submit("genre", Genre, records, outcomes.append, schema="pg_temp")
+
+    assert outcomes[0] == outcomes[2] == outcomes[3] == []
+    assert [record for record, _ in outcomes[1]] == [bad_record]
+    assert "null value" in outcomes[1][0][1]
+    assert stored_ids(postgres_conn) == {
+        r[0] for records in batches for r in records if r is not bad_record
+    }
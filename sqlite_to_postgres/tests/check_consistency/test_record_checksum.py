@@ -0,0 +1,54 @@
+import dataclasses
+
+from sqlite_to_postgres.get_from_sqlite import sqlite_conn_context
+from sqlite_to_postgres.models import TABLES
+from sqlite_to_postgres.put_into_postgres import postgres_conn_context
+from sqlite_to_postgres.row_codecs import RowCodec
+from sqlite_to_postgres.verification import (
+    PostgresChecksumReader,
+    SqliteChecksumReader,
+    compare_table,
+)
+
+
+def test_record_checksum(settings):
+    """
+    Test the consistency of record content by comparing digests computed by the databases.
+
+    This function works like `test_record_content`, but the digest of every chunk of IDs
+    is computed inside the databases: PostgreSQL aggregates the chunk with
+    `md5(string_agg(...))` and SQLite with a custom aggregate function. Only the digests
+    are sent to Python, unless a chunk differs and has to be narrowed down to its rows.
+
+    Parameters:
+    - settings (dict): A dictionary containing configuration settings. Expected keys include:
+        - SQLITE_DB_PATH: Path to the SQLite database.
+        - POSTGRES_HOST: PostgreSQL host address.
+        - POSTGRES_DBNAME: PostgreSQL database name.
+        - POSTGRES_USER: PostgreSQL user.
+        - POSTGRES_PASSWORD: PostgreSQL password.
+        - TABLES: List of table names to be tested.
+
+    Raises:
+    - AssertionError: If the records in SQLite and PostgreSQL do not match for a table.
+    """
+    with sqlite_conn_context(
+        settings["SQLITE_DB_PATH"]
+    ) as sqlite_conn, postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        for table in settings["TABLES"]:
+            model = TABLES[table]
+            columns = [field.name for field in dataclasses.fields(model)]
+            diff = compare_table(
+                table,
+                SqliteChecksumReader(
+                    sqlite_conn, table, columns, RowCodec(model, columns).decode
+                ),
+                PostgresChecksumReader(postgres_conn, "content", table, model),
+            )
+
+            assert not diff, f"Data mismatch in table {table}: {diff.describe()}"
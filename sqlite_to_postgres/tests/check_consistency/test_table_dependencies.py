@@ -0,0 +1,25 @@
+from sqlite_to_postgres.put_into_postgres import postgres_conn_context
+from sqlite_to_postgres.scheduler import fetch_table_dependencies
+
+
+def test_fetch_table_dependencies(settings):
+    """
+    Test that the link tables depend on the tables they reference, and only on the
+    tables that are asked for.
+    """
+    with postgres_conn_context(
+        settings["POSTGRES_HOST"],
+        settings["POSTGRES_DBNAME"],
+        settings["POSTGRES_USER"],
+        settings["POSTGRES_PASSWORD"],
+    ) as postgres_conn:
+        assert fetch_table_dependencies(postgres_conn, settings["TABLES"]) == {
+            "genre": set(),
+            "film_work": set(),
+            "person": set(),
+            "genre_film_work": {"genre", "film_work"},
+            "person_film_work": {"person", "film_work"},
+        }
+        assert fetch_table_dependencies(
+            postgres_conn, ["genre", "genre_film_work"]
+        ) == {"genre": set(), "genre_film_work": {"genre"}}
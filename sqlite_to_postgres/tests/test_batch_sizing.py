@@ -0,0 +1,55 @@
+import pytest
+
+from sqlite_to_postgres.batch_sizing import AdaptiveBatchSize, estimate_batch_bytes
+
+
+@pytest.mark.parametrize(
+    ("rows", "nbytes", "seconds", "expected"),
+    [
+        # Half-way towards the 2000 rows a second that were written.
+        (1000, 0, 0.5, 1500),
+        # Half-way towards 500 rows, the size of the target commit time.
+        (1000, 0, 2.0, 750),
+        # Never more than twice or less than half the current size at once.
+        (1000, 0, 0.01, 2000),
+        (1000, 0, 1000.0, 500),
+        # Half-way towards 500 rows, which fit in the memory ceiling.
+        (1000, 2_000_000, 0.1, 750),
+    ],
+)
+def test_adaptive_batch_size_observe(rows, nbytes, seconds, expected):
+    batch_sizer = AdaptiveBatchSize(1000, target_seconds=1.0, max_bytes=1_000_000)
+    batch_sizer.observe(rows, nbytes, seconds)
+    assert batch_sizer.size == expected
+
+
+def test_adaptive_batch_size_converges():
+    batch_sizer = AdaptiveBatchSize(100, target_seconds=1.0, max_bytes=10_000_000)
+    for _ in range(20):
+        rows = batch_sizer.size
+        batch_sizer.observe(rows, rows * 100, rows * 0.001)
+    assert 990 <= batch_sizer.size <= 1000
+
+
+def test_adaptive_batch_size_bounds():
+    batch_sizer = AdaptiveBatchSize(
+        100, target_seconds=1.0, max_bytes=1_000_000, min_size=60, max_size=150
+    )
+    batch_sizer.observe(100, 0, 0.001)
+    assert batch_sizer.size == 150
+    for _ in range(3):
+        batch_sizer.observe(batch_sizer.size, 0, 100.0)
+    assert batch_sizer.size == 60
+
+
+def test_adaptive_batch_size_ignores_empty_batches():
+    batch_sizer = AdaptiveBatchSize(1000, target_seconds=1.0, max_bytes=1_000_000)
+    batch_sizer.observe(0, 0, 1.0)
+    batch_sizer.observe(1000, 1000, 0.0)
+    assert batch_sizer.size == 1000
+
+
+def test_estimate_batch_bytes():
+    assert estimate_batch_bytes([]) == 0
+    records = [("abcd", None, 1.5)] * 1000
+    assert estimate_batch_bytes(records) == 7000
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlite_to_postgres.dead_letters import DeadLetterWriter
+
+COLUMNS = ["id", "name", "created_at"]
+RECORD = (
+    UUID("0312ed51-8833-413f-bff5-0e139c11264a"),
+    "Солярис",
+    datetime(2021, 6, 16, 20, 14, 9, tzinfo=timezone.utc),
+)
+
+
+def read_lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_write_appends_records_with_their_error(tmp_path):
+    dead_letters = DeadLetterWriter(str(tmp_path / "dead_letters"))
+    dead_letters.write("genre", COLUMNS, [(RECORD, "null value")])
+    dead_letters.write("genre", COLUMNS, [(RECORD, "duplicate key"), (RECORD, "x")])
+    dead_letters.write("person", COLUMNS, [])
+    dead_letters.close()
+
+    assert read_lines(dead_letters.path("genre")) == [
+        {
+            "table": "genre",
+            "record": {
+                "id": "0312ed51-8833-413f-bff5-0e139c11264a",
+                "name": "Солярис",
+                "created_at": "2021-06-16 20:14:09+00:00",
+            },
+            "error": error,
+        }
+        for error in ("null value", "duplicate key", "x")
+    ]
+    assert dead_letters.counts == {"genre": 3}
+    assert not (tmp_path / "dead_letters" / "person.ndjson").exists()
+
+
+def test_reset_clears_previous_runs(tmp_path):
+    previous = DeadLetterWriter(str(tmp_path))
+    previous.write("genre", COLUMNS, [(RECORD, "null value")])
+    previous.write("person", COLUMNS, [(RECORD, "null value")])
+    previous.close()
+
+    dead_letters = DeadLetterWriter(str(tmp_path))
+    dead_letters.reset("genre")
+    dead_letters.write("person", COLUMNS, [(RECORD, "duplicate key")])
+    dead_letters.close()
+
+    assert not (tmp_path / "genre.ndjson").exists()
+    assert [line["error"] for line in read_lines(dead_letters.path("person"))] == [
+        "null value",
+        "duplicate key",
+    ]
+    assert dead_letters.counts == {"person": 1}
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from sqlite_to_postgres.get_from_sqlite import (
+    fetch_changed_from_sqlite,
+    fetch_from_sqlite,
+    split_key_ranges,
+)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE genre (id TEXT, name TEXT)")
+    conn.executemany(
+        "INSERT INTO genre VALUES (?, ?)",
+        ((f"id-{key}", f"Genre {key}") for key in range(1, 1001)),
+    )
+    yield conn
+    conn.close()
+
+
+def test_fetch_from_sqlite_reads_range(conn):
+    batches = list(fetch_from_sqlite(conn, "genre", ["id", "name"], 300, 100, 900))
+    assert [(batch.start_key, batch.end_key) for batch in batches] == [
+        (100, 400),
+        (400, 700),
+        (700, 900),
+    ]
+    assert batches[0].records[0] == (101, "id-101", "Genre 101")
+
+
+def test_fetch_from_sqlite_raises_read_errors(conn):
+    batches = fetch_from_sqlite(conn, "genre", ["id", "name"], 100, 0, 900)
+    assert len(next(batches).records) == 100
+
+    # Interrupt every further step of the query, as a failing read would.
+    conn.set_progress_handler(lambda: 1, 1)
+    with pytest.raises(sqlite3.OperationalError):
+        list(batches)
+
+
+def test_fetch_changed_from_sqlite_raises_read_errors(conn):
+    batches = fetch_changed_from_sqlite(conn, "genre", ["id", "name"], 100, "name")
+    assert len(next(batches)) == 100
+
+    conn.set_progress_handler(lambda: 1, 1)
+    with pytest.raises(sqlite3.OperationalError):
+        list(batches)
+
+
+@pytest.mark.parametrize(
+    ("after_key", "parts", "min_rows", "expected"),
+    [
+        (0, 4, 100, [(0, 250), (250, 500), (500, 750), (750, None)]),
+        (0, 4, 400, [(0, 500), (500, None)]),
+        (400, 3, 100, [(400, 600), (600, 800), (800, None)]),
+        (0, 4, 5000, [(0, None)]),
+        (1000, 4, 100, [(1000, None)]),
+    ],
+)
+def test_split_key_ranges(conn, after_key, parts, min_rows, expected):
+    assert split_key_ranges(conn, "genre", after_key, parts, min_rows) == expected
+
+
+def test_split_key_ranges_cover_every_row_once(conn):
+    conn.execute("DELETE FROM genre WHERE rowid % 7 = 0")
+    keys = [
+        record[0]
+        for start_key, end_key in split_key_ranges(conn, "genre", 10, 6, 50)
+        for batch in fetch_from_sqlite(conn, "genre", ["id"], 64, start_key, end_key)
+        for record in batch.records
+    ]
+    assert keys == [key for key in range(11, 1001) if key % 7]
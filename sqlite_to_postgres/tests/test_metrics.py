@@ -0,0 +1,66 @@
+import re
+
+import pytest
+
+from sqlite_to_postgres.metrics import MigrationReport, percentile
+
+
+@pytest.mark.parametrize(
+    ("size", "fraction", "expected"),
+    [
+        (10, 0.5, 5),
+        (10, 0.95, 10),
+        (20, 0.95, 19),
+        (30, 0.95, 29),
+        (100, 0.95, 95),
+        (101, 0.5, 51),
+        (3, 0.5, 2),
+        (1, 0.95, 1),
+        (10, 0.0, 1),
+        (10, 1.0, 10),
+    ],
+)
+def test_percentile_nearest_rank(size, fraction, expected):
+    values = [float(value) for value in range(size, 0, -1)]
+    assert percentile(values, fraction) == expected
+
+
+def test_percentile_without_values():
+    assert percentile([], 0.95) == 0.0
+
+
+def test_write_prometheus(tmp_path):
+    report = MigrationReport()
+    genre = report.table("genre")
+    for latency in (0.1, 0.2, 0.3):
+        genre.add_batch(10, 1000, latency)
+    genre.add_rejected(2)
+    genre.add_time("write", 0.5)
+    report.table("person").add_failed(7)
+
+    path = tmp_path / "migration.prom"
+    report.write_prometheus(str(path))
+    lines = path.read_text().splitlines()
+
+    assert lines[:4] == [
+        "# HELP sqlite_to_postgres_rows Rows migrated in the last run.",
+        "# TYPE sqlite_to_postgres_rows gauge",
+        'sqlite_to_postgres_rows{table="genre"} 30',
+        'sqlite_to_postgres_rows{table="person"} 0',
+    ]
+    for sample in (
+        'sqlite_to_postgres_rejected_rows{table="genre"} 2',
+        'sqlite_to_postgres_failed_rows{table="person"} 7',
+        'sqlite_to_postgres_bytes{table="genre"} 3000',
+        'sqlite_to_postgres_phase_seconds{table="genre",phase="write"} 0.5',
+        'sqlite_to_postgres_batch_latency_seconds{table="genre",quantile="0.5"} 0.2',
+        'sqlite_to_postgres_batch_latency_seconds{table="genre",quantile="0.95"} 0.3',
+    ):
+        assert sample in lines
+    assert re.fullmatch(r"sqlite_to_postgres_last_run_timestamp_seconds \d+", lines[-1])
+    # Every sample follows the HELP and TYPE lines of its metric.
+    for line in lines:
+        if not line.startswith("#"):
+            name = re.match(r"\w+", line).group()
+            assert f"# TYPE {name} gauge" in lines
+    assert [entry.name for entry in tmp_path.iterdir()] == ["migration.prom"]
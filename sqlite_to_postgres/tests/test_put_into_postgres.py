@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+import pytest
+
+from sqlite_to_postgres.put_into_postgres import format_copy_value
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("plain text", "plain text"),
+        ("C:\\films\\new", "C:\\\\films\\\\new"),
+        ("title\tyear", "title\\tyear"),
+        ("first line\nsecond line", "first line\\nsecond line"),
+        ("carriage\rreturn", "carriage\\rreturn"),
+        ("\\N", "\\\\N"),
+        ("", ""),
+        (None, "\\N"),
+        (8.5, "8.5"),
+        (42, "42"),
+        (
+            UUID("3d825f60-9fff-4dfe-b294-1a45fa1e115d"),
+            "3d825f60-9fff-4dfe-b294-1a45fa1e115d",
+        ),
+        (
+            datetime(2021, 6, 16, 20, 14, 9, tzinfo=timezone.utc),
+            "2021-06-16 20:14:09+00:00",
+        ),
+    ],
+)
+def test_format_copy_value(value, expected):
+    assert format_copy_value(value) == expected
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sqlite_to_postgres.row_codecs import parse_timestamp
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        (
+            "2021-06-16 20:14:09.221855+00",
+            datetime(2021, 6, 16, 20, 14, 9, 221855, tzinfo=timezone.utc),
+        ),
+        (
+            "2021-06-16 20:14:09.22+00",
+            datetime(2021, 6, 16, 20, 14, 9, 220000, tzinfo=timezone.utc),
+        ),
+        (
+            "2021-06-16 20:14:09.5+00:00",
+            datetime(2021, 6, 16, 20, 14, 9, 500000, tzinfo=timezone.utc),
+        ),
+        (
+            "2021-06-16 20:14:09.12345-03",
+            datetime(
+                2021, 6, 16, 20, 14, 9, 123450, tzinfo=timezone(timedelta(hours=-3))
+            ),
+        ),
+        (
+            "2021-06-16 20:14:09+00",
+            datetime(2021, 6, 16, 20, 14, 9, tzinfo=timezone.utc),
+        ),
+        ("2021-06-16 20:14:09.2", datetime(2021, 6, 16, 20, 14, 9, 200000)),
+        ("2021-06-16 20:14:09", datetime(2021, 6, 16, 20, 14, 9)),
+    ],
+)
+def test_parse_timestamp(text, expected):
+    parsed = parse_timestamp(text)
+    assert parsed == expected
+    assert parsed.utcoffset() == expected.utcoffset()
+
+
+def test_parse_timestamp_rejects_other_text():
+    with pytest.raises(ValueError):
+        parse_timestamp("2021-06-16 20:14:09.x+00")
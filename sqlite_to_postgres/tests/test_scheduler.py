@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from sqlite_to_postgres.scheduler import run_in_dependency_order
+
+TABLES = {"genre": object, "film_work": object, "genre_film_work": object}
+DEPENDENCIES = {"genre_film_work": {"genre", "film_work"}}
+
+
+class Recorder:
+    """
+    Migrate tables by recording when each of them starts and finishes.
+    """
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, table_name, table_model):
+        with self._lock:
+            self.events.append(("start", table_name))
+        time.sleep(self.delay)
+        if table_name in self.fail:
+            raise RuntimeError(f"{table_name} failed")
+        with self._lock:
+            self.events.append(("finish", table_name))
+
+
+def test_dependents_wait_for_their_parents():
+    recorder = Recorder(delay=0.01)
+    run_in_dependency_order(TABLES, DEPENDENCIES, recorder, workers=3)
+
+    started = recorder.events.index(("start", "genre_film_work"))
+    assert ("finish", "genre") in recorder.events[:started]
+    assert ("finish", "film_work") in recorder.events[:started]
+    assert recorder.events[-1] == ("finish", "genre_film_work")
+
+
+def test_independent_tables_run_in_parallel():
+    # Both tables have to be running at the same time for the barrier to open.
+    barrier = threading.Barrier(2, timeout=5)
+    run_in_dependency_order(
+        {"genre": object, "person": object}, {}, lambda *_: barrier.wait(), workers=2
+    )
+
+
+def test_first_error_is_raised_and_dependents_never_start():
+    recorder = Recorder(fail=("genre",))
+    with pytest.raises(RuntimeError, match="genre failed"):
+        run_in_dependency_order(TABLES, DEPENDENCIES, recorder, workers=1)
+    assert ("start", "genre_film_work") not in recorder.events
+
+
+def test_cycles_are_rejected():
+    recorder = Recorder()
+    dependencies = {"genre": {"genre_film_work"}, "genre_film_work": {"genre"}}
+    with pytest.raises(ValueError, match="genre, genre_film_work"):
+        run_in_dependency_order(TABLES, dependencies, recorder, workers=2)
+    # The tables outside the cycle are still migrated first.
+    assert recorder.events == [("start", "film_work"), ("finish", "film_work")]
+
+
+def test_dependencies_outside_the_run_are_ignored():
+    recorder = Recorder()
+    run_in_dependency_order(
+        {"genre_film_work": object}, DEPENDENCIES, recorder, workers=1
+    )
+    assert recorder.events == [
+        ("start", "genre_film_work"),
+        ("finish", "genre_film_work"),
+    ]
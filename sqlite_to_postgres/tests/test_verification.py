@@ -0,0 +1,48 @@
+import pytest
+
+from sqlite_to_postgres.verification import SampleDiff, mismatch_upper_bound
+
+
+@pytest.mark.parametrize(
+    ("mismatches", "sampled", "confidence", "expected"),
+    [
+        # About 2.7 / n when nothing differs, at 95% confidence.
+        (0, 1000, 0.95, 0.002698),
+        (0, 1000, 0.99, 0.005383),
+        (10, 100, 0.95, 0.160356),
+        (5, 5, 0.95, 1.0),
+        (0, 0, 0.95, 1.0),
+    ],
+)
+def test_mismatch_upper_bound(mismatches, sampled, confidence, expected):
+    assert mismatch_upper_bound(mismatches, sampled, confidence) == pytest.approx(
+        expected, abs=1e-6
+    )
+
+
+def test_mismatch_upper_bound_tightens_with_sample_size():
+    bounds = [mismatch_upper_bound(n // 100, n, 0.95) for n in (100, 1000, 10_000)]
+    assert bounds == sorted(bounds, reverse=True)
+    assert all(bound > 0.01 for bound in bounds)
+
+
+def test_sample_diff_summary():
+    diff = SampleDiff("film_work", rows=1000, confidence=0.95)
+    diff.add("missing", "3d825f60-9fff-4dfe-b294-1a45fa1e115d")
+    diff.add("changed", "0312ed51-8833-413f-bff5-0e139c11264a")
+
+    assert diff
+    assert diff.mismatch_rate == 0.002
+    assert diff.upper_bound == mismatch_upper_bound(2, 1000, 0.95)
+    summary = diff.summary()
+    assert summary["mismatches"] == {"missing": 1, "unexpected": 0, "changed": 1}
+    assert summary["mismatch_rate"] == 0.002
+    assert summary["mismatch_rate_upper_bound"] == round(diff.upper_bound, 6)
+    assert summary["confidence"] == 0.95
+
+
+def test_empty_sample_diff():
+    diff = SampleDiff("genre")
+    assert not diff
+    assert diff.mismatch_rate == 0.0
+    assert diff.upper_bound == 1.0
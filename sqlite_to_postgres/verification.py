@@ -0,0 +1,687 @@
+import hashlib
+import math
+import random
+import threading
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime, timezone
+from statistics import NormalDist
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+CHUNK_SIZE = 10_000
+LEAF_SIZE = 32
+FETCH_SIZE = 1_000
+MAX_REPORTED_KEYS = 1_000
+MISMATCH_KINDS = ("missing", "unexpected", "changed")
+SAMPLE_WINDOW = 16
+
+
+def check_deadline(deadline: Optional[threading.Event]):
+    """
+    Raise `TimeoutError` once the deadline of a check has been set.
+    """
+    if deadline is not None and deadline.is_set():
+        raise TimeoutError("The time budget of the check is spent")
+
+
+def canonical_value(value) -> str:
+    """
+    Render a value the same way whichever database it was read from.
+
+    Timezone-aware timestamps are converted to UTC first, since psycopg2 returns them
+    in the session's time zone. The representation matches the text PostgreSQL
+    renders in `postgres_canonical_column`, so digests computed by either database
+    or in Python agree: timestamps always have microseconds, and whole floats have
+    no trailing `.0`, like PostgreSQL's shortest float output.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.isoformat(timespec="microseconds")
+    if isinstance(value, float):
+        text = repr(value)
+        return text[:-2] if text.endswith(".0") else text
+    return str(value)
+
+
+def canonical_row(record: tuple) -> str:
+    return "\t".join(map(canonical_value, record))
+
+
+class RowDigest:
+    """
+    MD5 of the canonical rows of a range, joined with newlines, and their number.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.digest = hashlib.md5()
+
+    def step(self, record: tuple):
+        if self.count:
+            self.digest.update(b"\n")
+        self.digest.update(canonical_row(record).encode())
+        self.count += 1
+
+    def finalize(self) -> str:
+        return self.digest.hexdigest()
+
+
+@dataclass
+class TableDiff:
+    """
+    Differences found between the SQLite and PostgreSQL copies of a table.
+
+    Rows are identified by their primary key. `missing` rows are only in SQLite,
+    `unexpected` rows are only in PostgreSQL, and `changed` rows are in both but with
+    different values. At most `MAX_REPORTED_KEYS` keys of each kind are kept, while
+    `counts` holds the full number of differences.
+    """
+
+    table_name: str
+    rows: int = 0
+    chunks: int = 0
+    counts: Dict[str, int] = field(
+        default_factory=lambda: {kind: 0 for kind in MISMATCH_KINDS}
+    )
+    keys: Dict[str, List[str]] = field(
+        default_factory=lambda: {kind: [] for kind in MISMATCH_KINDS}
+    )
+
+    def add(self, kind: str, key: str):
+        self.counts[kind] += 1
+        if len(self.keys[kind]) < MAX_REPORTED_KEYS:
+            self.keys[kind].append(key)
+
+    def __bool__(self) -> bool:
+        return any(self.counts.values())
+
+    def describe(self) -> str:
+        """
+        Describe the differences in a single line, listing the first keys of each kind.
+        """
+        parts = [
+            f"{count} {kind} ({', '.join(self.keys[kind][:10])})"
+            for kind, count in self.counts.items()
+            if count
+        ]
+        return "; ".join(parts) if parts else "no differences"
+
+    def summary(self) -> dict:
+        """
+        Summarize the differences as a JSON-serializable dictionary.
+        """
+        return {
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "mismatches": dict(self.counts),
+            "keys": {kind: keys for kind, keys in self.keys.items() if keys},
+        }
+
+
+def mismatch_upper_bound(mismatches: int, sampled: int, confidence: float) -> float:
+    """
+    Compute a one-sided upper bound of the mismatch rate from a sample.
+
+    This is the upper end of the Wilson score interval. Unlike the normal
+    approximation, it stays meaningful when no mismatch was observed: with a sample of
+    n rows and no mismatches, the bound at 95% confidence is about 2.7 / n.
+
+    Parameters:
+    - mismatches (int): Number of sampled rows that differ.
+    - sampled (int): Number of sampled rows.
+    - confidence (float): Confidence level of the bound, e.g. 0.95.
+
+    Returns:
+    - float: Mismatch rate the whole table stays under with the given confidence.
+    """
+    if sampled <= 0:
+        return 1.0
+    z = NormalDist().inv_cdf(confidence)
+    rate = mismatches / sampled
+    denominator = 1 + z * z / sampled
+    center = rate + z * z / (2 * sampled)
+    margin = z * math.sqrt(
+        rate * (1 - rate) / sampled + z * z / (4 * sampled * sampled)
+    )
+    return min(1.0, (center + margin) / denominator)
+
+
+@dataclass
+class SampleDiff(TableDiff):
+    """
+    Differences found in a random sample of the rows of a table.
+
+    `rows` is the number of sampled rows, and every mismatch found among them counts
+    towards the observed mismatch rate.
+    """
+
+    confidence: float = 0.95
+
+    @property
+    def mismatch_rate(self) -> float:
+        return sum(self.counts.values()) / self.rows if self.rows else 0.0
+
+    @property
+    def upper_bound(self) -> float:
+        return mismatch_upper_bound(
+            sum(self.counts.values()), self.rows, self.confidence
+        )
+
+    def summary(self) -> dict:
+        summary = super().summary()
+        summary["mismatch_rate"] = round(self.mismatch_rate, 6)
+        summary["mismatch_rate_upper_bound"] = round(self.upper_bound, 6)
+        summary["confidence"] = self.confidence
+        return summary
+
+
+class RangeReader:
+    """
+    Reads the rows of a table in primary key order, one key range at a time.
+
+    A range `(lower, upper]` is open when a bound is None. Rows are streamed with
+    `fetchmany`, so reading a range holds at most `FETCH_SIZE` rows in memory.
+
+    Parameters:
+    - cursor_factory (Callable): Returns a new cursor. It's closed after every query.
+    - table (str): Table to read, qualified with its schema if needed.
+    - columns (List[str]): Columns to read. The key column must be one of them.
+    - placeholder (str): Parameter placeholder of the database driver.
+    - decode (Optional[Callable]): Turns a list of fetched rows into records, e.g.
+      `RowCodec.decode`. Rows are used as fetched when None.
+    - key_column (str): Primary key column the rows are ordered by.
+    """
+
+    def __init__(
+        self,
+        cursor_factory: Callable,
+        table: str,
+        columns: List[str],
+        placeholder: str,
+        decode: Optional[Callable[[list], List[tuple]]] = None,
+        key_column: str = "id",
+    ):
+        self.cursor_factory = cursor_factory
+        self.table = table
+        self.columns = columns
+        self.placeholder = placeholder
+        self.decode = decode or list
+        self.key_column = key_column
+        self.key_index = columns.index(key_column)
+
+    def where(self, lower: Optional[str], upper: Optional[str]) -> Tuple[str, list]:
+        clauses, parameters = [], []
+        if lower is not None:
+            clauses.append(f"{self.key_column} > {self.placeholder}")
+            parameters.append(lower)
+        if upper is not None:
+            clauses.append(f"{self.key_column} <= {self.placeholder}")
+            parameters.append(upper)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), parameters
+
+    def query(self, sql: str, parameters: list) -> Iterator[list]:
+        cursor = self.cursor_factory()
+        try:
+            cursor.execute(sql, parameters)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            cursor.close()
+
+    def records(self, lower: Optional[str], upper: Optional[str]) -> Iterator[tuple]:
+        """
+        Stream the records of a key range in key order.
+        """
+        where, parameters = self.where(lower, upper)
+        sql = (
+            f"SELECT {','.join(self.columns)} FROM {self.table}{where} "
+            f"ORDER BY {self.key_column}"
+        )
+        for rows in self.query(sql, parameters):
+            yield from self.decode(rows)
+
+    def key_at(
+        self, lower: Optional[str], upper: Optional[str], offset: int
+    ) -> Optional[str]:
+        """
+        Return the key at the given offset of a key range, or None if it's shorter.
+        """
+        where, parameters = self.where(lower, upper)
+        sql = (
+            f"SELECT {self.key_column} FROM {self.table}{where} "
+            f"ORDER BY {self.key_column} LIMIT 1 OFFSET {int(offset)}"
+        )
+        cursor = self.cursor_factory()
+        try:
+            cursor.execute(sql, parameters)
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return str(row[0]) if row else None
+
+    def digest(self, lower: Optional[str], upper: Optional[str]) -> Tuple[int, str]:
+        """
+        Count the rows of a key range and hash their canonical representation.
+        """
+        digest = RowDigest()
+        for record in self.records(lower, upper):
+            digest.step(record)
+        return digest.count, digest.finalize()
+
+    def rows_for_keys(self, keys: List[str]) -> Dict[str, str]:
+        """
+        Map the given keys to the canonical representation of their rows, if they exist.
+        """
+        rows = {}
+        for offset in range(0, len(keys), FETCH_SIZE):
+            chunk = keys[offset : offset + FETCH_SIZE]
+            placeholders = ",".join([self.placeholder] * len(chunk))
+            sql = (
+                f"SELECT {','.join(self.columns)} FROM {self.table} "
+                f"WHERE {self.key_column} IN ({placeholders})"
+            )
+            for fetched in self.query(sql, chunk):
+                for record in self.decode(fetched):
+                    rows[str(record[self.key_index])] = canonical_row(record)
+        return rows
+
+    def rows_by_key(self, lower: Optional[str], upper: Optional[str]) -> Dict[str, str]:
+        """
+        Map the keys of a key range to the canonical representation of their rows.
+        """
+        return {
+            str(record[self.key_index]): canonical_row(record)
+            for record in self.records(lower, upper)
+        }
+
+
+def sqlite_reader(
+    conn, table_name: str, columns: List[str], decode: Callable
+) -> RangeReader:
+    return RangeReader(conn.cursor, table_name, columns, "?", decode)
+
+
+def postgres_reader(
+    conn, schema: str, table_name: str, columns: List[str]
+) -> RangeReader:
+    """
+    Build a reader for a PostgreSQL table that streams ranges with server-side cursors.
+    """
+    return RangeReader(
+        lambda: conn.cursor(name=f"verify_{table_name}"),
+        f"{schema}.{table_name}",
+        columns,
+        "%s",
+    )
+
+
+def postgres_canonical_column(name: str, field_type: type) -> str:
+    """
+    Build the SQL expression rendering a PostgreSQL column like `canonical_value`.
+    """
+    if field_type is datetime:
+        expression = (
+            f"to_char({name} AT TIME ZONE 'UTC', "
+            f'\'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"\')'
+        )
+    elif field_type is date:
+        expression = f"to_char({name}, 'YYYY-MM-DD')"
+    else:
+        expression = f"{name}::text"
+    return f"coalesce({expression}, '\\N')"
+
+
+class PostgresChecksumReader(RangeReader):
+    """
+    Reader of a PostgreSQL table whose digests are computed by the server.
+
+    The rows of a range are rendered as canonical text and hashed with
+    `md5(string_agg(...))` in key order, so only their number and digest are sent
+    back. Rows only leave the server when a differing range is compared row by row.
+
+    Parameters:
+    - conn (psycopg2.extensions.connection): PostgreSQL database connection object.
+    - schema (str): Schema of the table.
+    - table_name (str): Name of the table to read.
+    - table_model (Type): DataClass type representing the table's schema.
+    """
+
+    def __init__(self, conn, schema: str, table_name: str, table_model: Type):
+        model_fields = fields(table_model)
+        super().__init__(
+            lambda: conn.cursor(name=f"verify_{table_name}"),
+            f"{schema}.{table_name}",
+            [f.name for f in model_fields],
+            "%s",
+        )
+        self.conn = conn
+        rendered = ", ".join(
+            postgres_canonical_column(f.name, f.type) for f in model_fields
+        )
+        self.row_expression = f"concat_ws(E'\\t', {rendered})"
+
+    def digest(self, lower: Optional[str], upper: Optional[str]) -> Tuple[int, str]:
+        where, parameters = self.where(lower, upper)
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT count(*), coalesce(md5(string_agg({self.row_expression}, "
+                f"E'\\n' ORDER BY {self.key_column})), md5('')) "
+                f"FROM {self.table}{where}",
+                parameters,
+            )
+            count, digest = cursor.fetchone()
+        finally:
+            cursor.close()
+        return count, digest
+
+
+class SqliteChecksumReader(RangeReader):
+    """
+    Reader of an SQLite table whose digests are computed by an aggregate function.
+
+    The aggregate is registered on the connection with `create_aggregate` and hashes
+    the rows exactly like `RowDigest`, so its digests can be compared with the ones
+    computed by `PostgresChecksumReader`.
+
+    Parameters:
+    - conn (sqlite3.Connection): SQLite database connection object.
+    - table_name (str): Name of the table to read.
+    - columns (List[str]): Columns to read, in the order of the table's dataclass.
+    - decode (Callable): Turns a list of fetched rows into records, e.g.
+      `RowCodec.decode`.
+    """
+
+    def __init__(self, conn, table_name: str, columns: List[str], decode: Callable):
+        super().__init__(conn.cursor, table_name, columns, "?", decode)
+        self.aggregate = f"verify_digest_{table_name}"
+
+        class Aggregate:
+            def __init__(self):
+                self.digest = RowDigest()
+
+            def step(self, *values):
+                self.digest.step(decode([values])[0])
+
+            def finalize(self) -> str:
+                return self.digest.finalize()
+
+        conn.create_aggregate(self.aggregate, len(columns), Aggregate)
+
+    def digest(self, lower: Optional[str], upper: Optional[str]) -> Tuple[int, str]:
+        where, parameters = self.where(lower, upper)
+        selected = ",".join(self.columns)
+        cursor = self.cursor_factory()
+        try:
+            cursor.execute(
+                f"SELECT count(*), {self.aggregate}({selected}) FROM "
+                f"(SELECT {selected} FROM {self.table}{where} "
+                f"ORDER BY {self.key_column})",
+                parameters,
+            )
+            count, digest = cursor.fetchone()
+        finally:
+            cursor.close()
+        return count, digest
+
+
+def compare_range(
+    source: RangeReader,
+    target: RangeReader,
+    lower: Optional[str],
+    upper: Optional[str],
+    diff: TableDiff,
+    leaf_size: int = LEAF_SIZE,
+    deadline: Optional[threading.Event] = None,
+) -> int:
+    """
+    Compare a key range of both tables and record the keys of the rows that differ.
+
+    When the digests of the range differ, it is split in two halves at the median key
+    of the side with more rows, and each half is compared in turn. Ranges of at most
+    `leaf_size` rows are compared row by row.
+
+    Returns:
+    - int: Number of source rows in the range.
+
+    Raises:
+    - TimeoutError: If the deadline is set before the range has been compared.
+    """
+    check_deadline(deadline)
+    source_count, source_digest = source.digest(lower, upper)
+    target_count, target_digest = target.digest(lower, upper)
+    if source_count == target_count and source_digest == target_digest:
+        return source_count
+
+    largest = max(source_count, target_count)
+    if largest <= leaf_size:
+        source_rows = source.rows_by_key(lower, upper)
+        target_rows = target.rows_by_key(lower, upper)
+        for key, row in source_rows.items():
+            if key not in target_rows:
+                diff.add("missing", key)
+            elif target_rows[key] != row:
+                diff.add("changed", key)
+        for key in target_rows.keys() - source_rows.keys():
+            diff.add("unexpected", key)
+        return source_count
+
+    splitter = source if source_count >= target_count else target
+    middle = splitter.key_at(lower, upper, largest // 2 - 1)
+    compare_range(source, target, lower, middle, diff, leaf_size, deadline)
+    compare_range(source, target, middle, upper, diff, leaf_size, deadline)
+    return source_count
+
+
+def compare_table(
+    table_name: str,
+    source: RangeReader,
+    target: RangeReader,
+    chunk_size: int = CHUNK_SIZE,
+    leaf_size: int = LEAF_SIZE,
+    deadline: Optional[threading.Event] = None,
+) -> TableDiff:
+    """
+    Compare the rows of a table in both databases, one chunk of keys at a time.
+
+    Chunk boundaries are taken from the source every `chunk_size` keys, and the last
+    chunk is open-ended so that it also covers target rows past the last source key.
+    Only one chunk is compared at a time and rows are hashed as they are streamed, so
+    memory use doesn't grow with the size of the table.
+
+    Parameters:
+    - table_name (str): Name of the table, used in the report.
+    - source (RangeReader): Reader of the SQLite table.
+    - target (RangeReader): Reader of the PostgreSQL table.
+    - chunk_size (int): Number of source rows in each chunk.
+    - leaf_size (int): Size under which differing ranges are compared row by row.
+    - deadline (Optional[threading.Event]): When set, the comparison stops before its
+      next query.
+
+    Returns:
+    - TableDiff: Differences between the tables, empty if they hold the same rows.
+
+    Raises:
+    - TimeoutError: If the deadline is set before the table has been compared.
+    """
+    diff = TableDiff(table_name)
+    lower = None
+    while True:
+        check_deadline(deadline)
+        upper = source.key_at(lower, None, chunk_size - 1)
+        diff.rows += compare_range(
+            source, target, lower, upper, diff, leaf_size, deadline
+        )
+        diff.chunks += 1
+        if upper is None:
+            return diff
+        lower = upper
+
+
+def sample_sqlite_rows(
+    reader: RangeReader,
+    sample_size: int,
+    rng: random.Random,
+    window: int,
+    deadline: Optional[threading.Event] = None,
+) -> List[tuple]:
+    """
+    Read random windows of consecutive `rowid`s from an SQLite table.
+
+    Every window is a cheap range scan of the table's B-tree. Windows are picked
+    without repetition until `sample_size` rows have been read or, if the `rowid`s
+    have many gaps, a bounded number of windows has been tried.
+    """
+    cursor = reader.cursor_factory()
+    try:
+        cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {reader.table}")
+        first, last = cursor.fetchone()
+    finally:
+        cursor.close()
+    if first is None:
+        return []
+
+    windows = (last - first) // window + 1
+    tried = min(windows, 4 * math.ceil(sample_size / window))
+    sampled: List[tuple] = []
+    for number in rng.sample(range(windows), tried):
+        check_deadline(deadline)
+        start = first + number * window
+        sql = (
+            f"SELECT {','.join(reader.columns)} FROM {reader.table} "
+            f"WHERE rowid >= ? AND rowid < ?"
+        )
+        for fetched in reader.query(sql, [start, start + window]):
+            sampled.extend(reader.decode(fetched))
+        if len(sampled) >= sample_size:
+            break
+    return sampled[:sample_size]
+
+
+def sample_postgres_rows(
+    reader: RangeReader, sample_size: int, rng: random.Random
+) -> List[tuple]:
+    """
+    Read a Bernoulli sample of a PostgreSQL table with `TABLESAMPLE`.
+
+    The sampling percentage is derived from the planner's row estimate, falling back
+    to an exact count for tables that have never been analyzed, and slightly padded
+    so that the sample rarely comes out smaller than requested. Surplus rows are
+    dropped at random rather than with `LIMIT`, which would favour the rows stored at
+    the beginning of the table.
+    """
+    cursor = reader.cursor_factory()
+    try:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [reader.table],
+        )
+        estimated = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if estimated <= 0:
+        cursor = reader.cursor_factory()
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM {reader.table}")
+            estimated = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+    if estimated <= 0:
+        return []
+
+    percentage = min(100.0, 120.0 * sample_size / estimated)
+    sql = (
+        f"SELECT {','.join(reader.columns)} FROM {reader.table} "
+        f"TABLESAMPLE BERNOULLI (%s) REPEATABLE (%s)"
+    )
+    sampled: List[tuple] = []
+    for fetched in reader.query(sql, [percentage, rng.randrange(2**31)]):
+        sampled.extend(reader.decode(fetched))
+    if len(sampled) > sample_size:
+        sampled = rng.sample(sampled, sample_size)
+    return sampled
+
+
+def sample_table(
+    table_name: str,
+    source: RangeReader,
+    target: RangeReader,
+    sample_size: int,
+    confidence: float = 0.95,
+    window: int = SAMPLE_WINDOW,
+    seed: Optional[int] = None,
+    deadline: Optional[threading.Event] = None,
+) -> SampleDiff:
+    """
+    Compare a random sample of the rows of a table instead of the whole table.
+
+    Half of the sample is drawn from SQLite in random windows of consecutive `rowid`s
+    and looked up in PostgreSQL, which finds missing and changed rows. The other half
+    is drawn from PostgreSQL with `TABLESAMPLE BERNOULLI` and looked up in SQLite,
+    which also finds rows that only exist in PostgreSQL.
+
+    Parameters:
+    - table_name (str): Name of the table, used in the report.
+    - source (RangeReader): Reader of the SQLite table.
+    - target (RangeReader): Reader of the PostgreSQL table.
+    - sample_size (int): Number of rows to compare. Larger samples take longer and give
+      a tighter bound on the mismatch rate.
+    - confidence (float): Confidence level of the reported bound.
+    - window (int): Number of consecutive `rowid`s read from SQLite at a time.
+    - seed (Optional[int]): Seed of the sample, to repeat a check exactly.
+    - deadline (Optional[threading.Event]): When set, the sampling stops before its
+      next query.
+
+    Returns:
+    - SampleDiff: Differences found in the sample, with the observed mismatch rate and
+      its upper bound.
+
+    Raises:
+    - TimeoutError: If the deadline is set before the sample has been compared.
+
+    Notes:
+    Rows read in the same window aren't independent draws, so the bound is somewhat
+    optimistic for errors that affect runs of adjacent rows. Keep the window small
+    relative to the sample.
+    """
+    rng = random.Random(seed)
+    diff = SampleDiff(table_name, confidence=confidence)
+    seen = set()
+
+    source_rows = {
+        str(record[source.key_index]): canonical_row(record)
+        for record in sample_sqlite_rows(
+            source, sample_size // 2, rng, window, deadline
+        )
+    }
+    check_deadline(deadline)
+    target_rows = target.rows_for_keys(list(source_rows))
+    for key, row in source_rows.items():
+        if key not in target_rows:
+            diff.add("missing", key)
+        elif target_rows[key] != row:
+            diff.add("changed", key)
+    seen.update(source_rows)
+    diff.rows += len(source_rows)
+
+    check_deadline(deadline)
+    target_rows = {
+        str(record[target.key_index]): canonical_row(record)
+        for record in sample_postgres_rows(target, sample_size - len(source_rows), rng)
+    }
+    target_rows = {key: row for key, row in target_rows.items() if key not in seen}
+    check_deadline(deadline)
+    source_rows = source.rows_for_keys(list(target_rows))
+    for key, row in target_rows.items():
+        if key not in source_rows:
+            diff.add("unexpected", key)
+        elif source_rows[key] != row:
+            diff.add("changed", key)
+    diff.rows += len(target_rows)
+    diff.chunks = 1
+    return diff
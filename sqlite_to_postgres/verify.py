@@ -0,0 +1,380 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import fields
+from typing import Dict, List, Type
+
+from dotenv import load_dotenv
+
+from get_from_sqlite import EXCLUDED_COLUMN, fetch_sqlite_columns, sqlite_conn_context
+from models import TABLES
+from put_into_postgres import SCHEMA, postgres_conn_context
+from row_codecs import RowCodec
+from verification import (
+    CHUNK_SIZE,
+    PostgresChecksumReader,
+    SqliteChecksumReader,
+    compare_table,
+    postgres_reader,
+    sample_table,
+    sqlite_reader,
+)
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """
+    Tracks the connections of the running checks so they can be cancelled in bulk.
+
+    Once the deadline has expired, the running queries are interrupted: `cancel` is
+    sent to PostgreSQL and `interrupt` to SQLite. The checks also watch `expired`
+    between their queries and stop before the next one, so they fail promptly instead
+    of running past the time budget. Connections are only closed after they have been
+    unregistered, so a closing connection is never interrupted.
+    """
+
+    def __init__(self):
+        self.expired = threading.Event()
+        self._connections: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def register(self, table_name: str, sqlite_conn, postgres_conn):
+        with self._lock:
+            self._connections[table_name] = (sqlite_conn, postgres_conn)
+        if self.expired.is_set():
+            self.expire()
+
+    def unregister(self, table_name: str):
+        with self._lock:
+            self._connections.pop(table_name, None)
+
+    def expire(self):
+        self.expired.set()
+        with self._lock:
+            for sqlite_conn, postgres_conn in self._connections.values():
+                sqlite_conn.interrupt()
+                postgres_conn.cancel()
+
+
+def check_counts(sqlite_conn, postgres_conn, table_name: str) -> dict:
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+    postgres_cursor = postgres_conn.cursor()
+    postgres_cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.{table_name}")
+    return {
+        "sqlite": sqlite_cursor.fetchone()[0],
+        "postgres": postgres_cursor.fetchone()[0],
+    }
+
+
+def estimate_counts(sqlite_conn, postgres_conn, table_name: str) -> dict:
+    """
+    Estimate the number of rows of a table in both databases without scanning it.
+
+    SQLite finds the largest `rowid` at the end of the table's B-tree, and PostgreSQL's
+    estimate is read from `pg_class.reltuples`, which is unknown (None) until the
+    table has been analyzed. Neither is exact, so the estimates are reported but not
+    compared.
+    """
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute(f"SELECT MAX(rowid) FROM {table_name}")
+    postgres_cursor = postgres_conn.cursor()
+    postgres_cursor.execute(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+        (f"{SCHEMA}.{table_name}",),
+    )
+    reltuples = postgres_cursor.fetchone()[0]
+    return {
+        "sqlite": sqlite_cursor.fetchone()[0] or 0,
+        "postgres": reltuples if reltuples >= 0 else None,
+        "estimated": True,
+    }
+
+
+def check_structure(sqlite_conn, postgres_conn, table_name: str) -> dict:
+    """
+    Compare the columns of a table in both databases, ignoring the excluded column.
+    """
+    sqlite_columns = set(fetch_sqlite_columns(sqlite_conn, table_name))
+    sqlite_columns.discard(EXCLUDED_COLUMN)
+    cursor = postgres_conn.cursor()
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = %s AND table_name = %s",
+        (SCHEMA, table_name),
+    )
+    postgres_columns = {row[0] for row in cursor.fetchall()}
+    return {
+        "missing": sorted(sqlite_columns - postgres_columns),
+        "unexpected": sorted(postgres_columns - sqlite_columns),
+    }
+
+
+def verify_table(
+    sqlite_path: str,
+    postgres_settings: Dict[str, str],
+    table_name: str,
+    table_model: Type,
+    checksum: bool,
+    chunk_size: int,
+    deadline: Deadline,
+    sample_size: int = 0,
+    confidence: float = 0.95,
+) -> dict:
+    """
+    Run the count, structure and content checks of a table on its own connections.
+
+    Parameters:
+    - sqlite_path (str): Path to the SQLite database file.
+    - postgres_settings (Dict[str, str]): Keyword arguments for `postgres_conn_context`.
+    - table_name (str): Name of the table to verify.
+    - table_model (Type): DataClass type representing the table's schema.
+    - checksum (bool): Compute the digests of the content check inside the databases.
+    - chunk_size (int): Number of rows in each chunk of the content check.
+    - deadline (Deadline): Interrupts the checks once the time budget is spent.
+    - sample_size (int): When positive, only a random sample of this many rows is
+      compared, the row counts are estimated rather than counted, and `checksum` and
+      `chunk_size` don't apply.
+    - confidence (float): Confidence level of the mismatch rate bound of a sample.
+
+    Returns:
+    - dict: Status of the table ("ok", "mismatch", "error" or "timeout"), the result
+      of every check that ran and the time each of them took.
+    """
+    result: dict = {"status": "ok", "seconds": {}}
+    started = time.perf_counter()
+    try:
+        with sqlite_conn_context(sqlite_path) as sqlite_conn, postgres_conn_context(
+            **postgres_settings
+        ) as postgres_conn:
+            deadline.register(table_name, sqlite_conn, postgres_conn)
+            try:
+                checked = time.perf_counter()
+                if sample_size > 0:
+                    counts = estimate_counts(sqlite_conn, postgres_conn, table_name)
+                else:
+                    counts = check_counts(sqlite_conn, postgres_conn, table_name)
+                result["counts"] = counts
+                result["seconds"]["counts"] = round(time.perf_counter() - checked, 3)
+
+                checked = time.perf_counter()
+                structure = check_structure(sqlite_conn, postgres_conn, table_name)
+                result["structure"] = structure
+                result["seconds"]["structure"] = round(time.perf_counter() - checked, 3)
+
+                checked = time.perf_counter()
+                columns = [f.name for f in fields(table_model)]
+                decode = RowCodec(table_model, columns).decode
+                if sample_size > 0:
+                    diff = sample_table(
+                        table_name,
+                        sqlite_reader(sqlite_conn, table_name, columns, decode),
+                        postgres_reader(postgres_conn, SCHEMA, table_name, columns),
+                        sample_size,
+                        confidence,
+                        deadline=deadline.expired,
+                    )
+                elif checksum:
+                    diff = compare_table(
+                        table_name,
+                        SqliteChecksumReader(sqlite_conn, table_name, columns, decode),
+                        PostgresChecksumReader(
+                            postgres_conn, SCHEMA, table_name, table_model
+                        ),
+                        chunk_size,
+                        deadline=deadline.expired,
+                    )
+                else:
+                    diff = compare_table(
+                        table_name,
+                        sqlite_reader(sqlite_conn, table_name, columns, decode),
+                        postgres_reader(postgres_conn, SCHEMA, table_name, columns),
+                        chunk_size,
+                        deadline=deadline.expired,
+                    )
+                result["content"] = diff.summary()
+                result["seconds"]["content"] = round(time.perf_counter() - checked, 3)
+            finally:
+                deadline.unregister(table_name)
+
+        if (
+            (not counts.get("estimated") and counts["sqlite"] != counts["postgres"])
+            or structure["missing"]
+            or structure["unexpected"]
+            or diff
+        ):
+            result["status"] = "mismatch"
+    except Exception as e:
+        if deadline.expired.is_set():
+            result["status"] = "timeout"
+        else:
+            logger.exception(f"Verification of table {table_name} failed: {e}")
+            result["status"] = "error"
+            result["error"] = str(e)
+
+    result["seconds"]["total"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Verified table {table_name}: {result['status']}")
+    return result
+
+
+def verify_tables(
+    sqlite_path: str,
+    postgres_settings: Dict[str, str],
+    table_names: List[str],
+    workers: int,
+    timeout: float,
+    checksum: bool = True,
+    chunk_size: int = CHUNK_SIZE,
+    sample_size: int = 0,
+    confidence: float = 0.95,
+) -> dict:
+    """
+    Verify several tables concurrently within a time budget.
+
+    Every table is checked by `verify_table` on a pool of `workers` threads. When
+    `timeout` seconds have passed, the running checks are interrupted, and the tables
+    whose check was still running or hadn't started are reported as timed out.
+
+    Returns:
+    - dict: The report, with the result of every table, the overall status ("ok" only
+      if every table is) and the elapsed time.
+    """
+    deadline = Deadline()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                verify_table,
+                sqlite_path,
+                postgres_settings,
+                table_name,
+                TABLES[table_name],
+                checksum,
+                chunk_size,
+                deadline,
+                sample_size,
+                confidence,
+            ): table_name
+            for table_name in table_names
+        }
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            logger.warning(
+                f"Verification timed out after {timeout}s, cancelling "
+                f"{len(not_done)} tables"
+            )
+            for future in not_done:
+                future.cancel()
+            deadline.expire()
+
+    tables = {}
+    for future, table_name in futures.items():
+        if future.cancelled():
+            tables[table_name] = {"status": "timeout"}
+            continue
+        tables[table_name] = future.result()
+        # A check that ended after the deadline ran past the time budget, even if it
+        # completed between two of its queries.
+        if future in not_done and tables[table_name]["status"] == "ok":
+            tables[table_name]["status"] = "timeout"
+    statuses = {table["status"] for table in tables.values()}
+    return {
+        "status": "ok" if statuses <= {"ok"} else "failed",
+        "seconds": round(time.perf_counter() - started, 3),
+        "tables": tables,
+    }
+
+
+def main():
+    """
+    Verify a migration by comparing the SQLite source with the PostgreSQL target.
+
+    For every table, row counts, columns and row contents are compared, and a JSON
+    report with the outcome, the time every check took and the IDs of the rows that
+    differ is printed. The exit status is 0 only if every table matches, so the command
+    can gate a deployment.
+
+    Environment Variables:
+    - SQLITE_DB_PATH: Path to the SQLite database.
+    - POSTGRES_HOST, POSTGRES_DBNAME, POSTGRES_USER, POSTGRES_PASSWORD: Target database.
+
+    Command-line Arguments:
+    - --tables: Tables to verify (default: all of them).
+    - --workers: Number of tables verified at the same time.
+    - --timeout: Time budget of the whole verification, in seconds.
+    - --rows: Hash the rows in Python instead of inside the databases.
+    - --chunk-size: Number of rows in each chunk of the content check.
+    - --sample: Only compare a random sample of this many rows of every table, and
+      report the observed mismatch rate with an upper bound. Row counts are only
+      estimated, so no table is read in full.
+    - --confidence: Confidence level of the bound reported for samples.
+    - --report: Also write the JSON report to this file.
+    """
+    parser = argparse.ArgumentParser(
+        description="Verify that PostgreSQL holds the same data as SQLite."
+    )
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=None)
+    parser.add_argument("--workers", type=int, default=len(TABLES))
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument(
+        "--rows",
+        action="store_true",
+        help="hash the rows in Python instead of inside the databases",
+    )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=0,
+        help="only compare a random sample of this many rows of every table",
+    )
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--report", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    db_path = os.getenv("SQLITE_DB_PATH")
+    if not db_path:
+        raise ValueError("SQLITE_DB_PATH environment variable not set")
+
+    postgres_settings = {
+        "host": os.getenv("POSTGRES_HOST"),
+        "dbname": os.getenv("POSTGRES_DBNAME"),
+        "user": os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+    }
+    if not all(postgres_settings.values()):
+        raise ValueError("One or more PostgreSQL environment variables are not set")
+
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    report = verify_tables(
+        db_path,
+        postgres_settings,
+        args.tables or list(TABLES),
+        args.workers,
+        args.timeout,
+        checksum=not args.rows,
+        chunk_size=args.chunk_size,
+        sample_size=args.sample,
+        confidence=args.confidence,
+    )
+    output = json.dumps(report, indent=2)
+    sys.stdout.write(output + "\n")
+    if args.report:
+        with open(args.report, "w") as file:
+            file.write(output + "\n")
+    sys.exit(0 if report["status"] == "ok" else 1)
+
+
+if __name__ == "__main__":
+    main()